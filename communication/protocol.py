@@ -8,7 +8,7 @@ IDE plugins and the Agent service.
 from enum import Enum
 from typing import Any, Dict, List, Optional, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class MethodType(str, Enum):
@@ -36,6 +36,8 @@ class MethodType(str, Enum):
 
 class JsonRpcRequest(BaseModel):
     """JSON-RPC request model."""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     jsonrpc: str = "2.0"
     id: Union[str, int]
     method: str
@@ -44,14 +46,19 @@ class JsonRpcRequest(BaseModel):
 
 class JsonRpcResponse(BaseModel):
     """JSON-RPC response model."""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     jsonrpc: str = "2.0"
-    id: Union[str, int]
+    # None is only used for errors raised before the request id is known
+    id: Optional[Union[str, int]]
     result: Optional[Dict[str, Any]] = None
     error: Optional[Dict[str, Any]] = None
 
 
 class JsonRpcError(BaseModel):
     """JSON-RPC error model."""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     code: int
     message: str
     data: Optional[Dict[str, Any]] = None
@@ -5,44 +5,121 @@ This module implements the transport layer using WebSockets.
 """
 
 import asyncio
-import json
+import itertools
 import logging
-from typing import Any, Dict, Optional
+import os
+import socket
+from typing import Any, Dict, Optional, Tuple, Union
 
+import orjson
 import websockets
+from pydantic import ValidationError
 from websockets.server import WebSocketServerProtocol
 
-from communication.protocol import (ErrorCode, JsonRpcError, JsonRpcRequest,
-                                   JsonRpcResponse)
+from communication.protocol import ErrorCode, JsonRpcRequest, JsonRpcResponse, MethodType
 from communication.transport.base_transport import BaseTransport
+from shared.utils.cache_utils import TTLCache
 from shared.utils.logging_utils import get_logger
 
 logger = get_logger(__name__)
 
+# Upper bound on the payload coalesced into a single outbound frame, and the
+# fragment size for larger messages
+MAX_BATCH_SIZE = 64 * 1024
+
+# Read-only methods whose results are cached per (method, params). For
+# requests naming a file_path, the file's modification time and size are
+# part of the key, so changes made outside this transport are seen.
+CACHEABLE_METHODS = frozenset({
+    MethodType.READ_FILE.value,
+    MethodType.GET_FILE_METADATA.value,
+    MethodType.QUERY_SYMBOLS.value,
+    MethodType.EXTRACT_DEPENDENCIES.value
+})
+
+# Methods that modify files and therefore invalidate cached results
+INVALIDATING_METHODS = frozenset({
+    MethodType.WRITE_FILE.value,
+    "confirm_write_file"
+})
+
+# Number of clients sent to before broadcast yields to the event loop
+BROADCAST_CHUNK_SIZE = 50
+
+# Requests with larger encoded params are not cached
+MAX_CACHE_KEY_SIZE = 100_000
+
+# Parse errors never carry a request id, so the response is encoded once
+PARSE_ERROR_RESPONSE = b'{"jsonrpc":"2.0","id":null,"error":{"code":-32700,"message":"Invalid JSON"}}'
+
+# Size of the little-endian header length prefix of a binary framed message
+FRAME_HEADER_SIZE = 4
+
+_MISSING = object()
+
+
+class BinaryFrame(bytes):
+    """
+    An encoded binary framed message.
+
+    A binary framed message is laid out as
+    [4-byte little-endian header length][JSON-RPC header][raw payload]. The
+    raw payload carries the "content" field of the params or result, so large
+    file contents skip JSON escaping and parsing. Framed messages are never
+    coalesced into a batch envelope.
+    """
+
 
 class WebSocketTransport(BaseTransport):
     """WebSocket transport implementation."""
 
-    def __init__(self, host: str = "localhost", port: int = 8765):
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 8765,
+        cache_size: int = 10_000,
+        cache_ttl: float = 5.0,
+        max_queue: Optional[int] = None,
+        compression: Optional[str] = None,
+        max_size: Optional[int] = 2 ** 20
+    ):
         """
         Initialize the WebSocket transport.
 
         Args:
             host: The host to bind to.
             port: The port to listen on.
+            cache_size: Maximum number of cached results for read-only methods.
+            cache_ttl: Time-to-live for cached results in seconds.
+            max_queue: Maximum number of incoming messages buffered per client,
+                or None for no limit.
+            compression: The per-message compression extension to negotiate,
+                e.g. "deflate", or None to disable compression.
+            max_size: Maximum size of an incoming message in bytes, or None
+                for no limit.
         """
         super().__init__()
         self.host = host
         self.port = port
+        self.max_queue = max_queue
+        self.compression = compression
+        self.max_size = max_size
         self.server = None
-        self.clients = set()
+        self._clients: Dict[int, WebSocketServerProtocol] = {}
+        self._next_client_id = itertools.count()
+        self._queues: Dict[WebSocketServerProtocol, asyncio.Queue] = {}
+        self._handlers_get = self.handlers.get
+        self._result_cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
 
     async def start(self):
         """Start the WebSocket server."""
         self.server = await websockets.serve(
             self._handle_client,
             self.host,
-            self.port
+            self.port,
+            max_queue=self.max_queue,
+            compression=self.compression,
+            max_size=self.max_size
         )
         logger.info(f"WebSocket server started on ws://{self.host}:{self.port}")
 
@@ -57,40 +134,161 @@ class WebSocketTransport(BaseTransport):
         """
         Handle a client connection.
 
+        Responses are not sent inline; they are queued for a per-client
+        writer task so that responses which become ready together go out
+        in a single frame. If the writer fails, the connection is closed.
+
         Args:
             websocket: The WebSocket connection.
             path: The connection path.
         """
-        self.clients.add(websocket)
+        _tune_socket(websocket)
+        client_id = next(self._next_client_id)
+        self._clients[client_id] = websocket
+        queue: asyncio.Queue = asyncio.Queue()
+        self._queues[websocket] = queue
+        writer = asyncio.create_task(self._writer_loop(websocket, queue))
+        writer.add_done_callback(lambda task: self._writer_done(websocket, task))
         try:
             async for message in websocket:
+                if writer.done():
+                    break
                 try:
-                    request_data = json.loads(message)
-                    response_data = await self.handle_request(request_data)
-                    await websocket.send(json.dumps(response_data))
-                except json.JSONDecodeError:
-                    error_response = JsonRpcResponse(
-                        jsonrpc="2.0",
-                        id=None,
-                        error=JsonRpcError(
-                            code=ErrorCode.PARSE_ERROR,
-                            message="Invalid JSON"
-                        ).dict()
-                    )
-                    await websocket.send(json.dumps(error_response.dict()))
+                    queue.put_nowait(await self._handle_message(message))
                 except Exception as e:
                     logger.exception("Error handling message")
-                    error_response = JsonRpcResponse(
-                        jsonrpc="2.0",
-                        id=None,
-                        error=JsonRpcError(
-                            code=ErrorCode.INTERNAL_ERROR,
-                            message=str(e)
-                        ).dict()
-                    )
-                    await websocket.send(json.dumps(error_response.dict()))
+                    error_response = _error_response(None, ErrorCode.INTERNAL_ERROR, str(e))
+                    queue.put_nowait(orjson.dumps(error_response))
         finally:
-            self.clients.remove(websocket)
+            # Let the writer flush whatever is still queued, then stop it;
+            # its errors are logged by _writer_done
+            queue.put_nowait(None)
+            await asyncio.gather(writer, return_exceptions=True)
+            del self._queues[websocket]
+            self._clients.pop(client_id, None)
+
+    def _writer_done(self, websocket: WebSocketServerProtocol, writer: asyncio.Task):
+        """
+        Log a failed writer task and close its connection.
+
+        Nothing would send the responses queued after the writer stops, so
+        the connection is closed rather than left reading requests.
+
+        Args:
+            websocket: The WebSocket connection.
+            writer: The finished writer task.
+        """
+        if writer.cancelled() or writer.exception() is None:
+            return
+
+        logger.error("Error sending responses to client", exc_info=writer.exception())
+        asyncio.ensure_future(websocket.close(code=1011, reason="Internal error"))
+
+    async def _writer_loop(self, websocket: WebSocketServerProtocol, queue: asyncio.Queue):
+        """
+        Drain a client's outbound queue.
+
+        Every response already waiting in the queue (up to MAX_BATCH_SIZE
+        bytes) is sent together. A single response is sent as-is; several
+        are wrapped in a {"batch": [...]} envelope.
+
+        Args:
+            websocket: The WebSocket connection.
+            queue: The queue of encoded responses. None stops the writer.
+        """
+        closing = False
+        while not closing:
+            message = await queue.get()
+            if message is None:
+                return
+
+            messages = [message]
+            size = len(message)
+            while not queue.empty() and size < MAX_BATCH_SIZE:
+                message = queue.get_nowait()
+                if message is None:
+                    closing = True
+                    break
+                messages.append(message)
+                size += len(message)
+
+            batch = []
+            for message in messages:
+                if isinstance(message, BinaryFrame):
+                    await self._send_batch(websocket, batch)
+                    batch = []
+                    await self._send(websocket, message)
+                else:
+                    batch.append(message)
+            await self._send_batch(websocket, batch)
+
+    async def _send_batch(self, websocket: WebSocketServerProtocol, batch: list):
+        """
+        Send a batch of encoded JSON responses in a single frame.
+
+        Args:
+            websocket: The WebSocket connection.
+            batch: The encoded responses. An empty batch sends nothing.
+        """
+        if not batch:
+            return
+
+        if len(batch) == 1:
+            await self._send(websocket, batch[0])
+            return
+
+        # Interleave the separators so the frame is built with one join
+        parts = [b'{"batch":[']
+        for message in batch:
+            parts.append(message)
+            parts.append(b",")
+        parts[-1] = b"]}"
+        await self._send(websocket, b"".join(parts))
+
+    async def _send(self, websocket: WebSocketServerProtocol, data: bytes):
+        """
+        Send an encoded message to a client.
+
+        Messages larger than MAX_BATCH_SIZE are sent as a fragmented message
+        of MAX_BATCH_SIZE slices, so the library never copies the whole
+        payload into a single frame buffer.
+
+        Args:
+            websocket: The WebSocket connection.
+            data: The encoded message.
+        """
+        if len(data) <= MAX_BATCH_SIZE:
+            await websocket.send(data)
+            return
+
+        view = memoryview(data)
+        await websocket.send([
+            view[start:start + MAX_BATCH_SIZE]
+            for start in range(0, len(view), MAX_BATCH_SIZE)
+        ])
+
+    async def broadcast(self, payload: bytes):
+        """
+        Send a message to every connected client.
+
+        Clients are sent to in chunks of BROADCAST_CHUNK_SIZE, yielding to the
+        event loop between chunks so that a large broadcast does not hold up
+        request handling.
+
+        Args:
+            payload: The encoded message to send.
+        """
+        clients = list(self._clients.values())
+        for start in range(0, len(clients), BROADCAST_CHUNK_SIZE):
+            chunk = clients[start:start + BROADCAST_CHUNK_SIZE]
+            results = await asyncio.gather(
+                *(client.send(payload) for client in chunk),
+                return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.warning(f"Error broadcasting to client: {result}")
+            await asyncio.sleep(0)
 
     async def send_request(self, request: JsonRpcRequest) -> JsonRpcResponse:
         """
@@ -105,20 +303,99 @@ class WebSocketTransport(BaseTransport):
         Returns:
             The JSON-RPC response from the client.
         """
-        if not self.clients:
+        if not self._clients:
             raise RuntimeError("No clients connected")
 
         # In a real implementation, you would need to route to the correct client
-        client = next(iter(self.clients))
+        client = next(iter(self._clients.values()))
 
-        request_data = json.dumps(request.dict())
+        request_data = orjson.dumps(request.model_dump())
         await client.send(request_data)
 
         response_data = await client.recv()
-        response = JsonRpcResponse.parse_raw(response_data)
+        response = JsonRpcResponse.model_validate_json(response_data)
 
         return response
 
+    async def _handle_message(self, message: Union[str, bytes]) -> bytes:
+        """
+        Handle a raw message received from a client.
+
+        The message is decoded and validated in a single pass by pydantic-core,
+        without building an intermediate dict. Messages that are valid JSON but
+        not a valid request fall back to handle_request, which reports the error
+        against the request id.
+
+        Args:
+            message: The raw message.
+
+        Returns:
+            The encoded response to send back.
+        """
+        if isinstance(message, bytes):
+            frame = _split_frame(message)
+            if frame is not None:
+                return await self._handle_frame(*frame)
+
+        try:
+            request = JsonRpcRequest.model_validate_json(message)
+        except ValidationError as e:
+            if any(error["type"] == "json_invalid" for error in e.errors()):
+                return PARSE_ERROR_RESPONSE
+            return orjson.dumps(await self.handle_request(orjson.loads(message)))
+
+        return orjson.dumps(await self._dispatch(request))
+
+    async def _handle_frame(self, header: bytes, payload: bytes) -> bytes:
+        """
+        Handle a binary framed message.
+
+        The raw payload is passed to the handler as the "content" param,
+        which requires the params to be omitted, null or an object. If the
+        result has a string "content" field, it is sent back as the raw payload
+        of a framed response.
+
+        Args:
+            header: The JSON-RPC request header.
+            payload: The raw payload.
+
+        Returns:
+            The encoded response to send back.
+        """
+        try:
+            request_data = orjson.loads(header)
+        except orjson.JSONDecodeError:
+            return PARSE_ERROR_RESPONSE
+
+        if not isinstance(request_data, dict):
+            return orjson.dumps(_error_response(None, ErrorCode.INVALID_REQUEST, "Invalid request"))
+
+        if payload:
+            params = request_data.get("params")
+            if params is None:
+                request_data["params"] = {"content": payload}
+            elif isinstance(params, dict):
+                params["content"] = payload
+            else:
+                return orjson.dumps(_error_response(
+                    request_data.get("id"),
+                    ErrorCode.INVALID_PARAMS,
+                    "Binary framed requests need params by name"
+                ))
+
+        response_data = await self.handle_request(request_data)
+
+        result = response_data.get("result")
+        content = result.get("content") if isinstance(result, dict) else None
+        if not isinstance(content, str):
+            return _encode_frame(response_data, b"")
+
+        # Results may be shared with the result cache, so copy before popping
+        result = dict(result)
+        del result["content"]
+        response_data["result"] = result
+        return _encode_frame(response_data, content.encode("utf-8"))
+
     async def handle_request(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Handle an incoming request.
@@ -129,35 +406,175 @@ class WebSocketTransport(BaseTransport):
         Returns:
             The response data to send back.
         """
+        # Reject unknown methods before paying for validation
+        method = request_data.get("method")
+        if isinstance(method, str) and method not in self.handlers:
+            return _error_response(
+                request_data.get("id"),
+                ErrorCode.METHOD_NOT_FOUND,
+                f"Method '{method}' not found"
+            )
+
         try:
-            request = JsonRpcRequest(**request_data)
-
-            if request.method not in self.handlers:
-                return JsonRpcResponse(
-                    jsonrpc="2.0",
-                    id=request.id,
-                    error=JsonRpcError(
-                        code=ErrorCode.METHOD_NOT_FOUND,
-                        message=f"Method '{request.method}' not found"
-                    ).dict()
-                ).dict()
-
-            handler = self.handlers[request.method]
-            result = await handler(request.params)
+            request = JsonRpcRequest.model_validate(request_data)
+        except Exception as e:
+            logger.exception("Error handling request")
+            return _error_response(request_data.get("id", None), ErrorCode.INTERNAL_ERROR, str(e))
+
+        return await self._dispatch(request)
 
-            return JsonRpcResponse(
-                jsonrpc="2.0",
-                id=request.id,
-                result=result
-            ).dict()
+    async def _dispatch(self, request: JsonRpcRequest) -> Dict[str, Any]:
+        """
+        Dispatch a validated request to its handler.
 
+        Args:
+            request: The validated request.
+
+        Returns:
+            The response data to send back.
+        """
+        method = request.method
+        handler = self._handlers_get(method)
+        if handler is None:
+            return _error_response(
+                request.id,
+                ErrorCode.METHOD_NOT_FOUND,
+                f"Method '{method}' not found"
+            )
+
+        cache_key = None
+        if method in CACHEABLE_METHODS:
+            params_key = orjson.dumps(request.params, option=orjson.OPT_SORT_KEYS)
+            if len(params_key) <= MAX_CACHE_KEY_SIZE:
+                cache_key = _result_cache_key(method, params_key, request.params)
+            if cache_key is not None:
+                result = self._result_cache.get(cache_key, _MISSING)
+                if result is not _MISSING:
+                    return {"jsonrpc": "2.0", "id": request.id, "result": result}
+        elif method in INVALIDATING_METHODS:
+            self._result_cache.clear()
+
+        try:
+            result = await handler(request.params)
         except Exception as e:
             logger.exception("Error handling request")
-            return JsonRpcResponse(
-                jsonrpc="2.0",
-                id=request_data.get("id", None),
-                error=JsonRpcError(
-                    code=ErrorCode.INTERNAL_ERROR,
-                    message=str(e)
-                ).dict()
-            ).dict()
+            return _error_response(request.id, ErrorCode.INTERNAL_ERROR, str(e))
+
+        if cache_key is not None:
+            self._result_cache.set(cache_key, result)
+
+        return {"jsonrpc": "2.0", "id": request.id, "result": result}
+
+
+def _result_cache_key(method: str, params_key: bytes, params: Any) -> Optional[Tuple[Any, ...]]:
+    """
+    Build the result cache key for a read-only request.
+
+    If the request names a file_path, the key includes the file's
+    modification time and size. A file edited in the editor, written by
+    another process or restored by a recovered operation then misses the
+    cache instead of serving stale results.
+
+    Args:
+        method: The method name.
+        params_key: The encoded request params.
+        params: The request params.
+
+    Returns:
+        The cache key, or None if the named file cannot be stat'ed, in which
+        case the result is not cached.
+    """
+    file_path = params.get("file_path") if isinstance(params, dict) else None
+    if not isinstance(file_path, str):
+        return method, params_key
+
+    try:
+        stat = os.stat(file_path)
+    except (OSError, ValueError):
+        return None
+    return method, params_key, stat.st_mtime_ns, stat.st_size
+
+
+def _tune_socket(websocket: WebSocketServerProtocol):
+    """
+    Configure a client socket for low-latency request/response traffic.
+
+    Nagle's algorithm is disabled so small responses are not held back, and
+    on Linux delayed ACKs are turned off for the connection.
+
+    Args:
+        websocket: The WebSocket connection.
+    """
+    sock = websocket.transport.get_extra_info("socket") if websocket.transport else None
+    if sock is None or sock.family not in (socket.AF_INET, socket.AF_INET6):
+        return
+
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if hasattr(socket, "TCP_QUICKACK"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+    except OSError as e:
+        logger.debug(f"Could not tune client socket: {e}")
+
+
+def _split_frame(message: bytes) -> Optional[Tuple[bytes, bytes]]:
+    """
+    Split a binary framed message into its header and payload.
+
+    A JSON message read as a header length always exceeds its own size
+    (its fourth byte is JSON text, giving a length of at least 144 MiB), so
+    the two encodings cannot be confused.
+
+    Args:
+        message: The raw binary message.
+
+    Returns:
+        The header and payload, or None if the message is not framed.
+    """
+    if len(message) < FRAME_HEADER_SIZE:
+        return None
+
+    header_end = FRAME_HEADER_SIZE + int.from_bytes(message[:FRAME_HEADER_SIZE], "little")
+    if header_end > len(message):
+        return None
+
+    return message[FRAME_HEADER_SIZE:header_end], message[header_end:]
+
+
+def _encode_frame(header: Dict[str, Any], payload: bytes) -> BinaryFrame:
+    """
+    Encode a binary framed message.
+
+    Args:
+        header: The JSON-RPC header.
+        payload: The raw payload.
+
+    Returns:
+        The encoded message.
+    """
+    encoded_header = orjson.dumps(header)
+    return BinaryFrame(
+        len(encoded_header).to_bytes(FRAME_HEADER_SIZE, "little") + encoded_header + payload
+    )
+
+
+def _error_response(request_id: Optional[Union[str, int]], code: ErrorCode, message: str) -> Dict[str, Any]:
+    """
+    Build a JSON-RPC error response.
+
+    The response is assembled as a plain dict, which is what gets encoded
+    for the wire, rather than through JsonRpcResponse/JsonRpcError.
+
+    Args:
+        request_id: The ID of the failed request, or None if unknown.
+        code: The error code.
+        message: The error message.
+
+    Returns:
+        The response data to send back.
+    """
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {"code": code.value, "message": message}
+    }
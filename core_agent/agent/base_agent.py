@@ -5,7 +5,7 @@ This module defines the base agent class that all specific agents will inherit f
 """
 
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Optional, Union
 
 from pydantic import BaseModel
 
@@ -18,14 +18,20 @@ class AgentRequest(BaseModel):
 
 
 class AgentResponse(BaseModel):
-    """Base model for agent responses."""
+    """
+    Base model for agent responses.
+
+    Agents build responses from their own workflow state, so they may create
+    them with model_construct to skip validation on the hot path. The field
+    types therefore match those of AgentState.
+    """
     task_id: str
     status: str
     results: Optional[Dict[str, Any]] = None
     requires_user_confirmation: bool = False
-    preview: Optional[Dict[str, Any]] = None
-    changes: Optional[List[Dict[str, Any]]] = None
-    error: Optional[str] = None
+    preview: Optional[str] = None
+    changes: Optional[Dict[str, Any]] = None
+    error: Optional[Union[str, Dict[str, Any]]] = None
 
 
 class BaseAgent(ABC):
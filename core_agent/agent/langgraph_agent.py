@@ -4,17 +4,31 @@ LangGraph Agent implementation.
 This module implements an agent using LangChain and LangGraph for multi-step reasoning.
 """
 
-import uuid
+import asyncio
 import datetime
-from typing import Any, Dict, List, Optional
-
+import functools
+import itertools
+import logging
+import secrets
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Union
+
+import orjson
 from langchain.tools import BaseTool
 from langchain.llms.base import BaseLLM
+from langchain.schema.runnable import RunnableConfig
 from langgraph.graph import StateGraph, START, END
 
 from core_agent.agent.base_agent import AgentRequest, AgentResponse, BaseAgent
 from core_agent.agent.state_models import AgentState
-from core_agent.agent.workflow_nodes import understand_request, analyze_context, plan_changes, execute_changes, verify_results
+from core_agent.agent.workflow_nodes import (
+    understand_request,
+    analyze_context,
+    plan_changes,
+    execute_changes,
+    verify_results,
+    route_verification
+)
 from core_agent.tools.file_tools import ReadFileTool, GetFileMetadataTool
 from core_agent.tools.code_tools import GenerateCodeTool, AnalyzeCodeTool
 from core_agent.tools.cross_file_analysis_tool import CrossFileAnalysisTool
@@ -22,13 +36,264 @@ from core_agent.tools.context_collection_tool import ContextCollectionTool
 from core_agent.tools.refactoring_tools import RefactorCodeTool
 from core_agent.tools.code_completion_tool import CodeCompletionTool
 from core_agent.tools.write_file_tool import WriteFileTool, ConfirmWriteFileTool
+from core_agent.llm.llm_config import LLMServiceConfig
 from core_agent.llm.llm_service import LLMService
-from core_agent.llm.default_config import DEFAULT_LLM_SERVICE_CONFIG
 from shared.models.history import HistoryManager, HistoryEntry, OperationType, OperationStatus, OperationRecord
 from shared.utils.logging_utils import get_logger
 
 logger = get_logger(__name__)
 
+# Task types that map directly onto a single tool and skip the workflow
+DIRECT_TOOL_TASKS = frozenset({"read_file", "get_file_metadata", "confirm_write_file"})
+
+# AgentResponse fields and the final state keys they are read from
+_RESPONSE_FIELDS = (
+    ("status", "status"),
+    ("results", "results"),
+    ("requires_user_confirmation", "requires_confirmation"),
+    ("preview", "preview"),
+    ("changes", "changes"),
+    ("error", "error")
+)
+
+# Shared context for requests without one; nodes only read the context
+_EMPTY_CONTEXT: Mapping[str, Any] = MappingProxyType({})
+
+# Maximum number of finished tasks waiting to be recorded in the history
+HISTORY_QUEUE_SIZE = 1024
+
+# Maximum number of history entries written at once
+HISTORY_BATCH_SIZE = 64
+
+# History operation type for each task type; anything else is CUSTOM
+_TASK_OPERATION_TYPES = {
+    "generate_code": OperationType.GENERATE_CODE,
+    "analyze_code": OperationType.ANALYZE_CODE,
+    "write_file": OperationType.WRITE_FILE,
+    "read_file": OperationType.READ_FILE
+}
+
+# History operation status for each final task status; anything else is SUCCESS
+_TASK_OPERATION_STATUSES = {
+    "error": OperationStatus.FAILURE,
+    "cancelled": OperationStatus.CANCELLED
+}
+
+
+def _dump_state(state: Union[AgentState, Dict[str, Any]]) -> str:
+    """
+    Serialize a workflow state for logging.
+
+    Args:
+        state: The workflow state.
+
+    Returns:
+        The state as JSON.
+    """
+    return orjson.dumps(state, default=str).decode()
+
+
+def _build_history_entry(
+    task_id: str,
+    task_type: str,
+    inputs: Dict[str, Any],
+    final_state: Dict[str, Any],
+    timestamp: datetime.datetime
+) -> HistoryEntry:
+    """
+    Build the history entry for a finished task.
+
+    Args:
+        task_id: The ID of the task.
+        task_type: The type of task.
+        inputs: The inputs to the task.
+        final_state: The final state of the task.
+        timestamp: When the task started.
+
+    Returns:
+        The history entry.
+    """
+    # Determine the operation type and status
+    operation_type = _TASK_OPERATION_TYPES.get(task_type, OperationType.CUSTOM)
+    status = _TASK_OPERATION_STATUSES.get(final_state.get("status"), OperationStatus.SUCCESS)
+
+    # Create the operation record
+    operation = OperationRecord(
+        id=task_id,
+        type=operation_type,
+        timestamp=timestamp,
+        status=status,
+        params=inputs,
+        result=final_state.get("results"),
+        error=final_state.get("error")
+    )
+
+    # Create the history entry
+    return HistoryEntry(
+        id=task_id,
+        timestamp=timestamp,
+        operation=operation,
+        description=f"{task_type} operation",
+        can_undo=False  # For now, we don't support undo
+    )
+
+
+class TaskCancelledError(Exception):
+    """Raised by a workflow node when its task has been cancelled."""
+
+
+class _TaskHandle:
+    """Cancellation handle for a running task."""
+
+    __slots__ = ("cancel_event",)
+
+    def __init__(self):
+        """Initialize the handle."""
+        self.cancel_event = asyncio.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the task has been cancelled."""
+        return self.cancel_event.is_set()
+
+    def cancel(self) -> None:
+        """Cancel the task; the workflow stops before its next node."""
+        self.cancel_event.set()
+
+
+def _bind_configurable(node: Callable, name: str, output_fields: Optional[Tuple[str, ...]] = None) -> Callable:
+    """
+    Adapt a workflow node to take its dependency from the run config.
+
+    Args:
+        node: The node function, called as node(state, dependency); it may
+            be a coroutine function.
+        name: The key of the dependency in config["configurable"].
+        output_fields: If given, only these fields of the returned state are
+            written back. Nodes running in parallel must not write the same
+            field unless it has a reducer.
+
+    Returns:
+        A node function that LangGraph calls with the state and run config.
+
+    Raises:
+        TaskCancelledError: If the task was cancelled before the node ran.
+    """
+    def dependency(state: AgentState, config: RunnableConfig) -> Any:
+        configurable = config["configurable"]
+        cancel_event = configurable.get("cancel_event")
+        if cancel_event is not None and cancel_event.is_set():
+            raise TaskCancelledError(state.task_id)
+        return configurable[name]
+
+    def output(state: AgentState) -> Union[AgentState, Dict[str, Any]]:
+        if output_fields is None:
+            return state
+        return {field: getattr(state, field) for field in output_fields}
+
+    if asyncio.iscoroutinefunction(node):
+        async def run(state: AgentState, config: RunnableConfig) -> Union[AgentState, Dict[str, Any]]:
+            return output(await node(state, dependency(state, config)))
+    else:
+        def run(state: AgentState, config: RunnableConfig) -> Union[AgentState, Dict[str, Any]]:
+            return output(node(state, dependency(state, config)))
+
+    return run
+
+
+def _graph_class(engine: str) -> type:
+    """
+    Get the state graph class for a workflow engine.
+
+    The "rust" engine uses the compiled langgraph_rs bindings if they are
+    installed; the nodes stay Python and only the graph runtime changes.
+    Any other engine, or a missing package, uses LangGraph's StateGraph.
+
+    Args:
+        engine: The name of the workflow engine.
+
+    Returns:
+        The state graph class.
+    """
+    if engine == "rust":
+        try:
+            from langgraph_rs import StateGraph as RustStateGraph
+        except ImportError:
+            logger.warning("langgraph_rs is not installed, using the Python workflow engine")
+        else:
+            return RustStateGraph
+
+    return StateGraph
+
+
+@functools.lru_cache(maxsize=8)
+def _build_shared_workflow(state_schema: type = AgentState, engine: str = "python") -> StateGraph:
+    """
+    Build and compile the agent workflow.
+
+    The compiled graph holds no per-agent state: the LLM and tools are passed
+    in through config["configurable"] on each run. It is therefore compiled
+    once per state schema and engine and shared by all agents.
+
+    Args:
+        state_schema: The state schema of the workflow.
+        engine: The workflow engine, "python" or "rust".
+
+    Returns:
+        The compiled workflow.
+    """
+    workflow = _graph_class(engine)(state_schema=state_schema)
+
+    # Define nodes with actual implementations
+    # understand_request and analyze_context are independent, so they run in
+    # parallel; they only report their status
+    workflow.add_node("understand_request", _bind_configurable(understand_request, "llm", ("status",)))
+    workflow.add_node("analyze_context", _bind_configurable(analyze_context, "llm", ("status",)))
+    workflow.add_node("plan_changes", _bind_configurable(plan_changes, "llm"))
+    workflow.add_node("execute_changes", _bind_configurable(execute_changes, "tools"))
+    workflow.add_node("verify_results", _bind_configurable(verify_results, "llm"))
+
+    # Define edges
+    workflow.add_edge(START, "understand_request")
+    workflow.add_edge(START, "analyze_context")
+    workflow.add_edge(["understand_request", "analyze_context"], "plan_changes")
+    workflow.add_edge("plan_changes", "execute_changes")
+    workflow.add_edge("execute_changes", "verify_results")
+
+    # Add conditional edges
+    workflow.add_conditional_edges(
+        "verify_results",
+        route_verification,
+        {
+            "success": END,
+            "retry": "plan_changes",
+            "fail": END
+        }
+    )
+
+    return workflow.compile()
+
+
+def _create_llm_services(config: LLMServiceConfig) -> List[LLMService]:
+    """
+    Create the LLM services for a configuration.
+
+    Args:
+        config: The LLM service configuration.
+
+    Returns:
+        One service per configured base URL, or a single service if none are configured.
+    """
+    if not config.llm.base_urls:
+        return [LLMService(config)]
+
+    return [
+        LLMService(config.model_copy(update={
+            "llm": config.llm.model_copy(update={"api_base": base_url, "base_urls": []})
+        }))
+        for base_url in config.llm.base_urls
+    ]
+
 
 class LangGraphAgent(BaseAgent):
     """Agent implementation using LangChain and LangGraph."""
@@ -38,15 +303,29 @@ class LangGraphAgent(BaseAgent):
         super().__init__(config)
         logger.info("Initializing LangGraph agent")
 
-        # Initialize LLM service
+        # Initialize LLM services, one per API replica
         llm_config = config.get("llm_config") if config else None
-        self.llm_service = LLMService(llm_config or DEFAULT_LLM_SERVICE_CONFIG)
-
-        # Initialize tools
-        self.tools = self._initialize_tools()
+        if llm_config is None:
+            from core_agent.llm.default_config import DEFAULT_LLM_SERVICE_CONFIG
+            llm_config = DEFAULT_LLM_SERVICE_CONFIG
+        self.llm_services = _create_llm_services(llm_config)
+        self.llm_service = self.llm_services[0]
+
+        # Initialize tools, one set per LLM service so each replica's tools
+        # call its own service
+        self._tool_sets: List[Dict[str, BaseTool]] = [
+            {tool.name: tool for tool in self._initialize_tools(service)}
+            for service in self.llm_services
+        ]
+        self.tools_by_name = self._tool_sets[0]
+        self.tools = list(self.tools_by_name.values())
 
         # Initialize workflow
         self.workflow = self._build_workflow()
+        self._run_configs = [
+            {"configurable": {"llm": service.llm, "tools": tools}}
+            for service, tools in zip(self.llm_services, self._tool_sets)
+        ]
 
         # Initialize history manager
         self.history_manager = HistoryManager(max_entries=100)
@@ -54,198 +333,253 @@ class LangGraphAgent(BaseAgent):
         # Store active tasks for cancellation
         self.active_tasks = {}
 
-        logger.debug(f"Agent initialized with config: {config}")
+        # Finished tasks waiting to be written to the history, and the task
+        # that writes them; created on first use since they need a running loop
+        self._history_queue: Optional[asyncio.Queue] = None
+        self._history_worker: Optional[asyncio.Task] = None
+
+        # Task IDs are a per-instance random prefix plus a counter
+        self._task_prefix = secrets.token_hex(4)
+        self._task_counter = itertools.count()
+
+        logger.debug("Agent initialized with config: %s", config)
 
-    def _initialize_tools(self) -> List[BaseTool]:
-        """Initialize the tools used by the agent."""
+    def _initialize_tools(self, llm_service: LLMService) -> List[BaseTool]:
+        """
+        Initialize the tools used by the agent.
+
+        Args:
+            llm_service: The LLM service the tools call.
+
+        Returns:
+            The tools.
+        """
         logger.info("Initializing agent tools")
         tools = [
             ReadFileTool(),
             GetFileMetadataTool(),
-            GenerateCodeTool(self.llm_service),
-            AnalyzeCodeTool(self.llm_service),
-            CrossFileAnalysisTool(self.llm_service),
+            GenerateCodeTool(llm_service),
+            AnalyzeCodeTool(llm_service),
+            CrossFileAnalysisTool(llm_service),
             ContextCollectionTool(),
-            RefactorCodeTool(self.llm_service),
-            CodeCompletionTool(self.llm_service),
+            RefactorCodeTool(llm_service),
+            CodeCompletionTool(llm_service),
             WriteFileTool(),
             ConfirmWriteFileTool()
         ]
-        logger.debug(f"Initialized {len(tools)} tools: {[tool.name for tool in tools]}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Initialized %s tools: %s", len(tools), [tool.name for tool in tools])
         return tools
 
-    def _build_workflow(self) -> StateGraph:
-        """Build the agent workflow using LangGraph."""
-        workflow = StateGraph(state_schema=AgentState)
-
-        # Get the LLM from the service
-        llm = self.llm_service.llm
-
-        # Define nodes with actual implementations
-        workflow.add_node("understand_request", lambda state: understand_request(state, llm))
-        workflow.add_node("analyze_context", lambda state: analyze_context(state, llm))
-        workflow.add_node("plan_changes", lambda state: plan_changes(state, llm))
-        workflow.add_node("execute_changes", lambda state: execute_changes(state, self.tools))
-        workflow.add_node("verify_results", lambda state: verify_results(state, llm))
-
-        # Define edges
-        workflow.add_edge(START, "understand_request")
-        workflow.add_edge("understand_request", "analyze_context")
-        workflow.add_edge("analyze_context", "plan_changes")
-        workflow.add_edge("plan_changes", "execute_changes")
-        workflow.add_edge("execute_changes", "verify_results")
-
-        # Add conditional edges
-        workflow.add_conditional_edges(
-            "verify_results",
-            lambda state: "success" if state.verification_passed else "retry",
-            {
-                "success": END,
-                "retry": "plan_changes"
-            }
-        )
+    def _replica_configurable(self, task_id: str) -> Dict[str, Any]:
+        """
+        Get the configurable run settings of the replica serving a task.
+
+        All LLM calls of a task go to the same replica so its prompt cache
+        is reused.
+
+        Args:
+            task_id: The ID of the task.
+
+        Returns:
+            The replica's LLM and tools.
+        """
+        return self._run_configs[hash(task_id) % len(self._run_configs)]["configurable"]
 
-        return workflow.compile()
+    def _build_workflow(self) -> StateGraph:
+        """Get the shared agent workflow for the configured engine."""
+        engine = self.config.get("engine", "python")
+        return _build_shared_workflow(AgentState, engine)
 
     async def execute(self, request: AgentRequest) -> AgentResponse:
         """Execute the agent task using the LangGraph workflow."""
-        task_id = str(uuid.uuid4())
-        logger.info(f"Executing task {task_id} of type {request.task_type}")
+        task_id = f"{self._task_prefix}-{next(self._task_counter)}"
+        started_at = datetime.datetime.now()
+        logger.info("Executing task %s of type %s", task_id, request.task_type)
 
         try:
+            if request.task_type in DIRECT_TOOL_TASKS:
+                return await self._execute_tool(task_id, request, started_at)
+
             # Initialize the state with the request
-            initial_state = {
-                "task_id": task_id,
-                "task_type": request.task_type,
-                "inputs": request.inputs,
-                "context": request.context or {},
-                "status": "in_progress",
-                "results": None,
-                "changes": None,
-                "error": None
-            }
-
-            logger.debug(f"Initial state for task {task_id}: {initial_state}")
+            initial_state = AgentState(
+                task_id=task_id,
+                task_type=request.task_type,
+                inputs=request.inputs,
+                context=request.context or _EMPTY_CONTEXT
+            )
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Initial state for task %s: %s", task_id, _dump_state(initial_state))
 
             # Store the task for potential cancellation
-            self.active_tasks[task_id] = {
-                "state": initial_state,
-                "cancelled": False
-            }
+            handle = _TaskHandle()
+            self.active_tasks[task_id] = handle
 
             # Execute the workflow
-            logger.info(f"Starting workflow execution for task {task_id}")
-            final_state = await self.workflow.ainvoke(initial_state)
-            logger.debug(f"Final state for task {task_id}: {final_state}")
+            configurable = self._replica_configurable(task_id)
+            run_config = {"configurable": {**configurable, "cancel_event": handle.cancel_event}}
+            logger.info("Starting workflow execution for task %s", task_id)
+            try:
+                final_state = await self.workflow.ainvoke(initial_state, config=run_config)
+            except TaskCancelledError:
+                logger.info("Task %s was cancelled during the workflow", task_id)
+                self._schedule_record(
+                    task_id,
+                    request.task_type,
+                    request.inputs,
+                    {"status": "cancelled", "error": "Task was cancelled"},
+                    started_at
+                )
+                return AgentResponse.model_construct(
+                    task_id=task_id,
+                    status="cancelled",
+                    error="Task was cancelled"
+                )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Final state for task %s: %s", task_id, _dump_state(final_state))
 
             # Record the operation in history
-            self._record_operation(task_id, request.task_type, request.inputs, final_state)
+            self._schedule_record(task_id, request.task_type, request.inputs, final_state, started_at)
 
             # Check if the task was cancelled
-            if self.active_tasks[task_id]["cancelled"]:
-                logger.info(f"Task {task_id} was cancelled")
-                return AgentResponse(
+            if handle.cancelled:
+                logger.info("Task %s was cancelled", task_id)
+                return AgentResponse.model_construct(
                     task_id=task_id,
                     status="cancelled",
                     error="Task was cancelled"
                 )
 
             # Prepare the response
-            response = AgentResponse(
-                task_id=task_id,
-                status=final_state.get("status", "completed"),
-                results=final_state.get("results"),
-                requires_user_confirmation=final_state.get("requires_confirmation", False),
-                preview=final_state.get("preview"),
-                changes=final_state.get("changes"),
-                error=final_state.get("error")
-            )
-
-            # Clean up
-            del self.active_tasks[task_id]
+            payload = {name: final_state.get(key) for name, key in _RESPONSE_FIELDS}
+            payload["status"] = payload["status"] or "completed"
+            payload["requires_user_confirmation"] = bool(payload["requires_user_confirmation"])
+            response = AgentResponse.model_construct(task_id=task_id, **payload)
 
-            logger.info(f"Task {task_id} completed with status: {response.status}")
+            logger.info("Task %s completed with status: %s", task_id, response.status)
             return response
 
         except Exception as e:
             # Handle exceptions
-            logger.exception(f"Error executing task {task_id}: {str(e)}")
-            if task_id in self.active_tasks:
-                del self.active_tasks[task_id]
-
-            return AgentResponse(
+            logger.exception("Error executing task %s: %s", task_id, e)
+            return AgentResponse.model_construct(
                 task_id=task_id,
                 status="error",
                 error=str(e)
             )
 
+        finally:
+            # Clean up
+            self.active_tasks.pop(task_id, None)
+
+    async def _execute_tool(
+        self,
+        task_id: str,
+        request: AgentRequest,
+        started_at: datetime.datetime
+    ) -> AgentResponse:
+        """
+        Execute a task that maps directly onto a single tool.
+
+        These tasks need no planning or verification, so the tool is called
+        without going through the workflow.
+
+        Args:
+            task_id: The ID of the task.
+            request: The request to execute.
+            started_at: When the task started.
+
+        Returns:
+            The response with the tool result.
+        """
+        tool = self._replica_configurable(task_id)["tools"][request.task_type]
+        results = await tool._arun(**request.inputs)
+        self._schedule_record(
+            task_id,
+            request.task_type,
+            request.inputs,
+            {"status": "completed", "results": results},
+            started_at
+        )
+
+        logger.info("Task %s completed with status: completed", task_id)
+        return AgentResponse.model_construct(task_id=task_id, status="completed", results=results)
+
     async def cancel(self, task_id: str) -> bool:
         """Cancel an ongoing task."""
-        if task_id in self.active_tasks:
-            logger.info(f"Cancelling task {task_id}")
-            self.active_tasks[task_id]["cancelled"] = True
+        handle = self.active_tasks.get(task_id)
+        if handle is not None:
+            logger.info("Cancelling task %s", task_id)
+            handle.cancel()
 
             # Record the cancellation in history
             self._record_cancellation(task_id)
 
             return True
-        logger.warning(f"Attempted to cancel non-existent task {task_id}")
+        logger.warning("Attempted to cancel non-existent task %s", task_id)
         return False
 
-    def _record_operation(self, task_id: str, task_type: str, inputs: Dict[str, Any], final_state: Dict[str, Any]) -> None:
+    async def close(self) -> None:
+        """Write any queued history records and stop the history worker."""
+        worker, self._history_worker = self._history_worker, None
+        if worker is None:
+            return
+
+        if not worker.done():
+            await self._history_queue.join()
+        worker.cancel()
+        try:
+            await worker
+        except asyncio.CancelledError:
+            pass
+
+    def _schedule_record(
+        self,
+        task_id: str,
+        task_type: str,
+        inputs: Dict[str, Any],
+        final_state: Dict[str, Any],
+        timestamp: datetime.datetime
+    ) -> None:
         """
-        Record an operation in the history.
+        Record an operation in the history without delaying the response.
 
         Args:
             task_id: The ID of the task.
             task_type: The type of task.
             inputs: The inputs to the task.
             final_state: The final state of the task.
+            timestamp: When the task started.
         """
-        try:
-            # Determine the operation type
-            operation_type = OperationType.CUSTOM
-            if task_type == "generate_code":
-                operation_type = OperationType.GENERATE_CODE
-            elif task_type == "analyze_code":
-                operation_type = OperationType.ANALYZE_CODE
-            elif task_type == "write_file":
-                operation_type = OperationType.WRITE_FILE
-            elif task_type == "read_file":
-                operation_type = OperationType.READ_FILE
-
-            # Determine the operation status
-            status = OperationStatus.SUCCESS
-            if final_state.get("status") == "error":
-                status = OperationStatus.FAILURE
-            elif final_state.get("status") == "cancelled":
-                status = OperationStatus.CANCELLED
-
-            # Create the operation record
-            operation = OperationRecord(
-                id=task_id,
-                type=operation_type,
-                timestamp=datetime.datetime.now(),
-                status=status,
-                params=inputs,
-                result=final_state.get("results"),
-                error=final_state.get("error")
-            )
+        if self._history_worker is None or self._history_worker.done():
+            self._history_queue = asyncio.Queue(maxsize=HISTORY_QUEUE_SIZE)
+            self._history_worker = asyncio.create_task(self._consume_history(self._history_queue))
 
-            # Create the history entry
-            entry = HistoryEntry(
-                id=task_id,
-                timestamp=datetime.datetime.now(),
-                operation=operation,
-                description=f"{task_type} operation",
-                can_undo=False  # For now, we don't support undo
-            )
+        try:
+            self._history_queue.put_nowait((task_id, task_type, inputs, final_state, timestamp))
+        except asyncio.QueueFull:
+            logger.warning("History queue is full, dropping record for task %s", task_id)
 
-            # Add the entry to the history
-            self.history_manager.add_entry(entry)
+    async def _consume_history(self, queue: asyncio.Queue) -> None:
+        """
+        Write queued operations to the history in batches.
 
-        except Exception as e:
-            logger.error(f"Error recording operation in history: {str(e)}")
+        Args:
+            queue: The queue of operations to record.
+        """
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < HISTORY_BATCH_SIZE and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            try:
+                self.history_manager.add_entries([_build_history_entry(*record) for record in batch])
+            except Exception as e:
+                logger.error("Error recording operations in history: %s", e)
+            finally:
+                for _ in batch:
+                    queue.task_done()
 
     def _record_cancellation(self, task_id: str) -> None:
         """
@@ -262,4 +596,4 @@ class LangGraphAgent(BaseAgent):
                 entry.operation.status = OperationStatus.CANCELLED
 
         except Exception as e:
-            logger.error(f"Error recording cancellation in history: {str(e)}")
+            logger.error("Error recording cancellation in history: %s", e)
@@ -4,31 +4,56 @@ State models for the LangGraph agent.
 This module defines the state models used by the LangGraph agent.
 """
 
-from typing import Dict, Any, Optional, List, Union
+from dataclasses import dataclass, field
+from typing import Annotated, Dict, Any, Mapping, Optional, List, Union
 
-from pydantic import BaseModel, Field
 
 
-class AgentState(BaseModel):
-    """Agent state model for LangGraph workflow."""
+def take_latest(current: Any, update: Any) -> Any:
+    """
+    Reducer that keeps the most recent value.
+
+    Used for fields that parallel workflow branches may both write in the
+    same step.
+
+    Args:
+        current: The current value.
+        update: The new value.
+
+    Returns:
+        The new value.
+    """
+    return update
+
+
+@dataclass(slots=True)
+class AgentState:
+    """
+    Agent state model for LangGraph workflow.
+
+    The state is a slotted dataclass rather than a Pydantic model: it is
+    copied and mutated at every workflow step, and its contents are built by
+    the agent itself, so per-step validation would be wasted work.
+    """
 
     # Task information
-    task_id: str = Field(description="Unique identifier for the task")
-    task_type: str = Field(description="Type of task to perform")
+    task_id: str = field(metadata={"description": "Unique identifier for the task"})
+    task_type: str = field(metadata={"description": "Type of task to perform"})
 
     # Input and context
-    inputs: Dict[str, Any] = Field(default_factory=dict, description="Input data for the task")
-    context: Dict[str, Any] = Field(default_factory=dict, description="Additional context for the task")
+    inputs: Dict[str, Any] = field(default_factory=dict, metadata={"description": "Input data for the task"})
+    context: Mapping[str, Any] = field(default_factory=dict, metadata={"description": "Additional context for the task; read-only"})
 
     # Status and results
-    status: str = Field(default="in_progress", description="Current status of the task")
-    results: Optional[Dict[str, Any]] = Field(default=None, description="Results of the task")
-    changes: Optional[Dict[str, Any]] = Field(default=None, description="Changes made by the task")
-    error: Optional[Union[str, Dict[str, Any]]] = Field(default=None, description="Error information if the task failed")
-    recovery_options: Optional[List[Dict[str, Any]]] = Field(default=None, description="Available recovery options")
-    operation_id: Optional[str] = Field(default=None, description="ID of the current operation")
+    status: Annotated[str, take_latest] = field(default="in_progress", metadata={"description": "Current status of the task"})
+    results: Optional[Dict[str, Any]] = field(default=None, metadata={"description": "Results of the task"})
+    changes: Optional[Dict[str, Any]] = field(default=None, metadata={"description": "Changes made by the task"})
+    error: Optional[Union[str, Dict[str, Any]]] = field(default=None, metadata={"description": "Error information if the task failed"})
+    recovery_options: Optional[List[Dict[str, Any]]] = field(default=None, metadata={"description": "Available recovery options"})
+    operation_id: Optional[str] = field(default=None, metadata={"description": "ID of the current operation"})
 
     # Additional fields
-    requires_confirmation: bool = Field(default=False, description="Whether the task requires user confirmation")
-    preview: Optional[str] = Field(default=None, description="Preview of the changes to be made")
-    verification_passed: bool = Field(default=True, description="Whether verification passed")
+    requires_confirmation: bool = field(default=False, metadata={"description": "Whether the task requires user confirmation"})
+    preview: Optional[str] = field(default=None, metadata={"description": "Preview of the changes to be made"})
+    verification_passed: bool = field(default=True, metadata={"description": "Whether verification passed"})
+    retry_count: int = field(default=0, metadata={"description": "Number of failed verifications"})
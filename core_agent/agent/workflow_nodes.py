@@ -4,15 +4,22 @@ Workflow nodes for the LangGraph agent.
 This module implements the nodes used in the LangGraph workflow.
 """
 
-import traceback
-from typing import Any, List
-
+import asyncio
+import functools
+import hashlib
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+import orjson
 from langchain.llms.base import BaseLLM
 
 from core_agent.agent.state_models import AgentState
 from core_agent.error.error_handler import ErrorHandler, ErrorCategory, ErrorSeverity
 from core_agent.error.exceptions import ToolException, WorkflowException
 from core_agent.error.recovery_service import RecoveryService
+from shared.utils.cache_utils import TTLCache
 from shared.utils.logging_utils import get_logger
 
 logger = get_logger(__name__)
@@ -29,15 +36,15 @@ def understand_request(state: AgentState, llm: BaseLLM) -> AgentState:
     Returns:
         The updated state.
     """
-    logger.info(f"Understanding request for task {state.task_id}")
+    logger.info("Understanding request for task %s", state.task_id)
 
     # Extract the task type and inputs
     task_type = state.task_type
     inputs = state.inputs
 
     # Log the task details
-    logger.debug(f"Task type: {task_type}")
-    logger.debug(f"Inputs: {inputs}")
+    logger.debug("Task type: %s", task_type)
+    logger.debug("Inputs: %s", inputs)
 
     # Update the state with the understood request
     state.status = "understanding_request"
@@ -59,7 +66,7 @@ def analyze_context(state: AgentState, llm: BaseLLM) -> AgentState:
     Returns:
         The updated state.
     """
-    logger.info(f"Analyzing context for task {state.task_id}")
+    logger.info("Analyzing context for task %s", state.task_id)
 
     # Extract the task type and inputs
     task_type = state.task_type
@@ -75,6 +82,87 @@ def analyze_context(state: AgentState, llm: BaseLLM) -> AgentState:
     return state
 
 
+def _plan_generate_code(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Plan the changes for a generate_code task."""
+    return {
+        "type": "code_generation",
+        "prompt": inputs.get("prompt", ""),
+        "language": inputs.get("language", "python"),
+        "context": inputs.get("context"),
+        "file_path": inputs.get("file_path"),
+        "use_project_context": inputs.get("use_project_context", True),
+        "max_context_files": inputs.get("max_context_files", 3),
+        "options": inputs.get("options", {})
+    }
+
+
+def _plan_analyze_code(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Plan the changes for an analyze_code task."""
+    return {
+        "type": "code_analysis",
+        "file_path": inputs.get("file_path", ""),
+        "content": inputs.get("content", ""),
+        "language": inputs.get("language", "python")
+    }
+
+
+def _plan_analyze_cross_file_dependencies(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Plan the changes for an analyze_cross_file_dependencies task."""
+    return {
+        "type": "cross_file_analysis",
+        "file_paths": inputs.get("file_paths", []),
+        "content_map": inputs.get("content_map"),
+        "options": inputs.get("options", {})
+    }
+
+
+def _plan_refactor_code(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Plan the changes for a refactor_code task."""
+    return {
+        "type": "code_refactoring",
+        "refactoring_type": inputs.get("refactoring_type", ""),
+        "file_paths": inputs.get("file_paths", []),
+        "target_symbol": inputs.get("target_symbol"),
+        "new_name": inputs.get("new_name"),
+        "selection": inputs.get("selection"),
+        "options": inputs.get("options", {})
+    }
+
+
+def _plan_complete_code(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Plan the changes for a complete_code task."""
+    return {
+        "type": "code_completion",
+        "file_path": inputs.get("file_path", ""),
+        "position": inputs.get("position", {"line": 0, "character": 0}),
+        "prefix": inputs.get("prefix"),
+        "context": inputs.get("context"),
+        "options": inputs.get("options", {})
+    }
+
+
+def _plan_write_file(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Plan the changes for a write_file task."""
+    return {
+        "type": "file_write",
+        "file_path": inputs.get("file_path", ""),
+        "content": inputs.get("content", ""),
+        "encoding": inputs.get("encoding", "utf-8"),
+        "requires_confirmation": True
+    }
+
+
+# Plan builders keyed by task type
+_PLAN_HANDLERS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "generate_code": _plan_generate_code,
+    "analyze_code": _plan_analyze_code,
+    "analyze_cross_file_dependencies": _plan_analyze_cross_file_dependencies,
+    "refactor_code": _plan_refactor_code,
+    "complete_code": _plan_complete_code,
+    "write_file": _plan_write_file
+}
+
+
 def plan_changes(state: AgentState, llm: BaseLLM) -> AgentState:
     """
     Plan the changes to make.
@@ -86,7 +174,7 @@ def plan_changes(state: AgentState, llm: BaseLLM) -> AgentState:
     Returns:
         The updated state.
     """
-    logger.info(f"Planning changes for task {state.task_id}")
+    logger.info("Planning changes for task %s", state.task_id)
 
     # Extract the task type and inputs
     task_type = state.task_type
@@ -97,87 +185,203 @@ def plan_changes(state: AgentState, llm: BaseLLM) -> AgentState:
 
     # For now, just create a simple plan
     # In a real implementation, this would use the LLM to plan the changes
-
-    if task_type == "generate_code":
-        state.changes = {
-            "type": "code_generation",
-            "prompt": inputs.get("prompt", ""),
-            "language": inputs.get("language", "python"),
-            "context": inputs.get("context"),
-            "file_path": inputs.get("file_path"),
-            "use_project_context": inputs.get("use_project_context", True),
-            "max_context_files": inputs.get("max_context_files", 3),
-            "options": inputs.get("options", {})
-        }
-    elif task_type == "analyze_code":
-        state.changes = {
-            "type": "code_analysis",
-            "file_path": inputs.get("file_path", ""),
-            "content": inputs.get("content", ""),
-            "language": inputs.get("language", "python")
-        }
-    elif task_type == "analyze_cross_file_dependencies":
-        state.changes = {
-            "type": "cross_file_analysis",
-            "file_paths": inputs.get("file_paths", []),
-            "content_map": inputs.get("content_map"),
-            "options": inputs.get("options", {})
-        }
-    elif task_type == "refactor_code":
-        state.changes = {
-            "type": "code_refactoring",
-            "refactoring_type": inputs.get("refactoring_type", ""),
-            "file_paths": inputs.get("file_paths", []),
-            "target_symbol": inputs.get("target_symbol"),
-            "new_name": inputs.get("new_name"),
-            "selection": inputs.get("selection"),
-            "options": inputs.get("options", {})
-        }
-    elif task_type == "complete_code":
-        state.changes = {
-            "type": "code_completion",
-            "file_path": inputs.get("file_path", ""),
-            "position": inputs.get("position", {"line": 0, "character": 0}),
-            "prefix": inputs.get("prefix"),
-            "context": inputs.get("context"),
-            "options": inputs.get("options", {})
-        }
-    elif task_type == "write_file":
-        state.changes = {
-            "type": "file_write",
-            "file_path": inputs.get("file_path", ""),
-            "content": inputs.get("content", ""),
-            "encoding": inputs.get("encoding", "utf-8"),
-            "requires_confirmation": True
-        }
+    handler = _PLAN_HANDLERS.get(task_type)
+    if handler is not None:
+        state.changes = handler(inputs)
 
     return state
 
 
-# Initialize recovery service
-recovery_service = RecoveryService(history_file=".prismata/operation_history.json")
+@functools.lru_cache(maxsize=1)
+def _get_recovery_service() -> RecoveryService:
+    """
+    Get the recovery service, creating it on first use.
+
+    Creating the service reads the history file, so it is deferred until an
+    operation is recorded rather than done at import time.
+
+    Returns:
+        The shared recovery service.
+    """
+    return RecoveryService(history_file=".prismata/operation_history.jsonl")
+
+
+# The recovery service writes its history file on every update. Its calls,
+# including the first one that creates it, run on one worker thread, which
+# keeps them off the event loop and in order.
+_recovery_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recovery")
+
+
+def _call_recovery(method: str, *args: Any, **kwargs: Any) -> Any:
+    """Call a recovery service method by name."""
+    return getattr(_get_recovery_service(), method)(*args, **kwargs)
+
+
+def _run_recovery(method: str, *args: Any, **kwargs: Any) -> Awaitable[Any]:
+    """
+    Run a recovery service call on the recovery worker thread.
 
+    Args:
+        method: The name of the recovery service method.
+        *args: Positional arguments for the method.
+        **kwargs: Keyword arguments for the method.
 
-def execute_changes(state: AgentState, tools: List[Any]) -> AgentState:
+    Returns:
+        A future for the result of the call.
+    """
+    return asyncio.get_running_loop().run_in_executor(
+        _recovery_executor, functools.partial(_call_recovery, method, *args, **kwargs)
+    )
+
+
+def _get_tool(tools: Dict[str, Any], name: str) -> Any:
+    """
+    Get a tool by name.
+
+    Args:
+        tools: The tools to use, keyed by name.
+        name: The name of the tool.
+
+    Returns:
+        The tool.
+
+    Raises:
+        ValueError: If the tool is not available.
+    """
+    tool = tools.get(name)
+    if not tool:
+        raise ValueError(f"{name} tool not found")
+    return tool
+
+
+def _code_generation_kwargs(changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a code_generation change to generate_code tool arguments."""
+    get = changes.get
+    return {
+        "prompt": get("prompt", ""),
+        "language": get("language", "python"),
+        "context": get("context"),
+        "file_path": get("file_path"),
+        "position": get("position"),
+        "options": get("options", {}),
+        "use_project_context": get("use_project_context", True),
+        "max_context_files": get("max_context_files", 3)
+    }
+
+
+def _code_analysis_kwargs(changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a code_analysis change to analyze_code tool arguments."""
+    get = changes.get
+    return {
+        "code": get("content", ""),
+        "language": get("language", "python"),
+        "file_path": get("file_path")
+    }
+
+
+def _cross_file_analysis_kwargs(changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a cross_file_analysis change to cross_file_analysis tool arguments."""
+    get = changes.get
+    return {
+        "file_paths": get("file_paths", []),
+        "content_map": get("content_map"),
+        "options": get("options", {})
+    }
+
+
+def _code_refactoring_kwargs(changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a code_refactoring change to refactor_code tool arguments."""
+    get = changes.get
+    return {
+        "refactoring_type": get("refactoring_type", ""),
+        "file_paths": get("file_paths", []),
+        "target_symbol": get("target_symbol"),
+        "new_name": get("new_name"),
+        "selection": get("selection"),
+        "options": get("options", {})
+    }
+
+
+def _code_completion_kwargs(changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a code_completion change to code_completion tool arguments."""
+    get = changes.get
+    return {
+        "file_path": get("file_path", ""),
+        "position": get("position", {"line": 0, "character": 0}),
+        "prefix": get("prefix"),
+        "context": get("context"),
+        "options": get("options", {})
+    }
+
+
+def _file_write_kwargs(changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a file_write change to write_file tool arguments."""
+    get = changes.get
+    return {
+        "file_path": get("file_path", ""),
+        "content": get("content", ""),
+        "encoding": get("encoding", "utf-8"),
+        "requires_confirmation": get("requires_confirmation", True)
+    }
+
+
+# Tool name and argument mapper for each change type
+_TOOL_CHANGE_MAP: Dict[str, Tuple[str, Callable[[Dict[str, Any]], Dict[str, Any]]]] = {
+    "code_generation": ("generate_code", _code_generation_kwargs),
+    "code_analysis": ("analyze_code", _code_analysis_kwargs),
+    "cross_file_analysis": ("cross_file_analysis", _cross_file_analysis_kwargs),
+    "code_refactoring": ("refactor_code", _code_refactoring_kwargs),
+    "code_completion": ("code_completion", _code_completion_kwargs),
+    "file_write": ("write_file", _file_write_kwargs)
+}
+
+
+def _apply_result(state: AgentState, result: Dict[str, Any]) -> None:
+    """Update the state with a tool result."""
+    state.results = result
+    state.status = "completed"
+
+
+def _apply_file_write_result(state: AgentState, result: Dict[str, Any]) -> None:
+    """Update the state with a write_file result, which may need confirmation."""
+    state.results = result
+    state.status = "completed" if not result.get("requires_confirmation") else "awaiting_confirmation"
+    state.requires_confirmation = result.get("requires_confirmation", False)
+    state.preview = result.get("preview")
+
+
+# Result handlers for change types that need more than _apply_result
+_RESULT_HANDLERS: Dict[str, Callable[[AgentState, Dict[str, Any]], None]] = {
+    "file_write": _apply_file_write_result
+}
+
+
+# Result for tasks with nothing to execute. It is shared between tasks, so
+# consumers must not mutate it. A plain dict rather than a MappingProxyType
+# so responses carrying it still serialize.
+_NO_CHANGES_RESULT: Dict[str, Any] = {"message": "No changes to execute"}
+
+
+async def execute_changes(state: AgentState, tools: Dict[str, Any]) -> AgentState:
     """
     Execute the planned changes.
 
     Args:
         state: The current state.
-        tools: The tools to use.
+        tools: The tools to use, keyed by name.
 
     Returns:
         The updated state.
     """
-    logger.info(f"Executing changes for task {state.task_id}")
+    logger.info("Executing changes for task %s", state.task_id)
 
     # Extract the changes
     changes = state.changes
 
     if not changes:
-        logger.warning(f"No changes to execute for task {state.task_id}")
+        logger.warning("No changes to execute for task %s", state.task_id)
         state.status = "completed"
-        state.results = {"message": "No changes to execute"}
+        state.results = _NO_CHANGES_RESULT
         return state
 
     # Update the state
@@ -186,150 +390,27 @@ def execute_changes(state: AgentState, tools: List[Any]) -> AgentState:
     # Execute the changes based on the type
     change_type = changes.get("type")
 
-    # Create operation record
-    operation = recovery_service.create_operation(
-        operation_type=change_type,
-        inputs=changes,
-        metadata={
-            "task_id": state.task_id,
-            "task_type": state.task_type
-        }
-    )
-
-    # Start operation
-    recovery_service.start_operation(operation.operation_id)
+    # The operation is recorded once, when it reaches a terminal state
+    operation_id = secrets.token_hex(16)
+    started_at = time.time_ns() // 1_000_000
+    metadata = {
+        "task_id": state.task_id,
+        "task_type": state.task_type
+    }
 
     try:
-        if change_type == "code_generation":
-            # Find the generate_code tool
-            generate_code_tool = next((tool for tool in tools if tool.name == "generate_code"), None)
-
-            if not generate_code_tool:
-                raise ValueError("generate_code tool not found")
-
-            # Execute the tool
-            result = generate_code_tool._run(
-                prompt=changes.get("prompt", ""),
-                language=changes.get("language", "python"),
-                context=changes.get("context"),
-                file_path=changes.get("file_path"),
-                position=changes.get("position"),
-                options=changes.get("options", {}),
-                use_project_context=changes.get("use_project_context", True),
-                max_context_files=changes.get("max_context_files", 3)
-            )
-
-            # Update the state with the results
-            state.results = result
-            state.status = "completed"
-
-        elif change_type == "code_analysis":
-            # Find the analyze_code tool
-            analyze_code_tool = next((tool for tool in tools if tool.name == "analyze_code"), None)
-
-            if not analyze_code_tool:
-                raise ValueError("analyze_code tool not found")
-
-            # Execute the tool
-            result = analyze_code_tool._run(
-                code=changes.get("content", ""),
-                language=changes.get("language", "python"),
-                file_path=changes.get("file_path")
-            )
-
-            # Update the state with the results
-            state.results = result
-            state.status = "completed"
-
-        elif change_type == "cross_file_analysis":
-            # Find the cross_file_analysis tool
-            cross_file_analysis_tool = next((tool for tool in tools if tool.name == "cross_file_analysis"), None)
-
-            if not cross_file_analysis_tool:
-                raise ValueError("cross_file_analysis tool not found")
-
-            # Execute the tool
-            result = cross_file_analysis_tool._run(
-                file_paths=changes.get("file_paths", []),
-                content_map=changes.get("content_map"),
-                options=changes.get("options", {})
-            )
-
-            # Update the state with the results
-            state.results = result
-            state.status = "completed"
-
-        elif change_type == "code_refactoring":
-            # Find the refactor_code tool
-            refactor_code_tool = next((tool for tool in tools if tool.name == "refactor_code"), None)
-
-            if not refactor_code_tool:
-                raise ValueError("refactor_code tool not found")
-
-            # Execute the tool
-            result = refactor_code_tool._run(
-                refactoring_type=changes.get("refactoring_type", ""),
-                file_paths=changes.get("file_paths", []),
-                target_symbol=changes.get("target_symbol"),
-                new_name=changes.get("new_name"),
-                selection=changes.get("selection"),
-                options=changes.get("options", {})
-            )
-
-            # Update the state with the results
-            state.results = result
-            state.status = "completed"
-
-        elif change_type == "code_completion":
-            # Find the code_completion tool
-            code_completion_tool = next((tool for tool in tools if tool.name == "code_completion"), None)
-
-            if not code_completion_tool:
-                raise ValueError("code_completion tool not found")
-
-            # Execute the tool
-            result = code_completion_tool._run(
-                file_path=changes.get("file_path", ""),
-                position=changes.get("position", {"line": 0, "character": 0}),
-                prefix=changes.get("prefix"),
-                context=changes.get("context"),
-                options=changes.get("options", {})
-            )
-
-            # Update the state with the results
-            state.results = result
-            state.status = "completed"
-
-        elif change_type == "file_write":
-            # Find the write_file tool
-            write_file_tool = next((tool for tool in tools if tool.name == "write_file"), None)
-
-            if not write_file_tool:
-                raise ValueError("write_file tool not found")
-
-            # Execute the tool
-            result = write_file_tool._run(
-                file_path=changes.get("file_path", ""),
-                content=changes.get("content", ""),
-                encoding=changes.get("encoding", "utf-8"),
-                requires_confirmation=changes.get("requires_confirmation", True)
-            )
-
-            # Update the state with the results
-            state.results = result
-            state.status = "completed" if not result.get("requires_confirmation") else "awaiting_confirmation"
-            state.requires_confirmation = result.get("requires_confirmation", False)
-            state.preview = result.get("preview")
-
+        entry = _TOOL_CHANGE_MAP.get(change_type)
+        if entry is not None:
+            tool_name, build_kwargs = entry
+            result = await _get_tool(tools, tool_name)._arun(**build_kwargs(changes))
+            _RESULT_HANDLERS.get(change_type, _apply_result)(state, result)
         else:
-            logger.warning(f"Unknown change type: {change_type}")
+            logger.warning("Unknown change type: %s", change_type)
             state.status = "error"
             state.error = f"Unknown change type: {change_type}"
 
     except Exception as e:
-        logger.exception(f"Error executing changes: {str(e)}")
-
-        # Create error info
+        # Create error info; ErrorHandler logs it with the traceback
         if isinstance(e, ToolException):
             error_category = ErrorCategory.TOOL
         elif isinstance(e, WorkflowException):
@@ -346,30 +427,70 @@ def execute_changes(state: AgentState, tools: List[Any]) -> AgentState:
             severity=ErrorSeverity.ERROR,
             details={
                 "change_type": change_type,
-                "changes": changes,
-                "stack_trace": traceback.format_exc()
+                "changes": changes
             },
-            operation_id=operation.operation_id
+            operation_id=operation_id
         )
 
-        # Update operation record
-        recovery_service.fail_operation(operation.operation_id, error_info)
+        # Record the failed operation
+        await _run_recovery(
+            "record_operation",
+            operation_type=change_type,
+            inputs=changes,
+            metadata=metadata,
+            error=error_info,
+            operation_id=operation_id,
+            started_at=started_at
+        )
 
         # Update state
         state.status = "error"
         state.error = error_info.to_dict()
         return state
 
-    # Complete operation
-    recovery_service.complete_operation(operation.operation_id, state.results or {})
+    # Record the completed operation
+    await _run_recovery(
+        "record_operation",
+        operation_type=change_type,
+        inputs=changes,
+        metadata=metadata,
+        result=state.results,
+        operation_id=operation_id,
+        started_at=started_at
+    )
 
     return state
 
 
+# Verification outcomes keyed by a hash of the results and changes
+_verify_cache = TTLCache(maxsize=1024)
+
+# Number of times plan_changes is retried after a failed verification
+MAX_VERIFICATION_RETRIES = 3
+
+
+def _verification_key(state: AgentState) -> str:
+    """
+    Compute a stable key for the results and changes of a state.
+
+    Args:
+        state: The current state.
+
+    Returns:
+        A hex digest of the results and changes.
+    """
+    data = orjson.dumps([state.results, state.changes], option=orjson.OPT_SORT_KEYS, default=str)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
 def verify_results(state: AgentState, llm: BaseLLM) -> AgentState:
     """
     Verify the results of the changes.
 
+    Verification outcomes are memoized on the results and changes. If a retry
+    reproduces results that already failed verification, or the retry budget
+    is exhausted, the task fails instead of looping back to plan_changes.
+
     Args:
         state: The current state.
         llm: The LLM to use.
@@ -377,22 +498,73 @@ def verify_results(state: AgentState, llm: BaseLLM) -> AgentState:
     Returns:
         The updated state.
     """
-    logger.info(f"Verifying results for task {state.task_id}")
+    logger.info("Verifying results for task %s", state.task_id)
+
+    # Passes are shared across tasks; failures only short-circuit retries of
+    # the same task, so a transient failure does not fail later requests
+    key = _verification_key(state)
+    failure_key = (state.task_id, key)
+    if _verify_cache.get(key):
+        passed = True
+    elif failure_key in _verify_cache:
+        # Same results as a failed attempt; retrying would not change them
+        passed = False
+        state.retry_count = MAX_VERIFICATION_RETRIES
+    else:
+        passed = _verify(state, llm)
+        _verify_cache.set(key if passed else failure_key, passed)
+
+    state.verification_passed = passed
+    if passed:
+        state.status = "verifying_results"
+        return state
+
+    state.retry_count += 1
+    if state.retry_count > MAX_VERIFICATION_RETRIES:
+        logger.warning("Verification failed for task %s, giving up", state.task_id)
+        state.status = "error"
+        state.error = state.error or "Verification of the results failed"
+
+    return state
 
+
+def _verify(state: AgentState, llm: BaseLLM) -> bool:
+    """
+    Check the results of the changes.
+
+    Args:
+        state: The current state.
+        llm: The LLM to use.
+
+    Returns:
+        Whether verification passed.
+    """
     # Extract the results
     results = state.results
 
     if not results:
-        logger.warning(f"No results to verify for task {state.task_id}")
-        state.verification_passed = False
-        return state
-
-    # Update the state
-    state.status = "verifying_results"
+        logger.warning("No results to verify for task %s", state.task_id)
+        return False
 
     # For now, just assume verification passes
     # In a real implementation, this would use the LLM to verify the results
 
-    state.verification_passed = True
+    return True
 
-    return state
+
+def route_verification(state: AgentState) -> str:
+    """
+    Choose the next step after verify_results.
+
+    Args:
+        state: The current state.
+
+    Returns:
+        "success" if verification passed, "retry" to plan the changes again,
+        or "fail" if the retry budget is exhausted.
+    """
+    if state.verification_passed:
+        return "success"
+    if state.retry_count > MAX_VERIFICATION_RETRIES:
+        return "fail"
+    return "retry"
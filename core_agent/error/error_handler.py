@@ -4,10 +4,14 @@ Error handling module.
 This module provides error handling and recovery mechanisms for the agent.
 """
 
+import functools
+import logging
 import sys
+import time
 import traceback
+from collections import defaultdict
 from enum import Enum
-from typing import Dict, Any, Optional, List, Callable, Type
+from typing import DefaultDict, Dict, Any, Optional, List, Callable, Type
 
 from shared.utils.logging_utils import get_logger
 
@@ -22,6 +26,15 @@ class ErrorSeverity(Enum):
     CRITICAL = "critical"   # Critical error, system may need to restart
 
 
+# Logging level for each severity value
+_LOG_LEVELS: Dict[str, int] = {
+    ErrorSeverity.INFO.value: logging.INFO,
+    ErrorSeverity.WARNING.value: logging.WARNING,
+    ErrorSeverity.ERROR.value: logging.ERROR,
+    ErrorSeverity.CRITICAL.value: logging.CRITICAL
+}
+
+
 class ErrorCategory(Enum):
     """Enum for error categories."""
     NETWORK = "network"         # Network-related errors
@@ -34,9 +47,32 @@ class ErrorCategory(Enum):
     UNKNOWN = "unknown"         # Unknown errors
 
 
+# Enum members by value, for rebuilding stored errors without Enum.__call__
+_CATEGORIES_BY_VALUE: Dict[str, ErrorCategory] = {category.value: category for category in ErrorCategory}
+_SEVERITIES_BY_VALUE: Dict[str, ErrorSeverity] = {severity.value: severity for severity in ErrorSeverity}
+
+# Marks a lazily computed ErrorInfo field that has not been computed yet
+_UNSET = object()
+
+
 class ErrorInfo:
     """Class for storing error information."""
     
+    __slots__ = (
+        "message",
+        "category",
+        "severity",
+        "_category_value",
+        "_severity_value",
+        "exception",
+        "details",
+        "_recovery_options",
+        "operation_id",
+        "timestamp",
+        "_stack_trace",
+        "_dict"
+    )
+    
     def __init__(
         self,
         message: str,
@@ -62,44 +98,109 @@ class ErrorInfo:
         self.message = message
         self.category = category
         self.severity = severity
+        self._category_value = category.value
+        self._severity_value = severity.value
         self.exception = exception
         self.details = details or {}
-        self.recovery_options = recovery_options or []
+        self._recovery_options = recovery_options or []
         self.operation_id = operation_id
         self.timestamp = self._get_timestamp()
-        self.stack_trace = self._get_stack_trace() if exception else None
+        self._stack_trace = _UNSET
+        self._dict: Optional[Dict[str, Any]] = None
     
     def _get_timestamp(self) -> int:
-        """Get current timestamp."""
-        import time
-        return int(time.time() * 1000)
+        """Get current timestamp in milliseconds."""
+        return time.time_ns() // 1_000_000
+    
+    @property
+    def stack_trace(self) -> Optional[str]:
+        """
+        Stack trace of the exception, formatted on first access.
+        
+        The trace lists file, line number and function for each frame but
+        not the source lines, so formatting it does not read source files.
+        The full traceback is still logged by ErrorHandler.
+        """
+        if self._stack_trace is _UNSET:
+            self._stack_trace = self._format_stack_trace() if self.exception else None
+        return self._stack_trace
     
-    def _get_stack_trace(self) -> str:
-        """Get stack trace from exception."""
-        if self.exception:
-            return ''.join(traceback.format_exception(
-                type(self.exception),
-                self.exception,
-                self.exception.__traceback__
-            ))
-        return ""
+    def _format_stack_trace(self) -> str:
+        """Format a compact stack trace of the exception."""
+        summary = traceback.StackSummary.extract(
+            traceback.walk_tb(self.exception.__traceback__),
+            lookup_lines=False
+        )
+        lines = []
+        if summary:
+            lines.append("Traceback (most recent call last):\n")
+            lines.extend(
+                f'  File "{frame.filename}", line {frame.lineno}, in {frame.name}\n'
+                for frame in summary
+            )
+        lines.extend(traceback.format_exception_only(type(self.exception), self.exception))
+        return ''.join(lines)
+    
+    @property
+    def recovery_options(self) -> List[Dict[str, Any]]:
+        """Available recovery options."""
+        return self._recovery_options
+    
+    @recovery_options.setter
+    def recovery_options(self, recovery_options: List[Dict[str, Any]]) -> None:
+        self._recovery_options = recovery_options
+        self._dict = None
     
     def to_dict(self) -> Dict[str, Any]:
-        """Convert error info to dictionary."""
-        return {
-            "message": self.message,
-            "category": self.category.value,
-            "severity": self.severity.value,
-            "details": self.details,
-            "recovery_options": self.recovery_options,
-            "operation_id": self.operation_id,
-            "timestamp": self.timestamp,
-            "stack_trace": self.stack_trace
-        }
+        """
+        Convert error info to dictionary.
+        
+        The dictionary is built once and reused until the recovery options
+        change, so callers must not modify it.
+        """
+        if self._dict is None:
+            self._dict = {
+                "message": self.message,
+                "category": self._category_value,
+                "severity": self._severity_value,
+                "details": self.details,
+                "recovery_options": self.recovery_options,
+                "operation_id": self.operation_id,
+                "timestamp": self.timestamp,
+                "stack_trace": self.stack_trace
+            }
+        return self._dict
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ErrorInfo':
+        """
+        Create error info from a dictionary produced by to_dict().
+        
+        The original exception is not restored, but its stored stack trace
+        and the error timestamp are.
+        
+        Args:
+            data: The error info dictionary.
+            
+        Returns:
+            The error info.
+        """
+        error_info = cls(
+            data["message"],
+            _CATEGORIES_BY_VALUE[data["category"]],
+            _SEVERITIES_BY_VALUE[data["severity"]],
+            None,
+            data.get("details"),
+            data.get("recovery_options"),
+            data.get("operation_id")
+        )
+        error_info.timestamp = data.get("timestamp") or error_info.timestamp
+        error_info._stack_trace = data.get("stack_trace")
+        return error_info
     
     def __str__(self) -> str:
         """String representation of error info."""
-        return f"{self.severity.value.upper()}: {self.message} ({self.category.value})"
+        return f"{self._severity_value.upper()}: {self.message} ({self._category_value})"
 
 
 class ErrorHandler:
@@ -125,15 +226,12 @@ class ErrorHandler:
         TypeError: ErrorSeverity.WARNING
     }
     
-    # Registry of error handlers by category
-    _error_handlers: Dict[ErrorCategory, List[Callable[[ErrorInfo], None]]] = {
-        category: [] for category in ErrorCategory
-    }
+    # Registry of error handlers by category; lookups use get() so that
+    # categories without handlers are not materialized
+    _error_handlers: DefaultDict[ErrorCategory, List[Callable[[ErrorInfo], None]]] = defaultdict(list)
     
     # Registry of recovery strategies by category
-    _recovery_strategies: Dict[ErrorCategory, Dict[str, Callable[[ErrorInfo], Any]]] = {
-        category: {} for category in ErrorCategory
-    }
+    _recovery_strategies: DefaultDict[ErrorCategory, Dict[str, Callable[[ErrorInfo], Any]]] = defaultdict(dict)
     
     @classmethod
     def handle_exception(
@@ -284,38 +382,86 @@ class ErrorHandler:
         """
         category = error_info.category
         
-        if strategy_name not in cls._recovery_strategies[category]:
+        strategy = cls._recovery_strategies.get(category, {}).get(strategy_name)
+        if strategy is None:
             raise ValueError(f"Recovery strategy '{strategy_name}' not found for category {category.value}")
         
-        strategy = cls._recovery_strategies[category][strategy_name]
-        
-        logger.info(f"Applying recovery strategy '{strategy_name}' for error: {error_info}")
+        logger.info("Applying recovery strategy '%s' for error: %s", strategy_name, error_info)
         
         return strategy(error_info)
     
     @classmethod
     def _get_category_for_exception(cls, exception: Exception) -> ErrorCategory:
         """Get error category for an exception type."""
+        # Registered types themselves skip the memoized subclass search
+        category = cls._exception_category_map.get(type(exception))
+        if category is not None:
+            return category
+        return cls._category_for_type(type(exception))
+    
+    @classmethod
+    def _get_severity_for_exception(cls, exception: Exception) -> ErrorSeverity:
+        """Get error severity for an exception type."""
+        severity = cls._exception_severity_map.get(type(exception))
+        if severity is not None:
+            return severity
+        return cls._severity_for_type(type(exception))
+    
+    @classmethod
+    @functools.lru_cache(maxsize=256)
+    def _category_for_type(cls, exception_type: Type[BaseException]) -> ErrorCategory:
+        """Get error category for an exception type, memoized per type."""
+        category = cls._exception_category_map.get(exception_type)
+        if category is not None:
+            return category
         for exc_type, category in cls._exception_category_map.items():
-            if isinstance(exception, exc_type):
+            if issubclass(exception_type, exc_type):
                 return category
         return ErrorCategory.UNKNOWN
     
     @classmethod
-    def _get_severity_for_exception(cls, exception: Exception) -> ErrorSeverity:
-        """Get error severity for an exception type."""
+    @functools.lru_cache(maxsize=256)
+    def _severity_for_type(cls, exception_type: Type[BaseException]) -> ErrorSeverity:
+        """Get error severity for an exception type, memoized per type."""
+        severity = cls._exception_severity_map.get(exception_type)
+        if severity is not None:
+            return severity
         for exc_type, severity in cls._exception_severity_map.items():
-            if isinstance(exception, exc_type):
+            if issubclass(exception_type, exc_type):
                 return severity
         return ErrorSeverity.ERROR
     
+    @classmethod
+    def register_exception_type(
+        cls,
+        exception_type: Type[Exception],
+        category: ErrorCategory,
+        severity: ErrorSeverity
+    ) -> None:
+        """
+        Register the error category and severity for an exception type.
+        
+        Args:
+            exception_type: Exception type.
+            category: Error category for the type and its subclasses.
+            severity: Error severity for the type and its subclasses.
+        """
+        cls._exception_category_map[exception_type] = category
+        cls._exception_severity_map[exception_type] = severity
+        
+        # Lookups for subclasses may have been memoized before this mapping
+        cls._category_for_type.cache_clear()
+        cls._severity_for_type.cache_clear()
+    
     @classmethod
     def _get_recovery_options(cls, error_info: ErrorInfo) -> List[Dict[str, Any]]:
         """Get recovery options for an error."""
-        category = error_info.category
-        options = []
+        strategies = cls._recovery_strategies.get(error_info.category)
+        if not strategies:
+            return []
         
-        for name, strategy in cls._recovery_strategies[category].items():
+        options = []
+        for name, strategy in strategies.items():
             description = getattr(strategy, "__description__", "No description")
             options.append({
                 "name": name,
@@ -327,25 +473,21 @@ class ErrorHandler:
     @classmethod
     def _log_error(cls, error_info: ErrorInfo) -> None:
         """Log an error."""
-        if error_info.severity == ErrorSeverity.CRITICAL:
-            logger.critical(str(error_info), exc_info=error_info.exception)
-        elif error_info.severity == ErrorSeverity.ERROR:
-            logger.error(str(error_info), exc_info=error_info.exception)
-        elif error_info.severity == ErrorSeverity.WARNING:
-            logger.warning(str(error_info), exc_info=error_info.exception)
-        else:
-            logger.info(str(error_info))
+        level = _LOG_LEVELS.get(error_info._severity_value, logging.INFO)
+        if not logger.isEnabledFor(level):
+            return
+        exc_info = error_info.exception if level >= logging.WARNING else None
+        # %s defers str(error_info) to the handlers
+        logger.log(level, "%s", error_info, exc_info=exc_info)
     
     @classmethod
     def _call_handlers(cls, error_info: ErrorInfo) -> None:
         """Call registered handlers for an error."""
-        category = error_info.category
-        
-        for handler in cls._error_handlers[category]:
+        for handler in cls._error_handlers.get(error_info.category, ()):
             try:
                 handler(error_info)
             except Exception as e:
-                logger.error(f"Error in error handler: {e}")
+                logger.error("Error in error handler: %s", e)
 
 
 # Register default recovery strategies
@@ -353,7 +495,7 @@ class ErrorHandler:
 def _retry_network_operation(error_info: ErrorInfo) -> Any:
     """Retry a network operation."""
     # This is a placeholder. In a real implementation, this would retry the operation.
-    logger.info(f"Retrying network operation for error: {error_info}")
+    logger.info("Retrying network operation for error: %s", error_info)
     return None
 
 ErrorHandler.register_recovery_strategy(
@@ -366,7 +508,7 @@ ErrorHandler.register_recovery_strategy(
 def _skip_file(error_info: ErrorInfo) -> Any:
     """Skip a file that caused an error."""
     # This is a placeholder. In a real implementation, this would skip the file.
-    logger.info(f"Skipping file for error: {error_info}")
+    logger.info("Skipping file for error: %s", error_info)
     return None
 
 ErrorHandler.register_recovery_strategy(
@@ -379,7 +521,7 @@ ErrorHandler.register_recovery_strategy(
 def _create_file(error_info: ErrorInfo) -> Any:
     """Create a missing file."""
     # This is a placeholder. In a real implementation, this would create the file.
-    logger.info(f"Creating missing file for error: {error_info}")
+    logger.info("Creating missing file for error: %s", error_info)
     return None
 
 ErrorHandler.register_recovery_strategy(
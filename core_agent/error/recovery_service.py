@@ -4,18 +4,82 @@ Recovery service module.
 This module provides operation history tracking and recovery mechanisms.
 """
 
-import json
+import atexit
+import heapq
+import itertools
 import os
+import secrets
+import struct
+import threading
 import time
-import uuid
-from typing import Dict, Any, Optional, List, Callable
+from collections import OrderedDict
+from typing import BinaryIO, Dict, Any, Iterator, Optional, List, Callable, Tuple
 
-from core_agent.error.error_handler import ErrorHandler, ErrorInfo, ErrorCategory, ErrorSeverity
+import orjson
+
+from core_agent.error.error_handler import ErrorHandler, ErrorInfo
 from shared.utils.logging_utils import get_logger
 
 logger = get_logger(__name__)
 
 
+
+def _page_order(operation: "OperationRecord") -> Tuple[int, int]:
+    """Sort key for get_operations: newest first, then in insertion order."""
+    return operation.timestamp, -operation.sequence
+
+# Length prefix of each record in msgpack history files
+_FRAME_HEADER = struct.Struct(">I")
+
+
+def _encode_json_record(record: Dict[str, Any]) -> bytes:
+    """Encode a history record as a JSON line."""
+    return orjson.dumps(record, default=str, option=orjson.OPT_APPEND_NEWLINE)
+
+
+def _read_json_records(f: BinaryIO) -> Iterator[Dict[str, Any]]:
+    """Read history records from a JSON Lines file."""
+    for line in f:
+        if not line.strip():
+            continue
+        try:
+            yield orjson.loads(line)
+        except orjson.JSONDecodeError:
+            # A write cut short by a crash leaves a partial last line
+            logger.warning("Skipping malformed line in operation history")
+
+
+def _encode_msgpack_record(record: Dict[str, Any]) -> bytes:
+    """Encode a history record as a length-prefixed msgpack frame."""
+    import ormsgpack
+    payload = ormsgpack.packb(record, default=str)
+    return _FRAME_HEADER.pack(len(payload)) + payload
+
+
+def _read_msgpack_records(f: BinaryIO) -> Iterator[Dict[str, Any]]:
+    """Read history records from a file of length-prefixed msgpack frames."""
+    import ormsgpack
+    data = f.read()
+    offset = 0
+    while offset + _FRAME_HEADER.size <= len(data):
+        (length,) = _FRAME_HEADER.unpack_from(data, offset)
+        offset += _FRAME_HEADER.size
+        if offset + length > len(data):
+            break
+        yield ormsgpack.unpackb(data[offset:offset + length])
+        offset += length
+    if offset < len(data):
+        # A write cut short by a crash leaves a partial last frame
+        logger.warning("Skipping truncated record in operation history")
+
+
+# Record encoder and reader for each history file format
+_HISTORY_FORMATS: Dict[str, Any] = {
+    "json": (_encode_json_record, _read_json_records),
+    "msgpack": (_encode_msgpack_record, _read_msgpack_records)
+}
+
+
 class OperationStatus:
     """Operation status constants."""
     PENDING = "pending"
@@ -28,6 +92,21 @@ class OperationStatus:
 class OperationRecord:
     """Class for storing operation records."""
     
+    __slots__ = (
+        "operation_id",
+        "operation_type",
+        "inputs",
+        "status",
+        "result",
+        "error",
+        "parent_operation_id",
+        "metadata",
+        "timestamp",
+        "updated_at",
+        "sequence",
+        "_dict"
+    )
+    
     def __init__(
         self,
         operation_id: str,
@@ -60,28 +139,47 @@ class OperationRecord:
         self.error = error
         self.parent_operation_id = parent_operation_id
         self.metadata = metadata or {}
-        self.timestamp = int(time.time() * 1000)
+        self.timestamp = time.time_ns() // 1_000_000
         self.updated_at = self.timestamp
+        # Position in the service's history, assigned when the record is added
+        self.sequence = 0
+        self._dict: Optional[Dict[str, Any]] = None
     
     def update_status(self, status: str) -> None:
         """Update operation status."""
         self.status = status
-        self.updated_at = int(time.time() * 1000)
+        self.updated_at = time.time_ns() // 1_000_000
+        self._dict = None
     
     def set_result(self, result: Dict[str, Any]) -> None:
         """Set operation result."""
         self.result = result
         self.status = OperationStatus.COMPLETED
-        self.updated_at = int(time.time() * 1000)
+        self.updated_at = time.time_ns() // 1_000_000
+        self._dict = None
     
     def set_error(self, error: ErrorInfo) -> None:
         """Set operation error."""
         self.error = error
         self.status = OperationStatus.ERROR
-        self.updated_at = int(time.time() * 1000)
+        self.updated_at = time.time_ns() // 1_000_000
+        self._dict = None
     
     def to_dict(self) -> Dict[str, Any]:
-        """Convert operation record to dictionary."""
+        """
+        Convert operation record to dictionary.
+        
+        The dictionary is built once and reused until the status, result or
+        error change, so callers must not modify it. Metadata changes must be
+        made before the status update that records them. Only the thread that
+        updates the record may fill the cache; other threads use build_dict.
+        """
+        if self._dict is None:
+            self._dict = self.build_dict()
+        return self._dict
+    
+    def build_dict(self) -> Dict[str, Any]:
+        """Build a new dictionary of the record's current state, bypassing the cache."""
         return {
             "operation_id": self.operation_id,
             "operation_type": self.operation_type,
@@ -97,47 +195,112 @@ class OperationRecord:
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'OperationRecord':
-        """Create operation record from dictionary."""
-        error = None
-        if data.get("error"):
-            error = ErrorInfo(
-                message=data["error"]["message"],
-                category=ErrorCategory(data["error"]["category"]),
-                severity=ErrorSeverity(data["error"]["severity"]),
-                details=data["error"].get("details"),
-                recovery_options=data["error"].get("recovery_options"),
-                operation_id=data["error"].get("operation_id")
-            )
+        """
+        Create operation record from dictionary.
         
-        return cls(
-            operation_id=data["operation_id"],
-            operation_type=data["operation_type"],
-            inputs=data["inputs"],
-            status=data["status"],
-            result=data.get("result"),
-            error=error,
-            parent_operation_id=data.get("parent_operation_id"),
-            metadata=data.get("metadata", {})
-        )
+        The record is filled in directly rather than through __init__, so the
+        stored timestamps are kept instead of being reset to the load time.
+        """
+        error = data.get("error")
+        now = time.time_ns() // 1_000_000
+        
+        record = cls.__new__(cls)
+        record.operation_id = data["operation_id"]
+        record.operation_type = data["operation_type"]
+        record.inputs = data["inputs"]
+        record.status = data["status"]
+        record.result = data.get("result")
+        record.error = ErrorInfo.from_dict(error) if error else None
+        record.parent_operation_id = data.get("parent_operation_id")
+        record.metadata = data.get("metadata") or {}
+        record.timestamp = data.get("timestamp") or now
+        record.updated_at = data.get("updated_at") or record.timestamp
+        record.sequence = 0
+        record._dict = None
+        return record
 
 
 class RecoveryService:
     """Service for tracking operation history and providing recovery mechanisms."""
     
-    def __init__(self, history_file: Optional[str] = None):
+    # History records per live operation above which a flush compacts the file.
+    # An operation normally takes up to three records (created, started, and
+    # completed or failed), so only repeatedly updated operations trigger it.
+    COMPACT_RATIO = 4
+    
+    # Largest write buffer kept for reuse after a flush, in bytes
+    MAX_SPARE_BUFFER = 128 * 1024
+    
+    def __init__(
+        self,
+        history_file: Optional[str] = None,
+        flush_interval: float = 1.0,
+        max_operations: int = 10_000,
+        history_format: str = "json"
+    ):
         """
         Initialize recovery service.
         
         Args:
             history_file: Path to history file. If None, history is not persisted.
+            flush_interval: Seconds between writes of buffered history records.
+                If 0 or less, every record is written immediately.
+            max_operations: Maximum number of operations to keep. The oldest
+                operations are evicted beyond this and dropped from the
+                history file when it is next compacted.
+            history_format: Format of the history file: "json" for JSON Lines
+                or "msgpack" for length-prefixed msgpack records, which needs
+                the ormsgpack package.
         """
+        if history_format == "msgpack":
+            try:
+                import ormsgpack  # noqa: F401
+            except ImportError:
+                logger.warning("ormsgpack is not installed, using JSON operation history")
+                history_format = "json"
+        if history_format not in _HISTORY_FORMATS:
+            raise ValueError(f"Unknown history format: {history_format}")
+        
         self.history_file = history_file
-        self.operations: Dict[str, OperationRecord] = {}
+        self.history_format = history_format
+        self._encode_record, self._read_records = _HISTORY_FORMATS[history_format]
+        self.flush_interval = flush_interval
+        self.max_operations = max_operations
+        self.operations: OrderedDict[str, OperationRecord] = OrderedDict()
+        
+        # Sequence numbers that order operations with equal timestamps by
+        # when they were added, whichever index they are read from
+        self._sequence = itertools.count()
         self.recovery_handlers: Dict[str, Callable[[OperationRecord], Any]] = {}
         
-        # Load history from file if available
-        if history_file and os.path.exists(history_file):
-            self._load_history()
+        # Operations by type and by status, for filtered get_operations calls.
+        # The inner dicts map operation IDs to records.
+        self._by_type: Dict[str, Dict[str, OperationRecord]] = {}
+        self._by_status: Dict[str, Dict[str, OperationRecord]] = {}
+        self._indexed_status: Dict[str, str] = {}
+        
+        # Encoded records waiting to be written. _pending_lock guards the
+        # buffer; _write_lock keeps flushes in order without blocking callers
+        # that are only adding records, which leave the writing to a
+        # background thread. Flushing swaps in _spare, so the two buffers are
+        # reused rather than reallocated for every flush.
+        self._pending = bytearray()
+        self._pending_count = 0
+        self._spare = bytearray()
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+        self._history_fh: Optional[BinaryIO] = None
+        self._record_count = 0
+        
+        if history_file:
+            # Create directory if it doesn't exist
+            os.makedirs(os.path.dirname(history_file) or ".", exist_ok=True)
+            
+            # Load history from file if available
+            if os.path.exists(history_file):
+                self._load_history()
     
     def create_operation(
         self,
@@ -158,7 +321,7 @@ class RecoveryService:
         Returns:
             Operation record.
         """
-        operation_id = str(uuid.uuid4())
+        operation_id = secrets.token_hex(16)
         
         operation = OperationRecord(
             operation_id=operation_id,
@@ -169,8 +332,56 @@ class RecoveryService:
             metadata=metadata
         )
         
-        self.operations[operation_id] = operation
-        self._save_history()
+        self._add_operation(operation)
+        
+        return operation
+    
+    def record_operation(
+        self,
+        operation_type: str,
+        inputs: Dict[str, Any],
+        metadata: Optional[Dict[str, Any]] = None,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[ErrorInfo] = None,
+        operation_id: Optional[str] = None,
+        parent_operation_id: Optional[str] = None,
+        started_at: Optional[int] = None
+    ) -> OperationRecord:
+        """
+        Record an operation that has already finished.
+        
+        Unlike create_operation followed by complete_operation or
+        fail_operation, the record is persisted once, in its terminal state.
+        
+        Args:
+            operation_type: Type of operation.
+            inputs: Operation inputs.
+            metadata: Additional metadata.
+            result: Operation result if the operation succeeded.
+            error: Error information if the operation failed.
+            operation_id: Operation ID. If None, a new ID is generated.
+            parent_operation_id: ID of parent operation.
+            started_at: Start time in milliseconds. If None, the current time is used.
+            
+        Returns:
+            Operation record.
+        """
+        operation = OperationRecord(
+            operation_id=operation_id or secrets.token_hex(16),
+            operation_type=operation_type,
+            inputs=inputs,
+            parent_operation_id=parent_operation_id,
+            metadata=metadata
+        )
+        if started_at is not None:
+            operation.timestamp = started_at
+        
+        if error is not None:
+            operation.set_error(error)
+        else:
+            operation.set_result(result or {})
+        
+        self._add_operation(operation)
         
         return operation
     
@@ -189,7 +400,7 @@ class RecoveryService:
         """
         operation = self._get_operation(operation_id)
         operation.update_status(OperationStatus.IN_PROGRESS)
-        self._save_history()
+        self._update_operation(operation)
         
         return operation
     
@@ -209,7 +420,7 @@ class RecoveryService:
         """
         operation = self._get_operation(operation_id)
         operation.set_result(result)
-        self._save_history()
+        self._update_operation(operation)
         
         return operation
     
@@ -233,7 +444,7 @@ class RecoveryService:
         """
         operation = self._get_operation(operation_id)
         operation.set_error(error)
-        self._save_history()
+        self._update_operation(operation)
         
         return operation
     
@@ -267,11 +478,11 @@ class RecoveryService:
         result = ErrorHandler.recover(operation.error, strategy_name)
         
         # Update operation status
-        operation.update_status(OperationStatus.RECOVERED)
         operation.metadata["recovery_strategy"] = strategy_name
-        operation.metadata["recovery_timestamp"] = int(time.time() * 1000)
+        operation.metadata["recovery_timestamp"] = time.time_ns() // 1_000_000
+        operation.update_status(OperationStatus.RECOVERED)
         
-        self._save_history()
+        self._update_operation(operation)
         
         return result
     
@@ -298,18 +509,18 @@ class RecoveryService:
         inputs = operation.inputs
         
         # Check if we have a recovery handler for this operation type
-        if operation_type not in self.recovery_handlers:
+        handler = self.recovery_handlers.get(operation_type)
+        if handler is None:
             raise ValueError(f"No recovery handler registered for operation type {operation_type}")
         
         # Call the recovery handler
-        handler = self.recovery_handlers[operation_type]
         result = handler(operation)
         
         # Update operation status
+        operation.metadata["retry_timestamp"] = time.time_ns() // 1_000_000
         operation.update_status(OperationStatus.RECOVERED)
-        operation.metadata["retry_timestamp"] = int(time.time() * 1000)
         
-        self._save_history()
+        self._update_operation(operation)
         
         return result
     
@@ -361,27 +572,111 @@ class RecoveryService:
         Returns:
             List of operation records.
         """
-        operations = list(self.operations.values())
-        
-        # Apply filters
-        if operation_type:
-            operations = [op for op in operations if op.operation_type == operation_type]
-        
-        if status:
-            operations = [op for op in operations if op.status == status]
-        
-        # Sort by timestamp (newest first)
-        operations.sort(key=lambda op: op.timestamp, reverse=True)
-        
-        # Apply pagination
-        operations = operations[offset:offset + limit]
+        if operation_type and status:
+            by_type = self._by_type.get(operation_type, {})
+            by_status = self._by_status.get(status, {})
+            if len(by_type) <= len(by_status):
+                candidates = [op for op in by_type.values() if op.status == status]
+            else:
+                candidates = [op for op in by_status.values() if op.operation_type == operation_type]
+        elif operation_type:
+            candidates = self._by_type.get(operation_type, {}).values()
+        elif status:
+            candidates = self._by_status.get(status, {}).values()
+        else:
+            candidates = self.operations.values()
+        
+        # Newest first; only the records up to the end of the page are ordered
+        operations = heapq.nlargest(offset + limit, candidates, key=_page_order)[offset:]
         
         return operations
     
     def clear_history(self) -> None:
         """Clear operation history."""
-        self.operations = {}
-        self._save_history()
+        with self._write_lock:
+            with self._pending_lock:
+                self._pending.clear()
+                self._pending_count = 0
+            self.operations = OrderedDict()
+            self._by_type = {}
+            self._by_status = {}
+            self._indexed_status = {}
+            self._truncate_history()
+    
+    def compact(self) -> None:
+        """
+        Rewrite the history file as one record per current operation.
+        
+        Buffered records are dropped rather than written, since the snapshot
+        already holds each operation's latest state.
+        """
+        with self._write_lock:
+            with self._pending_lock:
+                self._pending.clear()
+                self._pending_count = 0
+            self._write_history()
+    
+    def flush(self) -> None:
+        """
+        Write buffered history records to the history file.
+        
+        If the write fails, the records stay buffered for the next flush.
+        """
+        with self._write_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, self._spare
+                pending_count, self._pending_count = self._pending_count, 0
+            
+            if not pending:
+                self._spare = pending
+                return
+            
+            try:
+                if self._history_fh is None:
+                    self._history_fh = self._open_history_file()
+                self._history_fh.write(pending)
+                self._history_fh.flush()
+                self._record_count += pending_count
+            except Exception as e:
+                logger.error(f"Error saving operation history: {e}")
+                # Put the records back ahead of any added since the swap
+                self._close_history_file()
+                with self._pending_lock:
+                    pending += self._pending
+                    self._pending.clear()
+                    self._pending, self._spare = pending, self._pending
+                    self._pending_count += pending_count
+                return
+            
+            # Keep the buffer for reuse unless a burst grew it past the cap
+            if len(pending) > self.MAX_SPARE_BUFFER:
+                self._spare = bytearray()
+            else:
+                pending.clear()
+                self._spare = pending
+            
+            # Drop superseded records once they far outnumber the live operations
+            if self._record_count > self.COMPACT_RATIO * len(self.operations):
+                self._write_history()
+    
+    def close(self) -> None:
+        """
+        Stop the background flush, write any buffered records and close the file.
+        
+        Flushes only hand records to the OS; this is the one place the file
+        is synced to disk.
+        """
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        with self._write_lock:
+            if self._history_fh is not None:
+                try:
+                    os.fsync(self._history_fh.fileno())
+                except OSError as e:
+                    logger.error(f"Error syncing operation history: {e}")
+            self._close_history_file()
     
     def _get_operation(self, operation_id: str) -> OperationRecord:
         """Get an operation record by ID."""
@@ -390,23 +685,167 @@ class RecoveryService:
         
         return self.operations[operation_id]
     
-    def _save_history(self) -> None:
-        """Save operation history to file."""
+    def _add_operation(self, operation: OperationRecord) -> None:
+        """
+        Add a new operation, evicting the oldest ones beyond max_operations.
+        
+        Args:
+            operation: The operation record.
+        """
+        previous = self.operations.get(operation.operation_id)
+        operation.sequence = previous.sequence if previous is not None else next(self._sequence)
+        self.operations[operation.operation_id] = operation
+        while len(self.operations) > self.max_operations:
+            _, evicted = self.operations.popitem(last=False)
+            self._unindex_operation(evicted)
+        self._update_operation(operation)
+    
+    def _update_operation(self, operation: OperationRecord) -> None:
+        """
+        Index and persist an operation after it is added or changed.
+        
+        Args:
+            operation: The operation record.
+        """
+        self._index_operation(operation)
+        self._append_record(operation)
+    
+    def _index_operation(self, operation: OperationRecord) -> None:
+        """
+        Add an operation to the type and status indexes.
+        
+        Args:
+            operation: The operation record.
+        """
+        operation_id = operation.operation_id
+        self._by_type.setdefault(operation.operation_type, {})[operation_id] = operation
+        
+        previous = self._indexed_status.get(operation_id)
+        if previous != operation.status:
+            if previous is not None:
+                self._by_status[previous].pop(operation_id, None)
+            self._by_status.setdefault(operation.status, {})[operation_id] = operation
+            self._indexed_status[operation_id] = operation.status
+    
+    def _unindex_operation(self, operation: OperationRecord) -> None:
+        """
+        Remove an operation from the type and status indexes.
+        
+        Args:
+            operation: The operation record.
+        """
+        operation_id = operation.operation_id
+        self._by_type.get(operation.operation_type, {}).pop(operation_id, None)
+        status = self._indexed_status.pop(operation_id, None)
+        if status is not None:
+            self._by_status[status].pop(operation_id, None)
+    
+    def _append_record(self, operation: OperationRecord) -> None:
+        """
+        Append the current state of an operation to the history file.
+        
+        The file is append-only: each update writes one record, and the last
+        record for an operation ID wins when the history is loaded.
+        Records are buffered and written by a background thread once per
+        flush interval, so callers never wait on file I/O. With a flush
+        interval of 0 or less, or after close, each record is written before
+        returning.
+        
+        Args:
+            operation: The operation record to persist.
+        """
         if not self.history_file:
             return
         
         try:
-            # Convert operations to dictionaries
-            operations_dict = {
-                op_id: op.to_dict() for op_id, op in self.operations.items()
-            }
-            
-            # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(self.history_file), exist_ok=True)
-            
-            # Write to file
-            with open(self.history_file, 'w') as f:
-                json.dump(operations_dict, f, indent=2)
+            record = self._encode_record(operation.to_dict())
+        except Exception as e:
+            logger.error(f"Error saving operation history: {e}")
+            return
+        
+        with self._pending_lock:
+            self._pending += record
+            self._pending_count += 1
+        
+        if self.flush_interval <= 0 or self._closed.is_set():
+            # Once closed there is no flush thread to write the record
+            self.flush()
+        elif self._flusher is None:
+            self._start_flusher()
+    
+    def _start_flusher(self) -> None:
+        """Start the background thread that writes buffered records."""
+        with self._pending_lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(
+                target=self._flush_periodically,
+                name="recovery-history-flush",
+                daemon=True
+            )
+        self._flusher.start()
+        atexit.register(self.close)
+    
+    def _flush_periodically(self) -> None:
+        """Flush buffered records every flush interval until closed."""
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+    
+    def _open_history_file(self) -> BinaryIO:
+        """
+        Open the history file for appending.
+        
+        The directory is created in __init__; it is only recreated here if it
+        was removed since.
+        
+        Returns:
+            The open file.
+        """
+        try:
+            return open(self.history_file, 'ab')
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(self.history_file) or ".", exist_ok=True)
+            return open(self.history_file, 'ab')
+    
+    def _close_history_file(self) -> None:
+        """Close the cached history file handle, if open."""
+        if self._history_fh is not None:
+            self._history_fh.close()
+            self._history_fh = None
+    
+    def _truncate_history(self) -> None:
+        """Empty the history file."""
+        if not self.history_file:
+            return
+        
+        try:
+            self._close_history_file()
+            open(self.history_file, 'wb').close()
+            self._record_count = 0
+        except Exception as e:
+            logger.error(f"Error saving operation history: {e}")
+    
+    def _write_history(self) -> None:
+        """Rewrite the history file with one record per current operation."""
+        if not self.history_file:
+            return
+        
+        try:
+            # This may run on the flush thread while records are updated, so
+            # the dicts are built fresh: caching one here could keep a stale
+            # dict after a concurrent update cleared the cache
+            operations = list(self.operations.values())
+            data = b"".join(
+                self._encode_record(op.build_dict())
+                for op in operations
+            )
+            # The cached handle would keep appending to the replaced file
+            self._close_history_file()
+            temp_file = f"{self.history_file}.tmp"
+            with open(temp_file, 'wb') as f:
+                f.write(data)
+            os.replace(temp_file, self.history_file)
+            self._record_count = len(operations)
         except Exception as e:
             logger.error(f"Error saving operation history: {e}")
     
@@ -416,14 +855,21 @@ class RecoveryService:
             return
         
         try:
-            with open(self.history_file, 'r') as f:
-                operations_dict = json.load(f)
+            record_count = 0
+            with open(self.history_file, 'rb') as f:
+                for op_data in self._read_records(f):
+                    self.operations[op_data["operation_id"]] = OperationRecord.from_dict(op_data)
+                    record_count += 1
+            self._record_count = record_count
+            while len(self.operations) > self.max_operations:
+                self.operations.popitem(last=False)
+            for operation in self.operations.values():
+                operation.sequence = next(self._sequence)
+                self._index_operation(operation)
             
-            # Convert dictionaries to operation records
-            self.operations = {
-                op_id: OperationRecord.from_dict(op_data)
-                for op_id, op_data in operations_dict.items()
-            }
+            # Drop superseded records once they far outnumber the live operations
+            if record_count > self.COMPACT_RATIO * len(self.operations):
+                self._write_history()
         except Exception as e:
             logger.error(f"Error loading operation history: {e}")
-            self.operations = {}
+            self.operations = OrderedDict()
@@ -14,12 +14,22 @@ from core_agent.llm.llm_config import (
 )
 from core_agent.llm.llm_factory import LLMFactory
 from core_agent.llm.llm_service import LLMService
-from core_agent.llm.default_config import (
-    DEFAULT_LLM_SERVICE_CONFIG,
-    DEFAULT_OPENAI_CONFIG,
-    DEFAULT_ANTHROPIC_CONFIG,
-    DEFAULT_PROMPT_CONFIG
-)
+
+# Defaults (every DEFAULT_* name in core_agent.llm.default_config) are
+# imported on first access, so importing the package does not build the
+# default prompt configs
+
+
+def __getattr__(name: str):
+    """Import default configs lazily."""
+    if name.startswith("DEFAULT_"):
+        from core_agent.llm import default_config
+        if hasattr(default_config, name):
+            value = getattr(default_config, name)
+            globals()[name] = value
+            return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
     "LLMConfig",
@@ -0,0 +1,208 @@
+"""
+LLM batch API.
+
+This module submits prompts to the OpenAI and Anthropic batch APIs, which
+process them asynchronously (within 24 hours) at a lower price than
+interactive requests. It suits bulk jobs that do not need an answer right away.
+"""
+
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+
+import orjson
+
+from core_agent.llm.llm_config import LLMConfig, LLMType
+from shared.utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+# Chat roles for LangChain message types
+_ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
+# Batch statuses after which an OpenAI batch will produce no results
+_OPENAI_FAILED_STATUSES = frozenset({"failed", "expired", "cancelled"})
+
+
+def _message_content_text(content: Any) -> str:
+    """Flatten message content given as text blocks into a string."""
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content)
+
+
+class LLMBatchAPI:
+    """Client for the provider batch APIs."""
+
+    def __init__(self, config: LLMConfig):
+        """
+        Initialize the client.
+
+        Args:
+            config: The LLM configuration.
+
+        Raises:
+            ValueError: If the model type has no batch API.
+        """
+        if config.model_type not in (LLMType.OPENAI, LLMType.ANTHROPIC):
+            raise ValueError(f"Batch API is not supported for model type: {config.model_type}")
+
+        self.config = config
+        self._client: Any = None
+
+    @property
+    def client(self) -> Any:
+        """The provider SDK client, created on first use."""
+        if self._client is None:
+            if self.config.model_type == LLMType.OPENAI:
+                import openai
+                self._client = openai.AsyncOpenAI(
+                    api_key=self.config.api_key or os.environ.get("OPENAI_API_KEY"),
+                    base_url=self.config.api_base
+                )
+            else:
+                import anthropic
+                self._client = anthropic.AsyncAnthropic(
+                    api_key=self.config.api_key or os.environ.get("ANTHROPIC_API_KEY"),
+                    base_url=self.config.api_base
+                )
+        return self._client
+
+    async def submit_batch(self, all_messages: List[List[Any]]) -> str:
+        """
+        Submit prompts as a batch.
+
+        Args:
+            all_messages: The LangChain messages for each prompt.
+
+        Returns:
+            The ID of the batch.
+        """
+        logger.info(f"Submitting batch of {len(all_messages)} prompts")
+
+        if self.config.model_type == LLMType.OPENAI:
+            lines = b"".join(
+                orjson.dumps({
+                    "custom_id": str(index),
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": self._openai_body(messages)
+                }) + b"\n"
+                for index, messages in enumerate(all_messages)
+            )
+            input_file = await self.client.files.create(file=("batch.jsonl", lines), purpose="batch")
+            batch = await self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+        else:
+            batch = await self.client.messages.batches.create(requests=[
+                {"custom_id": str(index), "params": self._anthropic_params(messages)}
+                for index, messages in enumerate(all_messages)
+            ])
+
+        return batch.id
+
+    async def poll_batch(self, batch_id: str) -> Optional[List[Optional[str]]]:
+        """
+        Check a batch and fetch its results if it has finished.
+
+        Args:
+            batch_id: The ID of the batch.
+
+        Returns:
+            The response text for each prompt in submission order, with None
+            for prompts that failed, or None if the batch is still running.
+
+        Raises:
+            RuntimeError: If the batch failed, expired or was cancelled.
+        """
+        if self.config.model_type == LLMType.OPENAI:
+            return await self._poll_openai_batch(batch_id)
+        return await self._poll_anthropic_batch(batch_id)
+
+    async def await_batch(self, batch_id: str, poll_interval: float = 30.0) -> List[Optional[str]]:
+        """
+        Wait for a batch to finish.
+
+        Args:
+            batch_id: The ID of the batch.
+            poll_interval: Seconds between status checks.
+
+        Returns:
+            The response text for each prompt in submission order, with None
+            for prompts that failed.
+        """
+        while True:
+            results = await self.poll_batch(batch_id)
+            if results is not None:
+                return results
+            await asyncio.sleep(poll_interval)
+
+    async def _poll_openai_batch(self, batch_id: str) -> Optional[List[Optional[str]]]:
+        """Check an OpenAI batch and fetch its results if it has finished."""
+        batch = await self.client.batches.retrieve(batch_id)
+        if batch.status in _OPENAI_FAILED_STATUSES:
+            raise RuntimeError(f"Batch {batch_id} ended with status {batch.status}")
+        if batch.status != "completed":
+            return None
+
+        results: List[Optional[str]] = [None] * batch.request_counts.total
+        if batch.output_file_id:
+            output = await self.client.files.content(batch.output_file_id)
+            for line in output.text.splitlines():
+                if not line:
+                    continue
+                entry = orjson.loads(line)
+                response = entry.get("response") or {}
+                if response.get("status_code") == 200:
+                    results[int(entry["custom_id"])] = response["body"]["choices"][0]["message"]["content"]
+        return results
+
+    async def _poll_anthropic_batch(self, batch_id: str) -> Optional[List[Optional[str]]]:
+        """Check an Anthropic batch and fetch its results if it has finished."""
+        batch = await self.client.messages.batches.retrieve(batch_id)
+        if batch.processing_status != "ended":
+            return None
+
+        counts = batch.request_counts
+        total = counts.succeeded + counts.errored + counts.canceled + counts.expired
+        results: List[Optional[str]] = [None] * total
+        async for entry in await self.client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                results[int(entry.custom_id)] = "".join(
+                    block.text for block in entry.result.message.content if block.type == "text"
+                )
+        return results
+
+    def _openai_body(self, messages: List[Any]) -> Dict[str, Any]:
+        """Build the chat completion request body for a prompt."""
+        body: Dict[str, Any] = {
+            "model": self.config.model_name,
+            "messages": [
+                {"role": _ROLES[message.type], "content": _message_content_text(message.content)}
+                for message in messages
+            ],
+            "temperature": self.config.temperature
+        }
+        if self.config.max_tokens:
+            body["max_tokens"] = self.config.max_tokens
+        return body
+
+    def _anthropic_params(self, messages: List[Any]) -> Dict[str, Any]:
+        """Build the Messages API parameters for a prompt."""
+        params: Dict[str, Any] = {
+            "model": self.config.model_name,
+            "max_tokens": self.config.max_tokens or 4096,
+            "temperature": self.config.temperature,
+            "messages": [
+                {"role": _ROLES[message.type], "content": message.content}
+                for message in messages
+                if message.type != "system"
+            ]
+        }
+        system = [message.content for message in messages if message.type == "system"]
+        if system:
+            params["system"] = system[0]
+        return params
@@ -11,14 +11,21 @@ from core_agent.llm.llm_config import (
     PromptConfig,
     CodeGenerationPromptConfig,
     CodeAnalysisPromptConfig,
+    MarshaledCodeAnalysisPromptConfig,
     CrossFileAnalysisPromptConfig,
     CodeRefactoringPromptConfig,
     CodeCompletionPromptConfig
 )
 
 
+# Instruction shared by the system messages of prompts that answer with a JSON object
+_JSON_RESPONSE_PREAMBLE = "Return your response in JSON format with the following structure:\n"
+
+# The defaults are trusted literals, so they are built with model_construct,
+# which skips validation; they must already use the validated field types.
+
 # Default code generation prompt configuration
-DEFAULT_CODE_GENERATION_PROMPT = CodeGenerationPromptConfig(
+DEFAULT_CODE_GENERATION_PROMPT = CodeGenerationPromptConfig.model_construct(
     system_message="""You are an expert programming assistant that specializes in generating high-quality code.
 Your task is to generate code based on the user's prompt, considering the provided context, file path, and language.
 You should analyze the context carefully to understand the project structure, coding style, and existing patterns.
@@ -27,8 +34,7 @@ Then generate code that seamlessly integrates with the existing codebase.
 Always provide clean, efficient, and well-documented code that follows best practices for the specified language.
 Make sure your code is consistent with the style and patterns found in the context.
 
-Return your response in JSON format with the following structure:
-{
+""" + _JSON_RESPONSE_PREAMBLE + """{
     "code": "the generated code",
     "explanation": "explanation of the code and how it addresses the prompt and integrates with the existing codebase"
 }""",
@@ -41,7 +47,7 @@ Context: {context}
 Options: {options}
 
 Please provide the code that fits well with the existing codebase and an explanation of how it integrates with the context.""",
-    examples=[
+    examples=(
         {
             "user": """Generate code based on the following information:
 
@@ -54,16 +60,15 @@ Options: {}""",
     "code": "def sort_array(arr):\\n    \\"\\"\\"\\n    Sort an array of integers in ascending order.\\n    \\n    Args:\\n        arr (list): The array of integers to sort.\\n        \\n    Returns:\\n        list: The sorted array.\\n    \\"\\"\\"\\n    # Using Python's built-in sorted function\\n    return sorted(arr)\\n\\n# Example usage\\nif __name__ == \\"__main__\\":\\n    example_array = [5, 2, 9, 1, 5, 6]\\n    sorted_array = sort_array(example_array)\\n    print(f\\"Original array: {example_array}\\")\\n    print(f\\"Sorted array: {sorted_array}\\")",
     "explanation": "This code defines a function `sort_array` that takes an array of integers and returns a new array sorted in ascending order. It uses Python's built-in `sorted` function, which is efficient and handles various edge cases. The function includes proper documentation with docstrings explaining its purpose, parameters, and return value. I've also included an example usage section that demonstrates how to call the function."
 }"""
-        }
-    ]
+        },
+    )
 )
 
 # Default code analysis prompt configuration
-DEFAULT_CODE_ANALYSIS_PROMPT = CodeAnalysisPromptConfig(
+DEFAULT_CODE_ANALYSIS_PROMPT = CodeAnalysisPromptConfig.model_construct(
     system_message="""You are an expert code analyzer that specializes in understanding code structure and functionality.
 Your task is to analyze the provided code and extract key information about its structure, functionality, and quality.
-Return your response in JSON format with the following structure:
-{
+""" + _JSON_RESPONSE_PREAMBLE + """{
     "summary": "brief summary of what the code does",
     "language": "the programming language",
     "symbols": [
@@ -88,7 +93,7 @@ File path: {file_path}
 Options: {options}
 
 Please provide a detailed analysis.""",
-    examples=[
+    examples=(
         {
             "user": """Analyze the following code:
 
@@ -138,16 +143,52 @@ Please provide a detailed analysis.""",
         "Could use type hints for better code clarity"
     ]
 }"""
-        }
-    ]
+        },
+    )
+)
+
+# Default marshaled code analysis prompt configuration
+DEFAULT_MARSHALED_CODE_ANALYSIS_PROMPT = MarshaledCodeAnalysisPromptConfig.model_construct(
+    system_message="""You are an expert code analyzer that specializes in understanding code structure and functionality.
+Your task is to analyze each of the provided files independently and extract key information about its structure, functionality, and quality.
+Each file is tagged with an index in square brackets. Return your response as a JSON array with one object per file, in the following structure:
+[
+    {
+        "index": 0,
+        "summary": "brief summary of what the code does",
+        "language": "the programming language",
+        "symbols": [
+            {
+                "name": "symbol name",
+                "kind": "function, class, variable, etc.",
+                "range": {"start": {"line": 0, "character": 0}, "end": {"line": 0, "character": 0}},
+                "detail": "details about the symbol"
+            }
+        ],
+        "imports": ["list of imports"],
+        "dependencies": ["list of dependencies"],
+        "issues": ["potential issues or improvements"]
+    }
+]""",
+    user_message_template="""Analyze each of the following files:
+
+{files}
+
+Options: {options}
+
+Please provide a detailed analysis of every file, keeping its index.""",
+    file_template="""[{index}] File path: {file_path}
+```{language}
+{code}
+```""",
+    examples=()
 )
 
 # Default cross-file analysis prompt configuration
-DEFAULT_CROSS_FILE_ANALYSIS_PROMPT = CrossFileAnalysisPromptConfig(
+DEFAULT_CROSS_FILE_ANALYSIS_PROMPT = CrossFileAnalysisPromptConfig.model_construct(
     system_message="""You are an expert code analyzer that specializes in understanding dependencies between multiple files in a codebase.
 Your task is to analyze the provided files and identify dependencies between them, such as imports, inheritance, function calls, and other relationships.
-Return your response in JSON format with the following structure:
-{
+""" + _JSON_RESPONSE_PREAMBLE + """{
     "summary": "brief summary of the analysis",
     "dependencies": [
         {
@@ -180,7 +221,7 @@ Return your response in JSON format with the following structure:
 Options: {options}
 
 Please identify all dependencies between these files, including imports, inheritance relationships, function calls, and other references.""",
-    examples=[
+    examples=(
         {
             "user": """Analyze the dependencies between the following files:
 
@@ -267,16 +308,15 @@ Please identify all dependencies between these files, including imports, inherit
         "views.py": ["from django.shortcuts import render", "from .models import User, Post"]
     }
 }"""
-        }
-    ]
+        },
+    )
 )
 
 # Default code refactoring prompt configuration
-DEFAULT_CODE_REFACTORING_PROMPT = CodeRefactoringPromptConfig(
+DEFAULT_CODE_REFACTORING_PROMPT = CodeRefactoringPromptConfig.model_construct(
     system_message="""You are an expert code refactoring assistant that specializes in improving code structure and quality.
 Your task is to refactor the provided code according to the specified refactoring type and parameters.
-Return your response in JSON format with the following structure:
-{
+""" + _JSON_RESPONSE_PREAMBLE + """{
     "changes": {
         "file_path": "new content for the file"
     },
@@ -300,15 +340,14 @@ Selection: {selection}
 Options: {options}
 
 Please provide the refactored code and a description of the changes.""",
-    examples=[]
+    examples=()
 )
 
 # Default code completion prompt configuration
-DEFAULT_CODE_COMPLETION_PROMPT = CodeCompletionPromptConfig(
+DEFAULT_CODE_COMPLETION_PROMPT = CodeCompletionPromptConfig.model_construct(
     system_message="""You are an expert code completion assistant that specializes in suggesting relevant code completions.
 Your task is to provide completion suggestions for the code at the specified position.
-Return your response in JSON format with the following structure:
-{
+""" + _JSON_RESPONSE_PREAMBLE + """{
     "items": [
         {
             "label": "display label",
@@ -333,20 +372,21 @@ Context:
 Options: {options}
 
 Please provide relevant completion suggestions.""",
-    examples=[]
+    examples=()
 )
 
 # Default prompt configuration
-DEFAULT_PROMPT_CONFIG = PromptConfig(
+DEFAULT_PROMPT_CONFIG = PromptConfig.model_construct(
     code_generation=DEFAULT_CODE_GENERATION_PROMPT,
     code_analysis=DEFAULT_CODE_ANALYSIS_PROMPT,
     cross_file_analysis=DEFAULT_CROSS_FILE_ANALYSIS_PROMPT,
     code_refactoring=DEFAULT_CODE_REFACTORING_PROMPT,
-    code_completion=DEFAULT_CODE_COMPLETION_PROMPT
+    code_completion=DEFAULT_CODE_COMPLETION_PROMPT,
+    marshaled_code_analysis=DEFAULT_MARSHALED_CODE_ANALYSIS_PROMPT
 )
 
 # Default OpenAI configuration
-DEFAULT_OPENAI_CONFIG = LLMConfig(
+DEFAULT_OPENAI_CONFIG = LLMConfig.model_construct(
     model_type=LLMType.OPENAI,
     model_name="gpt-3.5-turbo",
     temperature=0.7,
@@ -354,7 +394,7 @@ DEFAULT_OPENAI_CONFIG = LLMConfig(
 )
 
 # Default Anthropic configuration
-DEFAULT_ANTHROPIC_CONFIG = LLMConfig(
+DEFAULT_ANTHROPIC_CONFIG = LLMConfig.model_construct(
     model_type=LLMType.ANTHROPIC,
     model_name="claude-2",
     temperature=0.7,
@@ -362,7 +402,7 @@ DEFAULT_ANTHROPIC_CONFIG = LLMConfig(
 )
 
 # Default LLM service configuration
-DEFAULT_LLM_SERVICE_CONFIG = LLMServiceConfig(
+DEFAULT_LLM_SERVICE_CONFIG = LLMServiceConfig.model_construct(
     llm=DEFAULT_OPENAI_CONFIG,
     prompts=DEFAULT_PROMPT_CONFIG,
     cache_enabled=True,
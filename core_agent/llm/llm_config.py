@@ -5,9 +5,9 @@ This module defines the configuration for LLM models.
 """
 
 from enum import Enum
-from typing import Dict, Optional, Any, List
+from typing import Dict, Optional, Any, List, Tuple
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class LLMType(str, Enum):
@@ -18,7 +18,13 @@ class LLMType(str, Enum):
     CUSTOM = "custom"
 
 
-class LLMConfig(BaseModel):
+class _ConfigModel(BaseModel):
+    """Base class for configuration models, which are immutable once built."""
+
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+
+class LLMConfig(_ConfigModel):
     """Configuration for LLM models."""
 
     model_type: LLMType = Field(
@@ -35,6 +41,10 @@ class LLMConfig(BaseModel):
         default=None,
         description="Base URL for the API"
     )
+    base_urls: List[str] = Field(
+        default_factory=list,
+        description="Base URLs of interchangeable API replicas; tasks are spread across them"
+    )
     temperature: float = Field(
         default=0.7,
         description="Temperature for sampling"
@@ -49,7 +59,7 @@ class LLMConfig(BaseModel):
     )
 
 
-class CodeGenerationPromptConfig(BaseModel):
+class CodeGenerationPromptConfig(_ConfigModel):
     """Configuration for code generation prompts."""
 
     system_message: str = Field(
@@ -58,13 +68,13 @@ class CodeGenerationPromptConfig(BaseModel):
     user_message_template: str = Field(
         description="Template for user messages"
     )
-    examples: Optional[List[Dict[str, str]]] = Field(
+    examples: Optional[Tuple[Dict[str, str], ...]] = Field(
         default=None,
         description="Examples for few-shot learning"
     )
 
 
-class CodeAnalysisPromptConfig(BaseModel):
+class CodeAnalysisPromptConfig(_ConfigModel):
     """Configuration for code analysis prompts."""
 
     system_message: str = Field(
@@ -73,13 +83,31 @@ class CodeAnalysisPromptConfig(BaseModel):
     user_message_template: str = Field(
         description="Template for user messages"
     )
-    examples: Optional[List[Dict[str, str]]] = Field(
+    examples: Optional[Tuple[Dict[str, str], ...]] = Field(
         default=None,
         description="Examples for few-shot learning"
     )
 
 
-class CrossFileAnalysisPromptConfig(BaseModel):
+class MarshaledCodeAnalysisPromptConfig(_ConfigModel):
+    """Configuration for prompts that analyze several files at once."""
+
+    system_message: str = Field(
+        description="System message for the LLM"
+    )
+    user_message_template: str = Field(
+        description="Template for user messages"
+    )
+    file_template: str = Field(
+        description="Template for each indexed file in the user message"
+    )
+    examples: Optional[Tuple[Dict[str, str], ...]] = Field(
+        default=None,
+        description="Examples for few-shot learning"
+    )
+
+
+class CrossFileAnalysisPromptConfig(_ConfigModel):
     """Configuration for cross-file analysis prompts."""
 
     system_message: str = Field(
@@ -88,13 +116,13 @@ class CrossFileAnalysisPromptConfig(BaseModel):
     user_message_template: str = Field(
         description="Template for user messages"
     )
-    examples: Optional[List[Dict[str, str]]] = Field(
+    examples: Optional[Tuple[Dict[str, str], ...]] = Field(
         default=None,
         description="Examples for few-shot learning"
     )
 
 
-class CodeRefactoringPromptConfig(BaseModel):
+class CodeRefactoringPromptConfig(_ConfigModel):
     """Configuration for code refactoring prompts."""
 
     system_message: str = Field(
@@ -103,13 +131,13 @@ class CodeRefactoringPromptConfig(BaseModel):
     user_message_template: str = Field(
         description="Template for user messages"
     )
-    examples: Optional[List[Dict[str, str]]] = Field(
+    examples: Optional[Tuple[Dict[str, str], ...]] = Field(
         default=None,
         description="Examples for few-shot learning"
     )
 
 
-class CodeCompletionPromptConfig(BaseModel):
+class CodeCompletionPromptConfig(_ConfigModel):
     """Configuration for code completion prompts."""
 
     system_message: str = Field(
@@ -118,13 +146,13 @@ class CodeCompletionPromptConfig(BaseModel):
     user_message_template: str = Field(
         description="Template for user messages"
     )
-    examples: Optional[List[Dict[str, str]]] = Field(
+    examples: Optional[Tuple[Dict[str, str], ...]] = Field(
         default=None,
         description="Examples for few-shot learning"
     )
 
 
-class PromptConfig(BaseModel):
+class PromptConfig(_ConfigModel):
     """Configuration for prompts."""
 
     code_generation: CodeGenerationPromptConfig
@@ -132,9 +160,10 @@ class PromptConfig(BaseModel):
     cross_file_analysis: CrossFileAnalysisPromptConfig
     code_refactoring: Optional[CodeRefactoringPromptConfig] = None
     code_completion: Optional[CodeCompletionPromptConfig] = None
+    marshaled_code_analysis: Optional[MarshaledCodeAnalysisPromptConfig] = None
 
 
-class LLMServiceConfig(BaseModel):
+class LLMServiceConfig(_ConfigModel):
     """Configuration for the LLM service."""
 
     llm: LLMConfig
@@ -147,3 +176,27 @@ class LLMServiceConfig(BaseModel):
         default=3600,
         description="Time-to-live for cached responses in seconds"
     )
+    cache_dir: Optional[str] = Field(
+        default=None,
+        description="Directory for an on-disk response cache; requires the diskcache package"
+    )
+    prompt_cache_enabled: bool = Field(
+        default=True,
+        description="Whether to mark the static prompt prefix for provider-side prompt caching"
+    )
+    max_concurrency: int = Field(
+        default=16,
+        description="Maximum number of LLM calls in flight in map_async"
+    )
+    max_rpm: int = Field(
+        default=500,
+        description="Maximum number of LLM calls started per minute in map_async; 0 disables the limit"
+    )
+    max_input_tokens: int = Field(
+        default=8000,
+        description="Token budget for the context put into a code generation prompt; longer context keeps only its first and last lines; 0 disables trimming"
+    )
+    max_marshaled_prompt_tokens: int = Field(
+        default=6000,
+        description="Estimated token budget for a prompt that analyzes several files at once"
+    )
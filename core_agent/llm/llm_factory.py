@@ -5,31 +5,37 @@ This module provides a factory for creating LLM instances.
 """
 
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 
-try:
-    from langchain.chat_models import ChatOpenAI, ChatAnthropic
-except ImportError:
-    # For newer versions of LangChain
-    from langchain_community.chat_models import ChatOpenAI, ChatAnthropic
 from langchain.llms.base import BaseLLM
-from langchain.cache import InMemoryCache
-from langchain.globals import set_llm_cache
 
 from core_agent.llm.llm_config import LLMConfig, LLMType
 from shared.utils.logging_utils import get_logger
 
 logger = get_logger(__name__)
 
+# Settings of the installed process-wide LLM cache, or None if not yet configured
+_cache_settings: Optional[Tuple[bool, Optional[int], Optional[str]]] = None
+
 
 class LLMFactory:
     """Factory for creating LLM instances."""
 
+    # Chat model classes by name, imported on first use so that only the
+    # providers actually configured are loaded
+    _chat_models: Dict[str, Any] = {}
+
+    # LLM instances by serialized config, shared so that services with the
+    # same config also share the client and its connection pool
+    _llms: Dict[str, BaseLLM] = {}
+
     @staticmethod
     def create_llm(config: LLMConfig) -> BaseLLM:
         """
         Create an LLM instance based on the configuration.
 
+        Instances are cached, so configs with the same settings share one LLM.
+
         Args:
             config: The LLM configuration.
 
@@ -39,23 +45,80 @@ class LLMFactory:
         Raises:
             ValueError: If the model type is not supported.
         """
-        logger.info(f"Creating LLM of type {config.model_type} with model {config.model_name}")
+        key = config.model_dump_json()
+        llm = LLMFactory._llms.get(key)
+        if llm is not None:
+            return llm
 
-        # Set up caching
-        set_llm_cache(InMemoryCache())
+        logger.info(f"Creating LLM of type {config.model_type} with model {config.model_name}")
 
         # Create the LLM based on the type
         if config.model_type == LLMType.OPENAI:
-            return LLMFactory._create_openai_llm(config)
+            llm = LLMFactory._create_openai_llm(config)
         elif config.model_type == LLMType.ANTHROPIC:
-            return LLMFactory._create_anthropic_llm(config)
+            llm = LLMFactory._create_anthropic_llm(config)
         elif config.model_type == LLMType.LOCAL:
-            return LLMFactory._create_local_llm(config)
+            llm = LLMFactory._create_local_llm(config)
         elif config.model_type == LLMType.CUSTOM:
-            return LLMFactory._create_custom_llm(config)
+            llm = LLMFactory._create_custom_llm(config)
         else:
             raise ValueError(f"Unsupported model type: {config.model_type}")
 
+        LLMFactory._llms[key] = llm
+        return llm
+
+    @staticmethod
+    def clear_instances() -> None:
+        """Drop the cached LLM instances."""
+        LLMFactory._llms.clear()
+
+    @staticmethod
+    def configure_cache(enabled: bool = True, ttl: Optional[int] = None, directory: Optional[str] = None) -> None:
+        """
+        Install the process-wide LLM response cache.
+
+        The cache is shared by every LLM, so it is only replaced when the
+        settings change; repeated calls keep the cached responses.
+
+        Args:
+            enabled: Whether to cache responses. When False, no cache is installed.
+            ttl: Seconds a cached response stays valid, or None for no expiry.
+            directory: Optional directory for an on-disk cache tier.
+        """
+        global _cache_settings
+        settings = (enabled, ttl, directory)
+        if settings == _cache_settings:
+            return
+
+        from langchain.globals import set_llm_cache
+        from core_agent.llm.response_cache import LLMResponseCache
+
+        set_llm_cache(LLMResponseCache(ttl=ttl, directory=directory) if enabled else None)
+        _cache_settings = settings
+
+    @staticmethod
+    def _chat_model_class(name: str) -> Any:
+        """
+        Import a LangChain chat model class.
+
+        Args:
+            name: The name of the class, e.g. "ChatOpenAI".
+
+        Returns:
+            The chat model class.
+        """
+        chat_model_class = LLMFactory._chat_models.get(name)
+        if chat_model_class is None:
+            try:
+                from langchain import chat_models
+                chat_model_class = getattr(chat_models, name)
+            except (ImportError, AttributeError):
+                # For newer versions of LangChain
+                from langchain_community import chat_models
+                chat_model_class = getattr(chat_models, name)
+            LLMFactory._chat_models[name] = chat_model_class
+        return chat_model_class
+
     @staticmethod
     def _create_openai_llm(config: LLMConfig) -> BaseLLM:
         """Create an OpenAI LLM instance."""
@@ -65,11 +128,13 @@ class LLMFactory:
             raise ValueError("OpenAI API key is required")
 
         # Create the LLM
+        ChatOpenAI = LLMFactory._chat_model_class("ChatOpenAI")
         return ChatOpenAI(
             model_name=config.model_name,
             openai_api_key=api_key,
             temperature=config.temperature,
             max_tokens=config.max_tokens,
+            **({"openai_api_base": config.api_base} if config.api_base else {}),
             **(config.additional_params or {})
         )
 
@@ -82,11 +147,13 @@ class LLMFactory:
             raise ValueError("Anthropic API key is required")
 
         # Create the LLM
+        ChatAnthropic = LLMFactory._chat_model_class("ChatAnthropic")
         return ChatAnthropic(
             model_name=config.model_name,
             anthropic_api_key=api_key,
             temperature=config.temperature,
             max_tokens=config.max_tokens,
+            **({"anthropic_api_url": config.api_base} if config.api_base else {}),
             **(config.additional_params or {})
         )
 
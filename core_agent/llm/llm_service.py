@@ -4,21 +4,274 @@ LLM service.
 This module provides a service for interacting with LLMs.
 """
 
-import json
+import asyncio
+import functools
 import os
-from typing import Dict, Any, List, Optional
+import random
+import re
+from typing import AsyncIterator, Awaitable, Callable, Dict, Any, List, Optional, Tuple, TypeVar
 
-from langchain.schema import HumanMessage, SystemMessage, AIMessage
+import orjson
+from langchain.schema import AIMessage, BaseMessage, HumanMessage, SystemMessage
 from langchain.llms.base import BaseLLM
 
-from core_agent.llm.llm_config import LLMServiceConfig, PromptConfig
+from core_agent.llm.batch_api import LLMBatchAPI
+from core_agent.llm.llm_config import LLMServiceConfig, LLMType, PromptConfig
 from core_agent.llm.llm_factory import LLMFactory
+from core_agent.llm.rate_limiter import AsyncRateLimiter
 from shared.models.code import CodeGenerationResult, CodeAnalysisResult, Symbol, Position, Range, CodeRefactoringRequest, CodeRefactoringResult
 from shared.utils.logging_utils import get_logger
 
 logger = get_logger(__name__)
 
 
+def _read_file_content(file_path: str) -> str:
+    """
+    Read a file for analysis.
+
+    Args:
+        file_path: The path to the file.
+
+    Returns:
+        The file content, or a comment describing the error if it cannot be read.
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except Exception as e:
+        logger.warning(f"Error reading file {file_path}: {str(e)}")
+        return f"# Error reading file: {str(e)}"
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Provider errors that clear up when the request is retried later; matched by
+# name so the provider SDKs need not be imported
+_RETRYABLE_ERRORS = frozenset({"RateLimitError", "APITimeoutError"})
+
+# Delay before the first retry in map_async, doubled on each further retry
+_RETRY_BASE_DELAY = 1.0
+
+# A JSON document wrapped in a Markdown code fence
+_JSON_FENCE = re.compile(r"```(?:json)?[ \t]*\n(.*?)```", re.DOTALL)
+
+
+def _dumps(value: Any) -> str:
+    """
+    Serialize a value as JSON with sorted keys.
+
+    Args:
+        value: The value to serialize.
+
+    Returns:
+        The JSON text.
+    """
+    return orjson.dumps(value, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS).decode()
+
+
+# The start of a string field that generate_code_streaming reports while it streams
+_PARTIAL_FIELD = re.compile(r'"(code|explanation)"\s*:\s*"')
+
+
+def _partial_string_fields(text: str) -> Dict[str, str]:
+    """
+    Extract the code and explanation strings from incomplete JSON.
+
+    Args:
+        text: The JSON received so far.
+
+    Returns:
+        The fields found so far, each holding the part of its value received.
+    """
+    values: Dict[str, str] = {}
+    for match in _PARTIAL_FIELD.finditer(text):
+        name = match.group(1)
+        if name in values:
+            continue
+
+        start = index = match.end()
+        end = len(text)
+        while index < len(text):
+            char = text[index]
+            if char == '"':
+                end = index
+                break
+            if char == "\\":
+                # Stop before an escape sequence that has not fully arrived
+                step = 6 if text[index + 1:index + 2] == "u" else 2
+                if index + step > len(text):
+                    end = index
+                    break
+                index += step
+                continue
+            index += 1
+
+        try:
+            values[name] = orjson.loads(f'"{text[start:end]}"')
+        except orjson.JSONDecodeError:
+            pass
+    return values
+
+
+def _parse_json_lenient(text: str) -> Any:
+    """
+    Parse JSON returned by an LLM.
+
+    A Markdown code fence around the JSON is removed, and if the text still
+    does not parse, the outermost object or array in it is tried instead, so
+    that prose before or after the JSON is ignored.
+
+    Args:
+        text: The text returned by the LLM.
+
+    Returns:
+        The parsed value.
+
+    Raises:
+        orjson.JSONDecodeError: If no JSON can be parsed from the text.
+    """
+    match = _JSON_FENCE.search(text)
+    if match:
+        text = match.group(1)
+
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        starts = [index for index in (text.find("{"), text.find("[")) if index >= 0]
+        if not starts:
+            raise
+        start = min(starts)
+        end = text.rfind("}" if text[start] == "{" else "]")
+        if end <= start:
+            raise
+        return orjson.loads(text[start:end + 1])
+
+
+def _is_retryable(error: BaseException) -> bool:
+    """
+    Check whether an LLM error is worth retrying.
+
+    Args:
+        error: The error raised by the LLM call.
+
+    Returns:
+        True for rate limit and timeout errors.
+    """
+    return any(cls.__name__ in _RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+
+def _options_json(options: Optional[Dict[str, Any]]) -> str:
+    """
+    Serialize prompt options, skipping the encoder for the common empty case.
+
+    Args:
+        options: The options, if any.
+
+    Returns:
+        The options as JSON with sorted keys.
+    """
+    if not options:
+        return "{}"
+    return _dumps(options)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding(model_name: str) -> Any:
+    """
+    Get the tiktoken encoding for a model.
+
+    Args:
+        model_name: The name of the model.
+
+    Returns:
+        The encoding, cl100k_base for models tiktoken does not know, or None
+        if tiktoken is not installed.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@functools.lru_cache(maxsize=256)
+def _count_tokens(text: str, model_name: str) -> int:
+    """
+    Count the tokens in a text.
+
+    Args:
+        text: The text.
+        model_name: The name of the model the text is for.
+
+    Returns:
+        The token count, or an estimate of about four characters per token if
+        tiktoken is not installed.
+    """
+    encoding = _get_encoding(model_name)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _fit_context(text: str, max_tokens: int, model_name: str, head_lines: int = 40, tail_lines: int = 40) -> str:
+    """
+    Shorten a text that exceeds a token budget by eliding its middle.
+
+    Up to head_lines and tail_lines whole lines are kept from each end, fewer
+    if they alone would exceed the budget. If not even one line from each end
+    fits, the text is cut by characters instead.
+
+    Args:
+        text: The text.
+        max_tokens: The token budget, or 0 for no limit.
+        model_name: The name of the model the text is for.
+        head_lines: The most lines to keep from the start.
+        tail_lines: The most lines to keep from the end.
+
+    Returns:
+        The text, with its middle replaced by a marker if it was over budget.
+    """
+    if not max_tokens or len(text) <= max_tokens:
+        return text
+    tokens = _count_tokens(text, model_name)
+    if tokens <= max_tokens:
+        return text
+
+    # Leave room for the marker; the elided count is at most the total
+    budget = max(1, max_tokens - _count_tokens(f"\n... [elided {tokens} tokens] ...\n", model_name))
+
+    lines = text.splitlines()
+    head_lines = min(head_lines, len(lines) // 2)
+    tail_lines = min(tail_lines, len(lines) // 2)
+    while head_lines and tail_lines:
+        head, tail = "\n".join(lines[:head_lines]), "\n".join(lines[-tail_lines:])
+        kept = _count_tokens(f"{head}\n{tail}", model_name)
+        if kept <= budget:
+            break
+        # Shrink both ends in proportion to the overshoot
+        scale = budget / kept
+        head_lines = min(head_lines - 1, int(head_lines * scale))
+        tail_lines = min(tail_lines - 1, int(tail_lines * scale))
+    else:
+        # The lines are too long to keep whole ones, so keep characters instead
+        keep = len(text) * budget // tokens // 2
+        while True:
+            head, tail = text[:keep], text[len(text) - keep:]
+            kept = _count_tokens(head + tail, model_name)
+            if kept <= budget or not keep:
+                break
+            keep = min(keep - 1, int(keep * budget / kept))
+
+    elided = tokens - kept
+    logger.debug(f"Elided {elided} of {tokens} tokens to fit the prompt budget")
+    return f"{head}\n... [elided {elided} tokens] ...\n{tail}"
+
+
 class LLMService:
     """Service for interacting with LLMs."""
 
@@ -30,8 +283,11 @@ class LLMService:
             config: The LLM service configuration.
         """
         self.config = config
+        LLMFactory.configure_cache(config.cache_enabled, config.cache_ttl, config.cache_dir)
         self.llm = LLMFactory.create_llm(config.llm)
         self.prompts = config.prompts
+        self._prompt_prefixes: Dict[str, List[BaseMessage]] = {}
+        self._batch_api: Optional[LLMBatchAPI] = None
         logger.info(f"Initialized LLM service with model {config.llm.model_name}")
 
     async def generate_code(
@@ -45,6 +301,10 @@ class LLMService:
         """
         Generate code based on a prompt.
 
+        Concurrent calls are not coalesced into batches. agenerate() still
+        sends one provider request per prompt, so a coalescing window would
+        only add latency and make one failing prompt fail its neighbours.
+
         Args:
             prompt: The prompt describing the code to generate.
             language: The programming language to use.
@@ -62,22 +322,83 @@ class LLMService:
 
         # Generate the response
         response = await self.llm.agenerate([messages])
-        response_text = response.generations[0][0].text
-
-        # Parse the response
-        try:
-            # Try to parse as JSON first
-            result = json.loads(response_text)
-        except json.JSONDecodeError:
-            # If not JSON, use the raw text as code
-            result = {
-                "code": response_text,
-                "explanation": "Generated code based on the prompt."
-            }
+        result = self._parse_code_generation_response(response.generations[0][0].text)
 
         logger.debug(f"Generated code result: {result}")
         return result
 
+    async def generate_code_streaming(
+        self,
+        prompt: str,
+        language: str,
+        context: Optional[str] = None,
+        file_path: Optional[str] = None,
+        options: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate code based on a prompt, yielding results as they stream in.
+
+        While the response streams, partial results hold the code and
+        explanation received so far. The last result yielded is the complete
+        result, as returned by generate_code. Streamed calls are not cached,
+        so use generate_code when the caller only needs the complete result.
+
+        Args:
+            prompt: The prompt describing the code to generate.
+            language: The programming language to use.
+            context: Optional context for the code generation.
+            file_path: Optional file path for additional context.
+            options: Optional additional options.
+
+        Yields:
+            Dictionaries with the generated code and explanation so far.
+        """
+        logger.info(f"Streaming code generation for prompt: {prompt}")
+
+        messages = self._prepare_code_generation_messages(prompt, language, context, file_path, options)
+
+        response_text = ""
+        partial: Dict[str, Any] = {}
+        async for chunk in self.llm.astream(messages):
+            content = chunk.content
+            if not isinstance(content, str):
+                content = "".join(block.get("text", "") for block in content if isinstance(block, dict))
+            if not content:
+                continue
+            response_text += content
+
+            if response_text.lstrip().startswith(("{", "```")):
+                fields = _partial_string_fields(response_text)
+            else:
+                # Not JSON, so the raw text is the code
+                fields = {"code": response_text}
+            if fields and fields != partial:
+                partial = fields
+                yield dict(partial)
+
+        result = self._parse_code_generation_response(response_text)
+        logger.debug(f"Generated code result: {result}")
+        yield result
+
+    async def generate_code_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Generate code for several prompts with one agenerate() call.
+
+        LangChain sends one provider request per prompt, concurrently, so the
+        prompts take about as long as the slowest one rather than their sum.
+
+        Args:
+            items: The generate_code keyword arguments for each prompt.
+
+        Returns:
+            The results for each prompt, in the same order as the items.
+        """
+        logger.info(f"Generating code for {len(items)} prompts")
+
+        all_messages = [self._prepare_code_generation_messages(**item) for item in items]
+        generations = await self._generate_batch(all_messages)
+        return [self._parse_code_generation_response(generation[0].text) for generation in generations]
+
     async def analyze_code(
         self,
         code: str,
@@ -104,24 +425,212 @@ class LLMService:
 
         # Generate the response
         response = await self.llm.agenerate([messages])
-        response_text = response.generations[0][0].text
-
-        # Parse the response
-        try:
-            # Try to parse as JSON
-            result = json.loads(response_text)
-        except json.JSONDecodeError:
-            # If not JSON, create a simple result
-            result = {
-                "summary": response_text,
-                "language": language,
-                "file_path": file_path,
-                "symbols": []
-            }
+        result = self._parse_code_analysis_response(response.generations[0][0].text, language, file_path)
 
         logger.debug(f"Code analysis result: {result}")
         return result
 
+    async def analyze_code_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Analyze several pieces of code with one agenerate() call.
+
+        As with generate_code_batch, each prompt is still its own provider
+        request; they run concurrently.
+
+        Args:
+            items: The analyze_code keyword arguments for each piece of code.
+
+        Returns:
+            The analysis results, in the same order as the items.
+        """
+        logger.info(f"Analyzing code for {len(items)} files")
+
+        all_messages = [self._prepare_code_analysis_messages(**item) for item in items]
+        generations = await self._generate_batch(all_messages)
+        return [
+            self._parse_code_analysis_response(generation[0].text, item["language"], item.get("file_path"))
+            for item, generation in zip(items, generations)
+        ]
+
+    async def submit_code_analysis_batch(self, items: List[Dict[str, Any]]) -> str:
+        """
+        Submit code analyses to the provider's batch API.
+
+        Batches are processed within 24 hours at a lower price than
+        interactive requests and do not count against the interactive rate
+        limit, so this suits bulk jobs that can wait for their results.
+
+        Args:
+            items: The analyze_code keyword arguments for each piece of code.
+
+        Returns:
+            The ID of the batch, to pass to await_code_analysis_batch.
+        """
+        if self._batch_api is None:
+            self._batch_api = LLMBatchAPI(self.config.llm)
+
+        all_messages = [self._prepare_code_analysis_messages(**item) for item in items]
+        return await self._batch_api.submit_batch(all_messages)
+
+    async def await_code_analysis_batch(
+        self,
+        batch_id: str,
+        items: List[Dict[str, Any]],
+        poll_interval: float = 30.0
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Wait for a code analysis batch and parse its results.
+
+        Args:
+            batch_id: The ID returned by submit_code_analysis_batch.
+            items: The items the batch was submitted with.
+            poll_interval: Seconds between status checks.
+
+        Returns:
+            The analysis results in item order, with None for failed analyses.
+        """
+        if self._batch_api is None:
+            self._batch_api = LLMBatchAPI(self.config.llm)
+
+        texts = await self._batch_api.await_batch(batch_id, poll_interval)
+        return [
+            self._parse_code_analysis_response(text, item["language"], item.get("file_path")) if text is not None else None
+            for item, text in zip(items, texts)
+        ]
+
+    async def map_async(
+        self,
+        coro_fn: Callable[[T], Awaitable[R]],
+        items: List[T],
+        max_concurrency: Optional[int] = None,
+        max_rpm: Optional[int] = None,
+        retries: int = 3
+    ) -> List[R]:
+        """
+        Run an LLM call for each item with bounded concurrency and request rate.
+
+        Use this instead of a bare asyncio.gather over many calls, which can
+        exceed the provider's rate limit. Calls that fail with a rate limit or
+        timeout error are retried with exponential backoff.
+
+        Args:
+            coro_fn: The coroutine function to call with each item, e.g. a
+                lambda around generate_code.
+            items: The items to process.
+            max_concurrency: The maximum number of calls in flight. Defaults to
+                config.max_concurrency.
+            max_rpm: The maximum number of calls started per minute. Defaults
+                to config.max_rpm; 0 disables rate limiting.
+            retries: The number of retries for each call.
+
+        Returns:
+            The results, in the same order as the items.
+        """
+        if max_concurrency is None:
+            max_concurrency = self.config.max_concurrency
+        if max_rpm is None:
+            max_rpm = self.config.max_rpm
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+        limiter = AsyncRateLimiter(max_rpm) if max_rpm else None
+
+        async def run(item: T) -> R:
+            async with semaphore:
+                for attempt in range(retries + 1):
+                    if limiter is not None:
+                        await limiter.acquire()
+                    try:
+                        return await coro_fn(item)
+                    except Exception as e:
+                        if attempt == retries or not _is_retryable(e):
+                            raise
+                        delay = _RETRY_BASE_DELAY * 2 ** attempt * (1 + random.random())
+                        logger.warning(f"LLM call failed with {type(e).__name__}, retrying in {delay:.1f}s")
+                        await asyncio.sleep(delay)
+
+        return await asyncio.gather(*(run(item) for item in items))
+
+    async def analyze_code_marshaled(
+        self,
+        files: List[Tuple[str, str, Optional[str]]],
+        batch_size: int = 8,
+        options: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Analyze many small files by packing several into each prompt.
+
+        Files are tagged with their index and the LLM returns a JSON array of
+        analyses, so b files cost one completion instead of b. A prompt holds
+        at most batch_size files and is closed early once it would exceed
+        config.max_marshaled_prompt_tokens. Files missing from a response are
+        analyzed individually.
+
+        Args:
+            files: The (code, language, file_path) of each file.
+            batch_size: The maximum number of files in one prompt.
+            options: Optional additional options.
+
+        Returns:
+            The analysis results, in the same order as the files.
+        """
+        prompt_config = self.prompts.marshaled_code_analysis
+        if prompt_config is None:
+            return await self.analyze_code_batch([
+                {"code": code, "language": language, "file_path": file_path, "options": options}
+                for code, language, file_path in files
+            ])
+
+        logger.info(f"Analyzing {len(files)} files with up to {batch_size} per prompt")
+
+        groups: List[List[int]] = []
+        blocks: List[str] = []
+        group: List[int] = []
+        group_tokens = 0
+        for index, (code, language, file_path) in enumerate(files):
+            block = prompt_config.file_template.format(
+                index=index,
+                code=code,
+                language=language,
+                file_path=file_path or "unknown"
+            )
+            tokens = _count_tokens(block, self.config.llm.model_name)
+            if group and (len(group) >= batch_size or group_tokens + tokens > self.config.max_marshaled_prompt_tokens):
+                groups.append(group)
+                group, group_tokens = [], 0
+            group.append(index)
+            blocks.append(block)
+            group_tokens += tokens
+        if group:
+            groups.append(group)
+
+        options_json = _options_json(options)
+        all_messages = [
+            self._build_messages("marshaled_code_analysis", prompt_config, prompt_config.user_message_template.format(
+                files="\n\n".join(blocks[index] for index in group),
+                options=options_json
+            ))
+            for group in groups
+        ]
+        generations = await self._generate_batch(all_messages)
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(files)
+        for group, generation in zip(groups, generations):
+            for index, result in self._parse_marshaled_analysis_response(generation[0].text).items():
+                if index in group:
+                    results[index] = result
+
+        missing = [index for index, result in enumerate(results) if result is None]
+        if missing:
+            logger.warning(f"Marshaled analysis returned no result for {len(missing)} files; analyzing them individually")
+            retried = await self.analyze_code_batch([
+                {"code": files[index][0], "language": files[index][1], "file_path": files[index][2], "options": options}
+                for index in missing
+            ])
+            for index, result in zip(missing, retried):
+                results[index] = result
+
+        return results
+
     async def analyze_cross_file_dependencies(
         self,
         file_paths: List[str],
@@ -143,14 +652,10 @@ class LLMService:
 
         # Read file contents if not provided
         if content_map is None:
-            content_map = {}
-            for file_path in file_paths:
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content_map[file_path] = f.read()
-                except Exception as e:
-                    logger.warning(f"Error reading file {file_path}: {str(e)}")
-                    content_map[file_path] = f"# Error reading file: {str(e)}"
+            contents = await asyncio.gather(
+                *(asyncio.to_thread(_read_file_content, file_path) for file_path in file_paths)
+            )
+            content_map = dict(zip(file_paths, contents))
 
         # Prepare the messages
         messages = self._prepare_cross_file_analysis_messages(file_paths, content_map, options)
@@ -162,8 +667,8 @@ class LLMService:
         # Parse the response
         try:
             # Try to parse as JSON
-            result = json.loads(response_text)
-        except json.JSONDecodeError:
+            result = _parse_json_lenient(response_text)
+        except orjson.JSONDecodeError:
             # If not JSON, create a simple result
             result = {
                 "summary": response_text,
@@ -205,8 +710,8 @@ class LLMService:
         # Parse the response
         try:
             # Try to parse as JSON
-            result = json.loads(response_text)
-        except json.JSONDecodeError:
+            result = _parse_json_lenient(response_text)
+        except orjson.JSONDecodeError:
             # If not JSON, create a simple result
             result = {
                 "description": response_text,
@@ -249,8 +754,8 @@ class LLMService:
         # Parse the response
         try:
             # Try to parse as JSON
-            result = json.loads(response_text)
-        except json.JSONDecodeError:
+            result = _parse_json_lenient(response_text)
+        except orjson.JSONDecodeError:
             # If not JSON, create a simple result with the raw text as a single completion item
             result = {
                 "items": [
@@ -266,6 +771,104 @@ class LLMService:
         logger.debug(f"Code completion result: {result}")
         return result
 
+    async def _generate_batch(self, all_messages: List[List[BaseMessage]]) -> List[List[Any]]:
+        """
+        Send several message lists to the LLM as one agenerate() call.
+
+        The prompts are not batched into a single provider request; LangChain
+        issues one request per prompt and gathers them.
+
+        Args:
+            all_messages: The messages for each prompt.
+
+        Returns:
+            The generations for each prompt, in order.
+
+        Raises:
+            RuntimeError: If the LLM returns fewer generations than prompts.
+        """
+        if not all_messages:
+            return []
+
+        response = await self.llm.agenerate(all_messages)
+        if len(response.generations) < len(all_messages):
+            raise RuntimeError("LLM returned fewer generations than prompts")
+        return response.generations
+
+    def _parse_code_generation_response(self, response_text: str) -> Dict[str, Any]:
+        """
+        Parse a code generation response.
+
+        Args:
+            response_text: The text returned by the LLM.
+
+        Returns:
+            The generated code and explanation.
+        """
+        try:
+            # Try to parse as JSON first
+            return _parse_json_lenient(response_text)
+        except orjson.JSONDecodeError:
+            # If not JSON, use the raw text as code
+            return {
+                "code": response_text,
+                "explanation": "Generated code based on the prompt."
+            }
+
+    def _parse_code_analysis_response(
+        self,
+        response_text: str,
+        language: str,
+        file_path: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Parse a code analysis response.
+
+        Args:
+            response_text: The text returned by the LLM.
+            language: The programming language of the code.
+            file_path: Optional file path of the code.
+
+        Returns:
+            The analysis results.
+        """
+        try:
+            # Try to parse as JSON
+            return _parse_json_lenient(response_text)
+        except orjson.JSONDecodeError:
+            # If not JSON, create a simple result
+            return {
+                "summary": response_text,
+                "language": language,
+                "file_path": file_path,
+                "symbols": []
+            }
+
+    def _parse_marshaled_analysis_response(self, response_text: str) -> Dict[int, Dict[str, Any]]:
+        """
+        Parse a marshaled code analysis response.
+
+        Args:
+            response_text: The text returned by the LLM.
+
+        Returns:
+            The analyses in the response, keyed by file index. Entries that
+            are malformed or have no integer index are dropped.
+        """
+        try:
+            entries = _parse_json_lenient(response_text)
+        except orjson.JSONDecodeError:
+            return {}
+        if not isinstance(entries, list):
+            return {}
+
+        results: Dict[int, Dict[str, Any]] = {}
+        for entry in entries:
+            if isinstance(entry, dict) and isinstance(entry.get("index"), int):
+                index = entry.pop("index")
+                results[index] = entry
+        return results
+
     def _prepare_code_generation_messages(
         self,
         prompt: str,
@@ -278,28 +881,15 @@ class LLMService:
         # Get the prompt config
         prompt_config = self.prompts.code_generation
 
-        # Create the system message
-        system_message = SystemMessage(content=prompt_config.system_message)
-
         # Format the user message
         user_message_content = prompt_config.user_message_template.format(
             prompt=prompt,
             language=language,
-            context=context or "No context provided",
+            context=_fit_context(context, self.config.max_input_tokens, self.config.llm.model_name) if context else "No context provided",
             file_path=file_path or "No file path provided",
-            options=json.dumps(options or {})
+            options=_options_json(options)
         )
-        user_message = HumanMessage(content=user_message_content)
-
-        # Add examples if available
-        messages = [system_message]
-        if prompt_config.examples:
-            for example in prompt_config.examples:
-                messages.append(HumanMessage(content=example["user"]))
-                messages.append(AIMessage(content=example["assistant"]))
-
-        messages.append(user_message)
-        return messages
+        return self._build_messages("code_generation", prompt_config, user_message_content)
 
     def _prepare_code_analysis_messages(
         self,
@@ -312,27 +902,15 @@ class LLMService:
         # Get the prompt config
         prompt_config = self.prompts.code_analysis
 
-        # Create the system message
-        system_message = SystemMessage(content=prompt_config.system_message)
-
-        # Format the user message
+        # Format the user message. The code is sent whole, unlike generation
+        # context: the symbol ranges in the analysis refer to its line numbers.
         user_message_content = prompt_config.user_message_template.format(
             code=code,
             language=language,
             file_path=file_path or "unknown",
-            options=json.dumps(options or {})
+            options=_options_json(options)
         )
-        user_message = HumanMessage(content=user_message_content)
-
-        # Add examples if available
-        messages = [system_message]
-        if prompt_config.examples:
-            for example in prompt_config.examples:
-                messages.append(HumanMessage(content=example["user"]))
-                messages.append(AIMessage(content=example["assistant"]))
-
-        messages.append(user_message)
-        return messages
+        return self._build_messages("code_analysis", prompt_config, user_message_content)
 
     def _prepare_cross_file_analysis_messages(
         self,
@@ -344,9 +922,6 @@ class LLMService:
         # Get the prompt config
         prompt_config = self.prompts.cross_file_analysis
 
-        # Create the system message
-        system_message = SystemMessage(content=prompt_config.system_message)
-
         # Prepare file information
         file_info = []
         for file_path in file_paths:
@@ -363,20 +938,10 @@ class LLMService:
 
         # Format the user message
         user_message_content = prompt_config.user_message_template.format(
-            files=json.dumps(file_info, indent=2),
-            options=json.dumps(options or {})
+            files=orjson.dumps(file_info, option=orjson.OPT_INDENT_2).decode(),
+            options=_options_json(options)
         )
-        user_message = HumanMessage(content=user_message_content)
-
-        # Add examples if available
-        messages = [system_message]
-        if prompt_config.examples:
-            for example in prompt_config.examples:
-                messages.append(HumanMessage(content=example["user"]))
-                messages.append(AIMessage(content=example["assistant"]))
-
-        messages.append(user_message)
-        return messages
+        return self._build_messages("cross_file_analysis", prompt_config, user_message_content)
 
     def _prepare_code_completion_messages(
         self,
@@ -389,9 +954,6 @@ class LLMService:
         # Get the prompt config
         prompt_config = self.prompts.code_completion
 
-        # Create the system message
-        system_message = SystemMessage(content=prompt_config.system_message)
-
         # Extract the relevant context around the cursor position
         position = request.position
         lines = file_content.split('\n')
@@ -450,19 +1012,9 @@ class LLMService:
             context=context_content,
             language=language,
             project_context=project_context_info,
-            options=json.dumps(request.options.model_dump() if request.options else {})
+            options=_options_json(request.options.model_dump() if request.options else None)
         )
-        user_message = HumanMessage(content=user_message_content)
-
-        # Add examples if available
-        messages = [system_message]
-        if prompt_config.examples:
-            for example in prompt_config.examples:
-                messages.append(HumanMessage(content=example["user"]))
-                messages.append(AIMessage(content=example["assistant"]))
-
-        messages.append(user_message)
-        return messages
+        return self._build_messages("code_completion", prompt_config, user_message_content)
 
     def _prepare_code_refactoring_messages(
         self,
@@ -474,9 +1026,6 @@ class LLMService:
         # Get the prompt config
         prompt_config = self.prompts.code_refactoring
 
-        # Create the system message
-        system_message = SystemMessage(content=prompt_config.system_message)
-
         # Prepare file information
         file_info = []
         for file_path in request.file_paths:
@@ -494,23 +1043,67 @@ class LLMService:
         # Format the user message
         user_message_content = prompt_config.user_message_template.format(
             refactoring_type=request.refactoring_type,
-            files=json.dumps(file_info, indent=2),
-            target_symbol=json.dumps(request.target_symbol) if request.target_symbol else "null",
-            new_name=json.dumps(request.new_name) if request.new_name else "null",
-            selection=json.dumps(request.selection) if request.selection else "null",
-            options=json.dumps(request.options) if request.options else "{}",
-            dependencies=json.dumps(dependencies) if dependencies else "null"
+            files=orjson.dumps(file_info, option=orjson.OPT_INDENT_2).decode(),
+            target_symbol=_dumps(request.target_symbol) if request.target_symbol else "null",
+            new_name=_dumps(request.new_name) if request.new_name else "null",
+            selection=_dumps(request.selection) if request.selection else "null",
+            options=_options_json(request.options),
+            dependencies=_dumps(dependencies) if dependencies else "null"
         )
-        user_message = HumanMessage(content=user_message_content)
+        return self._build_messages("code_refactoring", prompt_config, user_message_content)
+
+    def _build_messages(self, name: str, prompt_config: Any, user_message_content: str) -> List[BaseMessage]:
+        """
+        Build the messages for a prompt.
+
+        The system message and few-shot examples form a static prefix that is
+        built once per prompt and shared by every call, with only the user
+        message varying. This keeps the prefix byte-identical across calls so
+        provider-side prompt caching can reuse it.
 
-        # Add examples if available
-        messages = [system_message]
+        Args:
+            name: The name of the prompt.
+            prompt_config: The prompt configuration.
+            user_message_content: The formatted user message.
+
+        Returns:
+            The messages to send to the LLM.
+        """
+        prefix = self._prompt_prefixes.get(name)
+        if prefix is None:
+            prefix = self._build_prompt_prefix(prompt_config)
+            self._prompt_prefixes[name] = prefix
+
+        return prefix + [HumanMessage(content=user_message_content)]
+
+    def _build_prompt_prefix(self, prompt_config: Any) -> List[BaseMessage]:
+        """
+        Build the static system and example messages for a prompt.
+
+        For Anthropic models the last static message carries a cache_control
+        breakpoint, since Anthropic only caches prompts that are marked. The
+        breakpoint is left out when config.prompt_cache_enabled is off.
+
+        Args:
+            prompt_config: The prompt configuration.
+
+        Returns:
+            The static prefix messages.
+        """
+        messages: List[BaseMessage] = [SystemMessage(content=prompt_config.system_message)]
         if prompt_config.examples:
             for example in prompt_config.examples:
                 messages.append(HumanMessage(content=example["user"]))
                 messages.append(AIMessage(content=example["assistant"]))
 
-        messages.append(user_message)
+        if self.config.prompt_cache_enabled and self.config.llm.model_type == LLMType.ANTHROPIC:
+            last = messages[-1]
+            messages[-1] = last.__class__(content=[{
+                "type": "text",
+                "text": last.content,
+                "cache_control": {"type": "ephemeral"}
+            }])
+
         return messages
 
     def _get_language_from_extension(self, ext: str) -> str:
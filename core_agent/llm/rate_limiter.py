@@ -0,0 +1,49 @@
+"""
+LLM rate limiter.
+
+This module provides a token bucket that paces LLM requests to a provider's
+requests-per-minute limit.
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+
+class AsyncRateLimiter:
+    """
+    Token bucket rate limiter for asyncio tasks.
+
+    Tokens refill continuously at the configured rate, up to a burst capacity,
+    and each request takes one token, waiting for a refill if none is left.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: Optional[int] = None):
+        """
+        Initialize the rate limiter.
+
+        Args:
+            requests_per_minute: The sustained number of requests allowed per minute.
+            burst: The number of requests that may start at once after an idle
+                period. Defaults to one second's worth of requests.
+        """
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive")
+
+        self.interval = 60.0 / requests_per_minute
+        self.capacity = burst or max(1, int(requests_per_minute // 60))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a request may start."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) / self.interval)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self.interval)
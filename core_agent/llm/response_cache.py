@@ -0,0 +1,131 @@
+"""
+LLM response cache.
+
+This module provides the process-wide LangChain cache used for LLM responses.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+
+from shared.utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normalize a prompt for use in a cache key.
+
+    Trailing whitespace on each line and around the prompt is dropped.
+    Indentation is kept, since it is significant in code.
+
+    Args:
+        prompt: The prompt text.
+
+    Returns:
+        The normalized prompt.
+    """
+    return "\n".join(line.rstrip() for line in prompt.strip().splitlines())
+
+
+class LLMResponseCache(BaseCache):
+    """
+    Cache of LLM responses keyed on the normalized prompt and model settings.
+
+    Recently used responses are kept in an in-memory LRU. If a directory is
+    given and the diskcache package is installed, responses are also written
+    to disk so they survive restarts.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[int] = None, directory: Optional[str] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            maxsize: The number of responses to keep in memory.
+            ttl: Seconds a response stays valid, or None to keep it until evicted.
+            directory: Optional directory for the on-disk cache.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl or None
+        self._entries: OrderedDict[str, Tuple[Optional[float], RETURN_VAL_TYPE]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk: Any = None
+
+        if directory:
+            try:
+                import diskcache
+            except ImportError:
+                logger.warning("diskcache is not installed, caching LLM responses in memory only")
+            else:
+                self._disk = diskcache.Cache(directory)
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        """Build the cache key for a prompt and model settings."""
+        data = f"{normalize_prompt(prompt)}\0{llm_string}".encode("utf-8")
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """
+        Look up a cached response.
+
+        Args:
+            prompt: The prompt text.
+            llm_string: The serialized model settings.
+
+        Returns:
+            The cached generations, or None on a miss.
+        """
+        key = self._key(prompt, llm_string)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+        if self._disk is None:
+            return None
+
+        value = self._disk.get(key)
+        if value is not None:
+            self._remember(key, value)
+        return value
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """
+        Cache a response.
+
+        Args:
+            prompt: The prompt text.
+            llm_string: The serialized model settings.
+            return_val: The generations to cache.
+        """
+        key = self._key(prompt, llm_string)
+        self._remember(key, return_val)
+        if self._disk is not None:
+            self._disk.set(key, return_val, expire=self.ttl)
+
+    def clear(self, **kwargs: Any) -> None:
+        """Clear the cache."""
+        with self._lock:
+            self._entries.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def _remember(self, key: str, value: RETURN_VAL_TYPE) -> None:
+        """Store a response in the in-memory LRU."""
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
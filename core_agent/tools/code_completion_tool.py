@@ -4,6 +4,7 @@ Code completion tool.
 This module provides a tool for generating code completion suggestions.
 """
 
+import asyncio
 import os
 from typing import Dict, Any, Optional
 
@@ -17,6 +18,20 @@ from shared.utils.logging_utils import get_logger
 logger = get_logger(__name__)
 
 
+def _read_file(file_path: str) -> str:
+    """
+    Read the file being edited.
+
+    Args:
+        file_path: The path to the file.
+
+    Returns:
+        The file content.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
 class CodeCompletionTool(BaseTool):
     """Tool for generating code completion suggestions."""
 
@@ -68,8 +83,7 @@ class CodeCompletionTool(BaseTool):
         logger.info(f"Generating code completion for file: {file_path}")
         try:
             # Read the file content
-            with open(file_path, 'r', encoding='utf-8') as f:
-                file_content = f.read()
+            file_content = _read_file(file_path)
 
             # Extract language from file extension
             _, ext = os.path.splitext(file_path)
@@ -150,8 +164,7 @@ class CodeCompletionTool(BaseTool):
         logger.info(f"Generating code completion for file: {file_path}")
         try:
             # Read the file content
-            with open(file_path, 'r', encoding='utf-8') as f:
-                file_content = f.read()
+            file_content = await asyncio.to_thread(_read_file, file_path)
 
             # Extract language from file extension
             _, ext = os.path.splitext(file_path)
@@ -4,6 +4,7 @@ Code refactoring tools.
 This module provides tools for refactoring code.
 """
 
+import asyncio
 import os
 from typing import Dict, Any, Optional, List
 
@@ -17,6 +18,27 @@ from shared.utils.logging_utils import get_logger
 logger = get_logger(__name__)
 
 
+def _read_file(file_path: str) -> str:
+    """
+    Read a file to refactor.
+
+    Args:
+        file_path: The path to the file.
+
+    Returns:
+        The file content.
+
+    Raises:
+        ValueError: If the file cannot be read.
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except Exception as e:
+        logger.warning(f"Error reading file {file_path}: {str(e)}")
+        raise ValueError(f"Error reading file {file_path}: {str(e)}")
+
+
 class RefactorCodeTool(BaseTool):
     """Tool for refactoring code."""
 
@@ -81,14 +103,7 @@ class RefactorCodeTool(BaseTool):
                 raise ValueError("Extract method refactoring requires a selection")
             
             # Read file contents
-            content_map = {}
-            for file_path in file_paths:
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content_map[file_path] = f.read()
-                except Exception as e:
-                    logger.warning(f"Error reading file {file_path}: {str(e)}")
-                    raise ValueError(f"Error reading file {file_path}: {str(e)}")
+            content_map = {file_path: _read_file(file_path) for file_path in file_paths}
             
             # Analyze dependencies if needed
             if len(file_paths) > 1 or refactoring_type in ["rename", "move_method", "move_class"]:
@@ -159,15 +174,11 @@ class RefactorCodeTool(BaseTool):
             if refactoring_type == "extract_method" and not selection:
                 raise ValueError("Extract method refactoring requires a selection")
             
-            # Read file contents
-            content_map = {}
-            for file_path in file_paths:
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content_map[file_path] = f.read()
-                except Exception as e:
-                    logger.warning(f"Error reading file {file_path}: {str(e)}")
-                    raise ValueError(f"Error reading file {file_path}: {str(e)}")
+            # Read file contents concurrently
+            contents = await asyncio.gather(
+                *(asyncio.to_thread(_read_file, file_path) for file_path in file_paths)
+            )
+            content_map = dict(zip(file_paths, contents))
             
             # Analyze dependencies if needed
             if len(file_paths) > 1 or refactoring_type in ["rename", "move_method", "move_class"]:
@@ -4,6 +4,7 @@ Write file tool for the agent.
 This module provides a tool for writing files that can be used by the agent.
 """
 
+import asyncio
 import os
 from typing import Dict, Any, Optional
 
@@ -120,8 +121,10 @@ class WriteFileTool(BaseTool):
         create_backup: bool = True,
         requires_confirmation: bool = True
     ) -> Dict[str, Any]:
-        """Async version of _run."""
-        return self._run(file_path, content, encoding, base_dir, create_backup, requires_confirmation)
+        """Async version of _run; the file I/O and diff run in a worker thread."""
+        return await asyncio.to_thread(
+            self._run, file_path, content, encoding, base_dir, create_backup, requires_confirmation
+        )
 
     def _generate_diff(self, old_content: str, new_content: str) -> str:
         """
@@ -191,5 +194,5 @@ class ConfirmWriteFileTool(BaseTool):
         base_dir: Optional[str] = None,
         create_backup: bool = True
     ) -> Dict[str, Any]:
-        """Async version of _run."""
-        return self._run(file_path, content, encoding, base_dir, create_backup)
+        """Async version of _run; the file I/O runs in a worker thread."""
+        return await asyncio.to_thread(self._run, file_path, content, encoding, base_dir, create_backup)
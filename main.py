@@ -12,7 +12,6 @@ import os
 import sys
 from typing import Optional, Dict, Any, List
 
-import traceback
 
 # Add the project root to the Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -240,6 +239,10 @@ async def handle_write_file(params):
     base_dir = params.get("base_dir")
     create_backup = params.get("create_backup", True)
 
+    # Content sent as the raw payload of a binary framed message arrives as bytes
+    if isinstance(content, bytes):
+        content = content.decode(encoding)
+
     # Create a request for the agent
     request = AgentRequest(
         task_type="write_file",
@@ -272,6 +275,10 @@ async def handle_confirm_write_file(params):
     base_dir = params.get("base_dir")
     create_backup = params.get("create_backup", True)
 
+    # Content sent as the raw payload of a binary framed message arrives as bytes
+    if isinstance(content, bytes):
+        content = content.decode(encoding)
+
     # Create a request for the agent
     request = AgentRequest(
         task_type="confirm_write_file",
@@ -295,6 +302,16 @@ async def handle_confirm_write_file(params):
     return response.results
 
 
+def install_event_loop_policy() -> None:
+    """Use the uvloop event loop for the service if it is installed."""
+    try:
+        import uvloop
+    except ImportError:
+        return
+
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+
 async def main(host: str = "localhost", port: int = 8765, log_level: str = "INFO", log_file: Optional[str] = None):
     """
     Start the Prismata Agent service.
@@ -322,7 +339,7 @@ async def main(host: str = "localhost", port: int = 8765, log_level: str = "INFO
     transport = WebSocketTransport(host=host, port=port)
 
     # Initialize recovery service
-    recovery_service = RecoveryService(history_file=".prismata/operation_history.json")
+    recovery_service = RecoveryService(history_file=".prismata/operation_history.jsonl")
 
     # Error handling and recovery endpoints
     async def handle_get_operation_history(params):
@@ -380,8 +397,7 @@ async def main(host: str = "localhost", port: int = 8765, log_level: str = "INFO
                 category=ErrorCategory.UNKNOWN,
                 severity=ErrorSeverity.ERROR,
                 details={
-                    "operation_id": operation_id,
-                    "stack_trace": traceback.format_exc()
+                    "operation_id": operation_id
                 }
             )
 
@@ -418,8 +434,7 @@ async def main(host: str = "localhost", port: int = 8765, log_level: str = "INFO
                 severity=ErrorSeverity.ERROR,
                 details={
                     "operation_id": operation_id,
-                    "strategy_name": strategy_name,
-                    "stack_trace": traceback.format_exc()
+                    "strategy_name": strategy_name
                 }
             )
 
@@ -459,6 +474,8 @@ async def main(host: str = "localhost", port: int = 8765, log_level: str = "INFO
         logger.info("Shutting down...")
     finally:
         await transport.stop()
+        await agent.close()
+        recovery_service.close()
         logger.info("Agent service stopped.")
 
 
@@ -472,4 +489,5 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
+    install_event_loop_policy()
     asyncio.run(main(host=args.host, port=args.port, log_level=args.log_level, log_file=args.log_file))
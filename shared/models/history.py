@@ -85,6 +85,19 @@ class HistoryManager(BaseModel):
         if len(self.entries) > self.max_entries:
             self.entries = self.entries[-self.max_entries:]
 
+    def add_entries(self, entries: List[HistoryEntry]) -> None:
+        """
+        Add several entries to the history, trimming it once.
+        
+        Args:
+            entries: The history entries to add, oldest first.
+        """
+        self.entries.extend(entries)
+        
+        # Trim the history if it exceeds the maximum number of entries
+        if len(self.entries) > self.max_entries:
+            del self.entries[:-self.max_entries]
+
     def get_entries(
         self,
         limit: Optional[int] = None,
@@ -6,7 +6,14 @@ import unittest
 from unittest.mock import MagicMock, AsyncMock, patch
 
 from core_agent.agent.base_agent import AgentRequest, AgentResponse
-from core_agent.agent.langgraph_agent import LangGraphAgent
+from core_agent.agent.langgraph_agent import (
+    LangGraphAgent,
+    TaskCancelledError,
+    _TaskHandle,
+    _bind_configurable,
+    _build_shared_workflow
+)
+from core_agent.agent.state_models import AgentState
 
 
 class TestLangGraphAgent(unittest.TestCase):
@@ -23,19 +30,22 @@ class TestLangGraphAgent(unittest.TestCase):
         mock_compile = MagicMock()
         mock_state_graph.return_value.compile.return_value = mock_compile
 
+        _build_shared_workflow.cache_clear()
+        self.addCleanup(_build_shared_workflow.cache_clear)
+
         # Act
         agent = LangGraphAgent()
+        other_agent = LangGraphAgent()
 
         # Assert
         self.assertIsNotNone(agent.workflow)
+        self.assertIs(agent.workflow, other_agent.workflow)
         mock_state_graph.return_value.compile.assert_called_once()
 
-    @patch('core_agent.agent.langgraph_agent.uuid.uuid4')
     @patch('core_agent.agent.langgraph_agent.LangGraphAgent._build_workflow')
-    def test_execute(self, mock_build_workflow, mock_uuid):
+    def test_execute(self, mock_build_workflow):
         """Test agent execution."""
         # Arrange
-        mock_uuid.return_value = "test-task-id"
         request = AgentRequest(
             task_type="test_task",
             inputs={"test_input": "test_value"},
@@ -70,6 +80,34 @@ class TestLangGraphAgent(unittest.TestCase):
         self.assertEqual(response.status, "completed")
         self.assertEqual(response.results, {"test_result": "test_value"})
 
+    @patch('core_agent.agent.langgraph_agent.LangGraphAgent._build_workflow')
+    def test_execute_direct_tool(self, mock_build_workflow):
+        """Test that single-tool tasks bypass the workflow."""
+        # Arrange
+        mock_workflow = MagicMock()
+        mock_workflow.ainvoke = AsyncMock()
+        mock_build_workflow.return_value = mock_workflow
+
+        agent = LangGraphAgent()
+        read_tool = MagicMock()
+        read_tool._arun = AsyncMock(return_value={"content": "hello"})
+        agent.tools_by_name["read_file"] = read_tool
+
+        request = AgentRequest(
+            task_type="read_file",
+            inputs={"file_path": "a.py", "encoding": "utf-8", "base_dir": None}
+        )
+
+        # Act
+        import asyncio
+        response = asyncio.run(agent.execute(request))
+
+        # Assert
+        self.assertEqual(response.status, "completed")
+        self.assertEqual(response.results, {"content": "hello"})
+        read_tool._arun.assert_awaited_once_with(file_path="a.py", encoding="utf-8", base_dir=None)
+        mock_workflow.ainvoke.assert_not_called()
+
     @patch('core_agent.agent.langgraph_agent.LangGraphAgent._build_workflow')
     def test_cancel(self, mock_build_workflow):
         """Test task cancellation."""
@@ -78,7 +116,7 @@ class TestLangGraphAgent(unittest.TestCase):
         agent = LangGraphAgent()
         task_id = "test-task-id"
         agent.active_tasks = {
-            task_id: {"cancelled": False, "state": {}}
+            task_id: _TaskHandle()
         }
         agent.cancel = AsyncMock(return_value=True)
 
@@ -104,6 +142,71 @@ class TestLangGraphAgent(unittest.TestCase):
         # Assert
         self.assertFalse(result)
 
+    @patch('core_agent.agent.langgraph_agent.LangGraphAgent._build_workflow')
+    @patch('core_agent.agent.langgraph_agent.LLMService')
+    def test_replicas_use_their_own_tools(self, mock_llm_service, mock_build_workflow):
+        """Test that each API replica's tools call that replica's service."""
+        # Arrange
+        from core_agent.llm.default_config import DEFAULT_LLM_SERVICE_CONFIG
+        mock_build_workflow.return_value = MagicMock()
+        mock_llm_service.side_effect = lambda config: MagicMock(config=config)
+        llm_config = DEFAULT_LLM_SERVICE_CONFIG.model_copy(update={
+            "llm": DEFAULT_LLM_SERVICE_CONFIG.llm.model_copy(update={"base_urls": ["http://a", "http://b"]})
+        })
+
+        def initialize_tools(agent, llm_service):
+            tool = MagicMock(llm_service=llm_service)
+            tool.name = "generate_code"
+            return [tool]
+
+        # Act
+        with patch.object(LangGraphAgent, "_initialize_tools", autospec=True, side_effect=initialize_tools):
+            agent = LangGraphAgent({"llm_config": llm_config})
+
+        # Assert
+        self.assertEqual([service.config.llm.api_base for service in agent.llm_services], ["http://a", "http://b"])
+        for service, run_config in zip(agent.llm_services, agent._run_configs):
+            configurable = run_config["configurable"]
+            self.assertIs(configurable["llm"], service.llm)
+            self.assertIs(configurable["tools"]["generate_code"].llm_service, service)
+
+    @patch('core_agent.agent.langgraph_agent.LangGraphAgent._build_workflow')
+    def test_close_writes_queued_history(self, mock_build_workflow):
+        """Test that closing the agent writes queued history records first."""
+        # Arrange
+        mock_build_workflow.return_value = MagicMock()
+        agent = LangGraphAgent()
+        agent.history_manager = MagicMock()
+
+        async def record_and_close():
+            for index in range(3):
+                agent._schedule_record(f"task-{index}", "generate_code", {}, {"status": "completed"}, MagicMock())
+            await agent.close()
+
+        # Act
+        import asyncio
+        with patch('core_agent.agent.langgraph_agent._build_history_entry', side_effect=lambda *record: record[0]):
+            asyncio.run(record_and_close())
+
+        # Assert
+        written = [entry for call in agent.history_manager.add_entries.call_args_list for entry in call.args[0]]
+        self.assertEqual(written, ["task-0", "task-1", "task-2"])
+        self.assertIsNone(agent._history_worker)
+
+    def test_cancelled_task_skips_remaining_nodes(self):
+        """Test that workflow nodes do not run once their task is cancelled."""
+        # Arrange
+        node = MagicMock()
+        bound_node = _bind_configurable(node, "llm")
+        handle = _TaskHandle()
+        handle.cancel()
+        config = {"configurable": {"llm": MagicMock(), "cancel_event": handle.cancel_event}}
+
+        # Act / Assert
+        with self.assertRaises(TaskCancelledError):
+            bound_node(AgentState(task_id="test-task-id", task_type="generate_code"), config)
+        node.assert_not_called()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,119 @@
+"""
+Tests for the LLM batch API.
+
+This module contains tests for the LLM batch API client.
+"""
+
+import asyncio
+import json
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from core_agent.llm.batch_api import LLMBatchAPI
+from core_agent.llm.llm_config import LLMConfig, LLMType
+
+
+def _message(message_type, content):
+    """Build a fake LangChain message."""
+    return MagicMock(type=message_type, content=content)
+
+
+class TestLLMBatchAPI(unittest.TestCase):
+    """Tests for the LLMBatchAPI class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.messages = [
+            [_message("system", "Analyze code."), _message("human", "x = 1")],
+            [_message("system", "Analyze code."), _message("human", "y = 2")]
+        ]
+        self.client = MagicMock()
+
+    def _api(self, model_type):
+        """Create a batch API client backed by the fake SDK client."""
+        api = LLMBatchAPI(LLMConfig(model_type=model_type, model_name="model", temperature=0.0))
+        api._client = self.client
+        return api
+
+    def test_submit_openai_batch(self):
+        """Test that OpenAI prompts are uploaded as JSONL and submitted as a batch."""
+        self.client.files.create = AsyncMock(return_value=MagicMock(id="file-1"))
+        self.client.batches.create = AsyncMock(return_value=MagicMock(id="batch-1"))
+
+        batch_id = asyncio.run(self._api(LLMType.OPENAI).submit_batch(self.messages))
+
+        self.assertEqual(batch_id, "batch-1")
+        _, data = self.client.files.create.call_args.kwargs["file"]
+        lines = [json.loads(line) for line in data.decode().splitlines()]
+        self.assertEqual([line["custom_id"] for line in lines], ["0", "1"])
+        self.assertEqual(lines[1]["body"]["messages"][1], {"role": "user", "content": "y = 2"})
+        self.client.batches.create.assert_awaited_once_with(
+            input_file_id="file-1",
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+
+    def test_poll_openai_batch(self):
+        """Test that OpenAI results are returned in submission order."""
+        self.client.batches.retrieve = AsyncMock(return_value=MagicMock(
+            status="completed",
+            output_file_id="file-2",
+            request_counts=MagicMock(total=3)
+        ))
+        output = "\n".join(
+            json.dumps({
+                "custom_id": custom_id,
+                "response": {"status_code": 200, "body": {"choices": [{"message": {"content": text}}]}}
+            })
+            for custom_id, text in (("2", "third"), ("0", "first"))
+        )
+        self.client.files.content = AsyncMock(return_value=MagicMock(text=output))
+
+        results = asyncio.run(self._api(LLMType.OPENAI).poll_batch("batch-1"))
+
+        self.assertEqual(results, ["first", None, "third"])
+
+    def test_poll_running_batch(self):
+        """Test that a running batch has no results yet."""
+        self.client.batches.retrieve = AsyncMock(return_value=MagicMock(status="in_progress"))
+
+        self.assertIsNone(asyncio.run(self._api(LLMType.OPENAI).poll_batch("batch-1")))
+
+    def test_submit_anthropic_batch(self):
+        """Test that the system message is passed separately to Anthropic."""
+        self.client.messages.batches.create = AsyncMock(return_value=MagicMock(id="batch-1"))
+
+        asyncio.run(self._api(LLMType.ANTHROPIC).submit_batch(self.messages))
+
+        requests = self.client.messages.batches.create.call_args.kwargs["requests"]
+        self.assertEqual(requests[0]["params"]["system"], "Analyze code.")
+        self.assertEqual(requests[0]["params"]["messages"], [{"role": "user", "content": "x = 1"}])
+
+    def test_poll_anthropic_batch(self):
+        """Test that Anthropic results have one entry per submitted prompt."""
+        self.client.messages.batches.retrieve = AsyncMock(return_value=MagicMock(
+            processing_status="ended",
+            request_counts=MagicMock(succeeded=1, errored=1, canceled=0, expired=1)
+        ))
+
+        async def entries():
+            yield MagicMock(custom_id="1", result=MagicMock(
+                type="succeeded",
+                message=MagicMock(content=[MagicMock(type="text", text="second")])
+            ))
+            yield MagicMock(custom_id="0", result=MagicMock(type="errored"))
+
+        self.client.messages.batches.results = AsyncMock(return_value=entries())
+
+        results = asyncio.run(self._api(LLMType.ANTHROPIC).poll_batch("batch-1"))
+
+        self.assertEqual(results, [None, "second", None])
+
+    def test_unsupported_model_type(self):
+        """Test that local models have no batch API."""
+        with self.assertRaises(ValueError):
+            LLMBatchAPI(LLMConfig(model_type=LLMType.LOCAL, model_name="model"))
+
+
+if __name__ == "__main__":
+    unittest.main()
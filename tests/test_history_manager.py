@@ -160,6 +160,17 @@ class TestHistoryManager(unittest.TestCase):
         self.assertEqual(history_manager.entries[0].id, "entry-2")
         self.assertEqual(history_manager.entries[1].id, "entry-3")
 
+    def test_add_entries(self):
+        """Test adding several entries at once."""
+        # Arrange
+        history_manager = HistoryManager(max_entries=2)
+        
+        # Act
+        history_manager.add_entries([self.file_entry, self.code_entry, self.failed_entry])
+        
+        # Assert
+        self.assertEqual([entry.id for entry in history_manager.entries], ["entry-2", "entry-3"])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -31,18 +31,25 @@ class TestLLMFactory(unittest.TestCase):
             temperature=0.7
         )
 
-    @patch('langchain_community.chat_models.ChatOpenAI')
-    def test_create_openai_llm(self, mock_chat_openai):
+        LLMFactory.clear_instances()
+
+    def tearDown(self):
+        """Tear down test fixtures."""
+        LLMFactory.clear_instances()
+
+    @patch('core_agent.llm.llm_factory.LLMFactory._chat_model_class')
+    def test_create_openai_llm(self, mock_chat_model_class):
         """Test creating an OpenAI LLM."""
         # Arrange
+        mock_chat_openai = mock_chat_model_class.return_value
         mock_chat_openai.return_value = MagicMock()
 
         # Act
-        with patch('core_agent.llm.llm_factory.ChatOpenAI', mock_chat_openai):
-            llm = LLMFactory.create_llm(self.openai_config)
+        llm = LLMFactory.create_llm(self.openai_config)
 
         # Assert
         self.assertIsNotNone(llm)
+        mock_chat_model_class.assert_called_once_with("ChatOpenAI")
         mock_chat_openai.assert_called_once_with(
             model_name="gpt-3.5-turbo",
             openai_api_key="test-api-key",
@@ -50,18 +57,19 @@ class TestLLMFactory(unittest.TestCase):
             max_tokens=None
         )
 
-    @patch('langchain_community.chat_models.ChatAnthropic')
-    def test_create_anthropic_llm(self, mock_chat_anthropic):
+    @patch('core_agent.llm.llm_factory.LLMFactory._chat_model_class')
+    def test_create_anthropic_llm(self, mock_chat_model_class):
         """Test creating an Anthropic LLM."""
         # Arrange
+        mock_chat_anthropic = mock_chat_model_class.return_value
         mock_chat_anthropic.return_value = MagicMock()
 
         # Act
-        with patch('core_agent.llm.llm_factory.ChatAnthropic', mock_chat_anthropic):
-            llm = LLMFactory.create_llm(self.anthropic_config)
+        llm = LLMFactory.create_llm(self.anthropic_config)
 
         # Assert
         self.assertIsNotNone(llm)
+        mock_chat_model_class.assert_called_once_with("ChatAnthropic")
         mock_chat_anthropic.assert_called_once_with(
             model_name="claude-2",
             anthropic_api_key="test-api-key",
@@ -69,6 +77,21 @@ class TestLLMFactory(unittest.TestCase):
             max_tokens=None
         )
 
+    @patch('core_agent.llm.llm_factory.LLMFactory._chat_model_class')
+    def test_create_llm_reuses_instances(self, mock_chat_model_class):
+        """Test that configs with the same settings share an LLM instance."""
+        # Arrange
+        mock_chat_model_class.return_value.side_effect = lambda **kwargs: MagicMock()
+        same_config = self.openai_config.model_copy()
+        other_config = self.openai_config.model_copy(update={"temperature": 0.2})
+
+        # Act
+        llm = LLMFactory.create_llm(self.openai_config)
+
+        # Assert
+        self.assertIs(LLMFactory.create_llm(same_config), llm)
+        self.assertIsNot(LLMFactory.create_llm(other_config), llm)
+
     def test_create_openai_llm_without_api_key(self):
         """Test creating an OpenAI LLM without an API key."""
         # Arrange
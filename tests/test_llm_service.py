@@ -7,7 +7,7 @@ This module contains tests for the LLM service.
 import unittest
 from unittest.mock import MagicMock, AsyncMock, patch
 
-from core_agent.llm.llm_service import LLMService
+from core_agent.llm.llm_service import LLMService, _count_tokens, _fit_context
 from core_agent.llm.llm_config import LLMServiceConfig, LLMConfig, LLMType, PromptConfig
 from core_agent.llm.default_config import DEFAULT_PROMPT_CONFIG
 
@@ -136,6 +136,225 @@ class TestLLMService(unittest.TestCase):
         self.assertIn("language", result)
         self.assertEqual(result["language"], "python")
 
+    def test_generate_code_with_fenced_json(self):
+        """Test that JSON wrapped in a code fence and prose is still parsed."""
+        # Arrange
+        generation = MagicMock(text='Here is the code:\n```json\n{"code": "x = 1", "explanation": "Sets x."}\n```\nDone.')
+        self.mock_llm.agenerate.return_value.generations = [[generation]]
+
+        # Act
+        import asyncio
+        result = asyncio.run(self.service.generate_code(prompt="Set x", language="python"))
+
+        # Assert
+        self.assertEqual(result, {"code": "x = 1", "explanation": "Sets x."})
+
+    def test_generate_code_streaming(self):
+        """Test that partial code is yielded while the response streams."""
+        # Arrange
+        response = '{"code": "x = 1\\ny = 2", "explanation": "Sets x and y."}'
+
+        async def astream(messages):
+            for index in range(0, len(response), 8):
+                yield MagicMock(content=response[index:index + 8])
+
+        self.mock_llm.astream = astream
+
+        async def collect():
+            return [result async for result in self.service.generate_code_streaming(prompt="Set x", language="python")]
+
+        # Act
+        import asyncio
+        results = asyncio.run(collect())
+
+        # Assert
+        self.assertGreater(len(results), 2)
+        self.assertTrue(all("x = 1\ny = 2".startswith(result["code"]) for result in results))
+        self.assertEqual(results[-1], {"code": "x = 1\ny = 2", "explanation": "Sets x and y."})
+
+    def test_fit_context_elides_long_inputs(self):
+        """Test that inputs over the token budget keep only their first and last lines."""
+        # Arrange
+        text = "\n".join(f"line_{index} = {index}" for index in range(200))
+
+        # Act
+        fitted = _fit_context(text, 100, "gpt-3.5-turbo")
+
+        # Assert
+        lines = fitted.splitlines()
+        marker = next(index for index, line in enumerate(lines) if line.startswith("... [elided"))
+        self.assertRegex(lines[marker], r"^\.\.\. \[elided \d+ tokens\] \.\.\.$")
+        self.assertGreater(marker, 0)
+        self.assertEqual(lines[:marker], text.splitlines()[:marker])
+        self.assertEqual(lines[marker + 1:], text.splitlines()[marker - len(lines) + 1:])
+        self.assertLessEqual(_count_tokens(fitted, "gpt-3.5-turbo"), 100)
+        self.assertEqual(_fit_context("x = 1", 100, "gpt-3.5-turbo"), "x = 1")
+        self.assertEqual(_fit_context(text, 0, "gpt-3.5-turbo"), text)
+
+    def test_fit_context_trims_long_lines_to_budget(self):
+        """Test that inputs with long lines are cut to fit the token budget."""
+        # Arrange
+        text = "\n".join("x" * 2000 for _ in range(100))
+
+        # Act
+        fitted = _fit_context(text, 500, "gpt-3.5-turbo")
+
+        # Assert
+        self.assertLessEqual(_count_tokens(fitted, "gpt-3.5-turbo"), 500)
+        self.assertIn("... [elided", fitted)
+
+    def test_analyze_code_is_not_trimmed(self):
+        """Test that code sent for analysis keeps all of its lines."""
+        # Arrange
+        code = "\n".join(f"line_{index} = {index}" for index in range(5000))
+
+        # Act
+        messages = self.service._prepare_code_analysis_messages(code=code, language="python")
+
+        # Assert
+        self.assertIn(code, messages[-1].content)
+
+    def test_generate_code_batch(self):
+        """Test that generate_code_batch sends all prompts in one agenerate call."""
+        # Arrange
+        first = MagicMock(text='{"code": "x = 1", "explanation": "First."}')
+        second = MagicMock(text="y = 2")
+        self.mock_llm.agenerate.return_value.generations = [[first], [second]]
+
+        # Act
+        import asyncio
+        results = asyncio.run(self.service.generate_code_batch([
+            {"prompt": "first", "language": "python"},
+            {"prompt": "second", "language": "python"}
+        ]))
+
+        # Assert
+        self.mock_llm.agenerate.assert_awaited_once()
+        self.assertEqual(len(self.mock_llm.agenerate.call_args[0][0]), 2)
+        self.assertEqual(results[0]["code"], "x = 1")
+        self.assertEqual(results[1]["code"], "y = 2")
+
+    def test_analyze_code_batch(self):
+        """Test that analyze_code_batch keeps results in item order."""
+        # Arrange
+        first = MagicMock(text='{"summary": "First.", "symbols": []}')
+        second = MagicMock(text="Not JSON")
+        self.mock_llm.agenerate.return_value.generations = [[first], [second]]
+
+        # Act
+        import asyncio
+        results = asyncio.run(self.service.analyze_code_batch([
+            {"code": "x = 1", "language": "python", "file_path": "a.py"},
+            {"code": "y = 2", "language": "python", "file_path": "b.py"}
+        ]))
+
+        # Assert
+        self.mock_llm.agenerate.assert_awaited_once()
+        self.assertEqual(results[0]["summary"], "First.")
+        self.assertEqual(results[1]["summary"], "Not JSON")
+        self.assertEqual(results[1]["file_path"], "b.py")
+
+    def test_analyze_code_marshaled(self):
+        """Test that analyze_code_marshaled packs files into prompts and scatters results by index."""
+        # Arrange
+        first = MagicMock(text='[{"index": 1, "summary": "Second."}, {"index": 0, "summary": "First."}]')
+        second = MagicMock(text='[{"index": 2, "summary": "Third."}]')
+        self.mock_llm.agenerate.return_value.generations = [[first], [second]]
+        files = [
+            ("x = 1", "python", "a.py"),
+            ("y = 2", "python", "b.py"),
+            ("z = 3", "python", "c.py")
+        ]
+
+        # Act
+        import asyncio
+        results = asyncio.run(self.service.analyze_code_marshaled(files, batch_size=2))
+
+        # Assert
+        self.mock_llm.agenerate.assert_awaited_once()
+        self.assertEqual(len(self.mock_llm.agenerate.call_args[0][0]), 2)
+        self.assertEqual([result["summary"] for result in results], ["First.", "Second.", "Third."])
+
+    def test_anthropic_prompt_prefix_is_cache_marked(self):
+        """Test that the static prefix carries a cache_control breakpoint for Anthropic models."""
+        # Arrange
+        config = self.config.model_copy(update={
+            "llm": LLMConfig(model_type=LLMType.ANTHROPIC, model_name="claude-2")
+        })
+        service = LLMService(config)
+
+        # Act
+        messages = service._prepare_code_analysis_messages("x = 1", "python")
+
+        # Assert
+        self.assertEqual(messages[-2].content[0]["cache_control"], {"type": "ephemeral"})
+
+    def test_prompt_cache_can_be_disabled(self):
+        """Test that no cache_control breakpoint is added when prompt caching is disabled."""
+        # Arrange
+        config = self.config.model_copy(update={
+            "llm": LLMConfig(model_type=LLMType.ANTHROPIC, model_name="claude-2"),
+            "prompt_cache_enabled": False
+        })
+        service = LLMService(config)
+
+        # Act
+        messages = service._prepare_code_analysis_messages("x = 1", "python")
+
+        # Assert
+        self.assertIsInstance(messages[-2].content, str)
+
+    def test_map_async_limits_concurrency(self):
+        """Test that map_async keeps at most max_concurrency calls in flight."""
+        # Arrange
+        import asyncio
+        in_flight = 0
+        peak = 0
+
+        async def call(item):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return item * 2
+
+        # Act
+        results = asyncio.run(self.service.map_async(call, list(range(10)), max_concurrency=3, max_rpm=0))
+
+        # Assert
+        self.assertEqual(results, [item * 2 for item in range(10)])
+        self.assertEqual(peak, 3)
+
+    def test_map_async_retries_rate_limit_errors(self):
+        """Test that map_async retries calls that hit a rate limit."""
+        # Arrange
+        import asyncio
+
+        class RateLimitError(Exception):
+            pass
+
+        call = AsyncMock(side_effect=[RateLimitError("slow down"), "done"])
+
+        # Act
+        with patch("core_agent.llm.llm_service._RETRY_BASE_DELAY", 0):
+            results = asyncio.run(self.service.map_async(call, ["item"], max_rpm=0))
+
+        # Assert
+        self.assertEqual(results, ["done"])
+        self.assertEqual(call.await_count, 2)
+
+    def test_map_async_does_not_retry_other_errors(self):
+        """Test that map_async raises errors that are not worth retrying."""
+        # Arrange
+        import asyncio
+        call = AsyncMock(side_effect=ValueError("bad request"))
+
+        # Act and Assert
+        with self.assertRaises(ValueError):
+            asyncio.run(self.service.map_async(call, ["item"], max_rpm=0))
+        self.assertEqual(call.await_count, 1)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,53 @@
+"""
+Tests for the LLM rate limiter.
+
+This module contains tests for the LLM rate limiter.
+"""
+
+import asyncio
+import time
+import unittest
+
+from core_agent.llm.rate_limiter import AsyncRateLimiter
+
+
+class TestAsyncRateLimiter(unittest.TestCase):
+    """Tests for the AsyncRateLimiter class."""
+
+    async def async_test_burst_starts_immediately(self):
+        """Test that requests within the burst capacity do not wait."""
+        limiter = AsyncRateLimiter(requests_per_minute=600, burst=3)
+
+        start = time.monotonic()
+        for _ in range(3):
+            await limiter.acquire()
+
+        self.assertLess(time.monotonic() - start, 0.05)
+
+    def test_burst_starts_immediately(self):
+        """Run the async test for bursts."""
+        asyncio.run(self.async_test_burst_starts_immediately())
+
+    async def async_test_requests_beyond_burst_are_paced(self):
+        """Test that requests beyond the burst wait for the bucket to refill."""
+        limiter = AsyncRateLimiter(requests_per_minute=1200, burst=1)
+
+        start = time.monotonic()
+        for _ in range(3):
+            await limiter.acquire()
+
+        # Two refills at 20 requests per second take 0.1 seconds
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_requests_beyond_burst_are_paced(self):
+        """Run the async test for pacing."""
+        asyncio.run(self.async_test_requests_beyond_burst_are_paced())
+
+    def test_rate_must_be_positive(self):
+        """Test that a non-positive rate is rejected."""
+        with self.assertRaises(ValueError):
+            AsyncRateLimiter(requests_per_minute=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+Tests for the LLM response cache.
+
+This module contains tests for the LLM response cache.
+"""
+
+import time
+import unittest
+from unittest.mock import patch
+
+from langchain_core.outputs import Generation
+
+from core_agent.llm.response_cache import LLMResponseCache, normalize_prompt
+
+
+class TestLLMResponseCache(unittest.TestCase):
+    """Tests for the LLMResponseCache class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.generations = [Generation(text="def hello():\n    return 'Hello'")]
+
+    def test_normalize_prompt_keeps_indentation(self):
+        """Test that normalization drops trailing whitespace but keeps indentation."""
+        self.assertEqual(normalize_prompt("  def f():  \n    pass \n\n"), "def f():\n    pass")
+        self.assertNotEqual(normalize_prompt("if x:\n    y()"), normalize_prompt("if x:\ny()"))
+
+    def test_lookup_ignores_trailing_whitespace(self):
+        """Test that prompts differing only in trailing whitespace share an entry."""
+        cache = LLMResponseCache()
+        cache.update("Write hello world", "model", self.generations)
+
+        self.assertEqual(cache.lookup("Write hello world  \n", "model"), self.generations)
+        self.assertIsNone(cache.lookup("Write hello world", "other-model"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """Test that the in-memory tier keeps at most maxsize entries."""
+        cache = LLMResponseCache(maxsize=2)
+        cache.update("first", "model", self.generations)
+        cache.update("second", "model", self.generations)
+        cache.lookup("first", "model")
+        cache.update("third", "model", self.generations)
+
+        self.assertIsNotNone(cache.lookup("first", "model"))
+        self.assertIsNone(cache.lookup("second", "model"))
+        self.assertIsNotNone(cache.lookup("third", "model"))
+
+    def test_entries_expire_after_ttl(self):
+        """Test that entries are dropped once their TTL has passed."""
+        cache = LLMResponseCache(ttl=10)
+        cache.update("prompt", "model", self.generations)
+
+        with patch("core_agent.llm.response_cache.time.monotonic", return_value=time.monotonic() + 11):
+            self.assertIsNone(cache.lookup("prompt", "model"))
+
+    def test_clear(self):
+        """Test clearing the cache."""
+        cache = LLMResponseCache()
+        cache.update("prompt", "model", self.generations)
+        cache.clear()
+
+        self.assertIsNone(cache.lookup("prompt", "model"))
+
+
+if __name__ == "__main__":
+    unittest.main()
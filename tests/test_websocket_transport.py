@@ -5,10 +5,16 @@ This module contains tests for the WebSocket transport.
 """
 
 import asyncio
+import os
+import socket
+import tempfile
 import unittest
 from unittest.mock import AsyncMock, MagicMock, patch
 
-from communication.transport.websocket_transport import WebSocketTransport
+import orjson
+
+from communication.protocol import JsonRpcRequest
+from communication.transport.websocket_transport import BinaryFrame, WebSocketTransport, _tune_socket
 
 
 # Create an async mock for websockets.serve
@@ -39,7 +45,10 @@ class TestWebSocketTransport(unittest.TestCase):
             mock_serve.assert_called_once_with(
                 self.transport._handle_client,
                 "localhost",
-                8765
+                8765,
+                max_queue=None,
+                compression=None,
+                max_size=2 ** 20
             )
 
             # Stop the transport
@@ -124,6 +133,250 @@ class TestWebSocketTransport(unittest.TestCase):
         """Run the async test for handling a request with a method that doesn't exist."""
         asyncio.run(self.async_test_handle_request_method_not_found())
 
+    async def async_test_handle_request_caches_read_only_methods(self):
+        """Test that read-only methods are served from the cache until a write."""
+        read_handler = AsyncMock(return_value={"content": "hello"})
+        write_handler = AsyncMock(return_value={"success": True})
+        self.transport.register_method_handler("read_file", read_handler)
+        self.transport.register_method_handler("write_file", write_handler)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        file_path = os.path.join(directory.name, "a.py")
+        with open(file_path, "w") as f:
+            f.write("hello")
+
+        request_data = {
+            "jsonrpc": "2.0",
+            "id": "1",
+            "method": "read_file",
+            "params": {"file_path": file_path}
+        }
+        await self.transport.handle_request(request_data)
+        response_data = await self.transport.handle_request(dict(request_data, id="2"))
+
+        self.assertEqual(response_data["id"], "2")
+        self.assertEqual(response_data["result"], {"content": "hello"})
+        read_handler.assert_called_once()
+
+        # A write invalidates the cached results
+        await self.transport.handle_request({
+            "jsonrpc": "2.0",
+            "id": "3",
+            "method": "write_file",
+            "params": {"file_path": file_path, "content": "bye"}
+        })
+        await self.transport.handle_request(dict(request_data, id="4"))
+        self.assertEqual(read_handler.call_count, 2)
+
+        # So does a change made outside the transport
+        with open(file_path, "a") as f:
+            f.write(" world")
+        await self.transport.handle_request(dict(request_data, id="5"))
+        self.assertEqual(read_handler.call_count, 3)
+
+        # Files that cannot be stat'ed are not cached
+        missing = dict(request_data, params={"file_path": file_path + ".missing"})
+        await self.transport.handle_request(missing)
+        await self.transport.handle_request(missing)
+        self.assertEqual(read_handler.call_count, 5)
+
+    def test_handle_request_caches_read_only_methods(self):
+        """Run the async test for caching read-only methods."""
+        asyncio.run(self.async_test_handle_request_caches_read_only_methods())
+
+    async def async_test_handle_request_unknown_method_skips_validation(self):
+        """Test that unknown methods are rejected before the request is validated."""
+        with patch.object(JsonRpcRequest, "model_validate") as mock_validate:
+            response_data = await self.transport.handle_request({
+                "jsonrpc": "2.0",
+                "id": "1",
+                "method": "probe"
+            })
+
+        mock_validate.assert_not_called()
+        self.assertEqual(response_data["id"], "1")
+        self.assertEqual(response_data["error"]["code"], -32601)  # Method not found
+
+    def test_handle_request_unknown_method_skips_validation(self):
+        """Run the async test for rejecting unknown methods early."""
+        asyncio.run(self.async_test_handle_request_unknown_method_skips_validation())
+
+    def test_tune_socket(self):
+        """Test that Nagle's algorithm is disabled on client sockets."""
+        sock = MagicMock(family=socket.AF_INET)
+        websocket = MagicMock()
+        websocket.transport.get_extra_info.return_value = sock
+
+        _tune_socket(websocket)
+
+        websocket.transport.get_extra_info.assert_called_once_with("socket")
+        sock.setsockopt.assert_any_call(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    async def async_test_send_request(self):
+        """Test sending a request to a client and decoding its response."""
+        client = MagicMock()
+        client.send = AsyncMock()
+        client.recv = AsyncMock(return_value=b'{"jsonrpc":"2.0","id":"1","result":{"ok":true}}')
+        self.transport._clients[0] = client
+
+        response = await self.transport.send_request(
+            JsonRpcRequest(id="1", method="ping", params={})
+        )
+
+        self.assertEqual(orjson.loads(client.send.call_args.args[0])["method"], "ping")
+        self.assertEqual(response.id, "1")
+        self.assertEqual(response.result, {"ok": True})
+
+    def test_send_request(self):
+        """Run the async test for sending a request."""
+        asyncio.run(self.async_test_send_request())
+
+    async def async_test_broadcast(self):
+        """Test broadcasting a message to all connected clients."""
+        clients = [MagicMock(send=AsyncMock()) for _ in range(120)]
+        clients[3].send.side_effect = ConnectionError("closed")
+        for client_id, client in enumerate(clients):
+            self.transport._clients[client_id] = client
+
+        await self.transport.broadcast(b'{"event":"ping"}')
+
+        for client in clients:
+            client.send.assert_awaited_once_with(b'{"event":"ping"}')
+
+    def test_broadcast(self):
+        """Run the async test for broadcasting."""
+        asyncio.run(self.async_test_broadcast())
+
+    async def async_test_handle_message_parse_error(self):
+        """Test handling a raw message that is not valid JSON."""
+        response = await self.transport._handle_message(b'{"jsonrpc": "2.0", "id": ')
+        response_data = orjson.loads(response)
+
+        self.assertIsNone(response_data["id"])
+        self.assertEqual(response_data["error"]["code"], -32700)  # Parse error
+        self.handler.assert_not_called()
+
+    def test_handle_message_parse_error(self):
+        """Run the async test for handling invalid JSON."""
+        asyncio.run(self.async_test_handle_message_parse_error())
+
+    async def async_test_writer_loop_batches_ready_responses(self):
+        """Test that queued responses are coalesced into one frame."""
+        websocket = MagicMock()
+        websocket.send = AsyncMock()
+
+        queue = asyncio.Queue()
+        queue.put_nowait(b'{"jsonrpc":"2.0","id":"1","result":{}}')
+        queue.put_nowait(b'{"jsonrpc":"2.0","id":"2","result":{}}')
+        queue.put_nowait(None)
+
+        await self.transport._writer_loop(websocket, queue)
+
+        websocket.send.assert_called_once_with(
+            b'{"batch":[{"jsonrpc":"2.0","id":"1","result":{}},'
+            b'{"jsonrpc":"2.0","id":"2","result":{}}]}'
+        )
+
+    def test_writer_loop_batches_ready_responses(self):
+        """Run the async test for batching queued responses."""
+        asyncio.run(self.async_test_writer_loop_batches_ready_responses())
+
+    async def async_test_writer_loop_fragments_large_responses(self):
+        """Test that a large response is sent as a fragmented message."""
+        websocket = MagicMock()
+        websocket.send = AsyncMock()
+
+        payload = b'{"jsonrpc":"2.0","id":"1","result":{"content":"' + b"x" * 150_000 + b'"}}'
+        queue = asyncio.Queue()
+        queue.put_nowait(payload)
+        queue.put_nowait(None)
+
+        await self.transport._writer_loop(websocket, queue)
+
+        websocket.send.assert_called_once()
+        fragments = websocket.send.call_args.args[0]
+        self.assertEqual(len(fragments), 3)
+        self.assertEqual(b"".join(fragments), payload)
+
+    def test_writer_loop_fragments_large_responses(self):
+        """Run the async test for fragmenting large responses."""
+        asyncio.run(self.async_test_writer_loop_fragments_large_responses())
+
+    async def async_test_handle_client_closes_when_writer_fails(self):
+        """Test that a client connection is closed once its writer fails."""
+        self.handler.return_value = {}
+        request = b'{"jsonrpc":"2.0","id":"1","method":"test_method","params":{}}'
+        closed = asyncio.Event()
+
+        class FailingWebSocket:
+            transport = None
+            send = AsyncMock(side_effect=ConnectionError("closed"))
+
+            async def close(self, code, reason):
+                self.close_code = code
+                closed.set()
+
+            async def __aiter__(self):
+                yield request
+                await closed.wait()
+                yield request
+
+        websocket = FailingWebSocket()
+
+        await asyncio.wait_for(self.transport._handle_client(websocket, "/"), timeout=1)
+
+        self.assertEqual(websocket.close_code, 1011)
+        self.handler.assert_called_once()
+        self.assertEqual(self.transport._queues, {})
+
+    def test_handle_client_closes_when_writer_fails(self):
+        """Run the async test for closing a client whose writer failed."""
+        asyncio.run(self.async_test_handle_client_closes_when_writer_fails())
+
+    async def async_test_handle_message_binary_frame(self):
+        """Test handling a binary framed message with a raw payload."""
+        self.handler.return_value = {"content": "hello", "success": True}
+        header = b'{"jsonrpc":"2.0","id":"1","method":"test_method","params":{"file_path":"a.py"}}'
+        message = len(header).to_bytes(4, "little") + header + b"payload"
+
+        response = await self.transport._handle_message(message)
+
+        self.assertIsInstance(response, BinaryFrame)
+        self.handler.assert_called_once_with({"file_path": "a.py", "content": b"payload"})
+        header_length = int.from_bytes(response[:4], "little")
+        response_data = orjson.loads(response[4:4 + header_length])
+        self.assertEqual(response_data["id"], "1")
+        self.assertEqual(response_data["result"], {"success": True})
+        self.assertEqual(response[4 + header_length:], b"hello")
+
+    def test_handle_message_binary_frame(self):
+        """Run the async test for handling binary framed messages."""
+        asyncio.run(self.async_test_handle_message_binary_frame())
+
+    async def async_test_handle_message_binary_frame_without_params(self):
+        """Test that a binary framed message without params still passes its payload."""
+        self.handler.return_value = {"success": True}
+        for header, expected in (
+            (b'{"jsonrpc":"2.0","id":"1","method":"test_method"}', {"content": b"payload"}),
+            (b'{"jsonrpc":"2.0","id":"1","method":"test_method","params":null}', {"content": b"payload"})
+        ):
+            message = len(header).to_bytes(4, "little") + header + b"payload"
+
+            await self.transport._handle_message(message)
+
+            self.handler.assert_called_with(expected)
+
+        header = b'{"jsonrpc":"2.0","id":"2","method":"test_method","params":["a.py"]}'
+        response = await self.transport._handle_message(len(header).to_bytes(4, "little") + header + b"payload")
+
+        self.assertEqual(orjson.loads(response)["error"]["code"], -32602)  # Invalid params
+        self.assertEqual(self.handler.call_count, 2)
+
+    def test_handle_message_binary_frame_without_params(self):
+        """Run the async test for binary framed messages without params."""
+        asyncio.run(self.async_test_handle_message_binary_frame_without_params())
+
 
 if __name__ == "__main__":
     unittest.main()
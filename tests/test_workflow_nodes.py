@@ -4,15 +4,17 @@ Tests for Workflow Nodes.
 This module contains tests for the Workflow Nodes.
 """
 
+import asyncio
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from core_agent.agent.workflow_nodes import (
     understand_request,
     analyze_context,
     plan_changes,
     execute_changes,
-    verify_results
+    verify_results,
+    route_verification
 )
 from core_agent.agent.state_models import AgentState
 
@@ -39,14 +41,16 @@ class TestWorkflowNodes(unittest.TestCase):
         # Create mock tools
         self.mock_generate_code_tool = MagicMock()
         self.mock_generate_code_tool.name = "generate_code"
-        self.mock_generate_code_tool._run.return_value = {
+        self.mock_generate_code_tool._arun = AsyncMock()
+        self.mock_generate_code_tool._arun.return_value = {
             "code": "def hello_world():\n    print('Hello, World!')",
             "explanation": "This is a simple hello world function."
         }
 
         self.mock_analyze_code_tool = MagicMock()
         self.mock_analyze_code_tool.name = "analyze_code"
-        self.mock_analyze_code_tool._run.return_value = {
+        self.mock_analyze_code_tool._arun = AsyncMock()
+        self.mock_analyze_code_tool._arun.return_value = {
             "symbols": [
                 {
                     "name": "hello_world",
@@ -64,7 +68,8 @@ class TestWorkflowNodes(unittest.TestCase):
 
         self.mock_write_file_tool = MagicMock()
         self.mock_write_file_tool.name = "write_file"
-        self.mock_write_file_tool._run.return_value = {
+        self.mock_write_file_tool._arun = AsyncMock()
+        self.mock_write_file_tool._arun.return_value = {
             "requires_confirmation": True,
             "preview": {
                 "path": "test.py",
@@ -73,11 +78,14 @@ class TestWorkflowNodes(unittest.TestCase):
             }
         }
 
-        self.mock_tools = [
-            self.mock_generate_code_tool,
-            self.mock_analyze_code_tool,
-            self.mock_write_file_tool
-        ]
+        self.mock_tools = {
+            tool.name: tool
+            for tool in (
+                self.mock_generate_code_tool,
+                self.mock_analyze_code_tool,
+                self.mock_write_file_tool
+            )
+        }
 
     def test_understand_request(self):
         """Test the understand_request node."""
@@ -162,6 +170,29 @@ class TestWorkflowNodes(unittest.TestCase):
         self.assertEqual(result.changes["encoding"], "utf-8")
         self.assertTrue(result.changes["requires_confirmation"])
 
+    def test_plan_changes_uses_each_task_inputs(self):
+        """Test that plans for tasks with the same input keys use each task's own values."""
+        # Arrange
+        states = [
+            AgentState(
+                task_id=f"test-task-{index}",
+                task_type="write_file",
+                inputs={"file_path": file_path, "content": "x", "requires_confirmation": False},
+                status="started"
+            )
+            for index, file_path in enumerate(["a.py", "b.py"])
+        ]
+
+        # Act
+        results = [plan_changes(state, self.mock_llm) for state in states]
+
+        # Assert
+        self.assertEqual([result.changes["file_path"] for result in results], ["a.py", "b.py"])
+        for result in results:
+            self.assertEqual(result.changes["type"], "file_write")
+            self.assertEqual(result.changes["encoding"], "utf-8")
+            self.assertTrue(result.changes["requires_confirmation"])
+
     def test_execute_changes_for_generate_code(self):
         """Test the execute_changes node for generate_code task."""
         # Arrange
@@ -181,14 +212,14 @@ class TestWorkflowNodes(unittest.TestCase):
         )
 
         # Act
-        result = execute_changes(state, self.mock_tools)
+        result = asyncio.run(execute_changes(state, self.mock_tools))
 
         # Assert
         self.assertEqual(result.status, "completed")
         self.assertIsNotNone(result.results)
         self.assertEqual(result.results["code"], "def hello_world():\n    print('Hello, World!')")
         self.assertEqual(result.results["explanation"], "This is a simple hello world function.")
-        self.mock_generate_code_tool._run.assert_called_once_with(
+        self.mock_generate_code_tool._arun.assert_awaited_once_with(
             prompt="Create a hello world function",
             language="python",
             context=None
@@ -215,7 +246,7 @@ class TestWorkflowNodes(unittest.TestCase):
         )
 
         # Act
-        result = execute_changes(state, self.mock_tools)
+        result = asyncio.run(execute_changes(state, self.mock_tools))
 
         # Assert
         self.assertEqual(result.status, "completed")
@@ -223,7 +254,7 @@ class TestWorkflowNodes(unittest.TestCase):
         self.assertIn("symbols", result.results)
         self.assertEqual(len(result.results["symbols"]), 1)
         self.assertEqual(result.results["symbols"][0]["name"], "hello_world")
-        self.mock_analyze_code_tool._run.assert_called_once_with(
+        self.mock_analyze_code_tool._arun.assert_awaited_once_with(
             code="def hello_world():\n    print('Hello, World!')",
             language="python",
             file_path="test.py"
@@ -251,7 +282,7 @@ class TestWorkflowNodes(unittest.TestCase):
         )
 
         # Act
-        result = execute_changes(state, self.mock_tools)
+        result = asyncio.run(execute_changes(state, self.mock_tools))
 
         # Assert
         self.assertEqual(result.status, "awaiting_confirmation")
@@ -260,7 +291,7 @@ class TestWorkflowNodes(unittest.TestCase):
         self.assertEqual(result.preview["path"], "test.py")
         self.assertEqual(result.preview["content"], "def hello_world():\n    print('Hello, World!')")
         self.assertEqual(result.preview["operation"], "create")
-        self.mock_write_file_tool._run.assert_called_once_with(
+        self.mock_write_file_tool._arun.assert_awaited_once_with(
             file_path="test.py",
             content="def hello_world():\n    print('Hello, World!')",
             encoding="utf-8",
@@ -282,7 +313,7 @@ class TestWorkflowNodes(unittest.TestCase):
         )
 
         # Act
-        result = execute_changes(state, self.mock_tools)
+        result = asyncio.run(execute_changes(state, self.mock_tools))
 
         # Assert
         self.assertEqual(result.status, "completed")
@@ -303,7 +334,7 @@ class TestWorkflowNodes(unittest.TestCase):
         )
 
         # Act
-        result = execute_changes(state, self.mock_tools)
+        result = asyncio.run(execute_changes(state, self.mock_tools))
 
         # Assert
         self.assertEqual(result.status, "error")
@@ -356,6 +387,26 @@ class TestWorkflowNodes(unittest.TestCase):
         self.assertEqual(result.status, "executing_changes")
         self.assertFalse(result.verification_passed)
 
+    def test_verify_results_gives_up_on_repeated_failure(self):
+        """Test that verify_results stops retrying when a retry reproduces a failure."""
+        # Arrange
+        state = AgentState(
+            task_id="test-retry-task",
+            task_type="generate_code",
+            inputs={"prompt": "Create a hello world function"},
+            results=None
+        )
+
+        # Act
+        first = verify_results(state, self.mock_llm)
+        first_route = route_verification(first)
+        second = verify_results(first, self.mock_llm)
+
+        # Assert
+        self.assertEqual(first_route, "retry")
+        self.assertEqual(route_verification(second), "fail")
+        self.assertEqual(second.status, "error")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,209 @@
+"""
+Tests for the recovery service's history file.
+
+The shared conftest replaces core_agent.error.recovery_service with a mock,
+so the real module is loaded from its source file here.
+"""
+
+import importlib.util
+import os
+
+import pytest
+
+import core_agent.error
+
+
+def _load_recovery_service():
+    """Load the real recovery service module, bypassing the conftest mock."""
+    path = os.path.join(os.path.dirname(core_agent.error.__file__), "recovery_service.py")
+    spec = importlib.util.spec_from_file_location("_recovery_service_under_test", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+recovery_service = _load_recovery_service()
+RecoveryService = recovery_service.RecoveryService
+OperationStatus = recovery_service.OperationStatus
+
+
+@pytest.fixture
+def history_file(tmp_path):
+    """Path of a history file in a temporary directory."""
+    return str(tmp_path / "history" / "operation_history.jsonl")
+
+
+def _read_lines(path):
+    """Read the non-empty lines of a history file."""
+    with open(path, "rb") as f:
+        return [line for line in f.read().splitlines() if line]
+
+
+def test_history_round_trip(history_file):
+    """Test that operations saved and closed are restored on reload."""
+    service = RecoveryService(history_file=history_file)
+    first = service.create_operation("generate_code", {"prompt": "a"}, metadata={"source": "test"})
+    second = service.create_operation("analyze_code", {"code": "b"})
+    service.start_operation(first.operation_id)
+    service.complete_operation(first.operation_id, {"code": "print('a')"})
+    service.close()
+
+    reloaded = RecoveryService(history_file=history_file)
+
+    assert list(reloaded.operations) == [first.operation_id, second.operation_id]
+    restored = reloaded.get_operation(first.operation_id)
+    assert restored.status == OperationStatus.COMPLETED
+    assert restored.result == {"code": "print('a')"}
+    assert restored.inputs == {"prompt": "a"}
+    assert restored.metadata == {"source": "test"}
+    assert restored.timestamp == first.timestamp
+    assert restored.updated_at == first.updated_at
+    assert reloaded.get_operation(second.operation_id).status == OperationStatus.PENDING
+    assert reloaded.get_operations(status=OperationStatus.COMPLETED) == [restored]
+
+
+def test_history_last_record_wins(history_file):
+    """Test that the last record written for an operation is the one loaded."""
+    service = RecoveryService(history_file=history_file, flush_interval=0)
+    operation = service.create_operation("generate_code", {"prompt": "a"})
+    service.start_operation(operation.operation_id)
+    service.complete_operation(operation.operation_id, {"code": "x"})
+    service.close()
+
+    assert len(_read_lines(history_file)) == 3
+
+    reloaded = RecoveryService(history_file=history_file)
+
+    assert len(reloaded.operations) == 1
+    assert reloaded.get_operation(operation.operation_id).status == OperationStatus.COMPLETED
+
+
+def test_history_skips_truncated_trailing_line(history_file):
+    """Test that a partial last line left by a crash is skipped on load."""
+    service = RecoveryService(history_file=history_file)
+    operation = service.create_operation("generate_code", {"prompt": "a"})
+    service.close()
+
+    with open(history_file, "ab") as f:
+        f.write(b'{"operation_id": "cut-short", "operation_type": "gen')
+
+    reloaded = RecoveryService(history_file=history_file)
+
+    assert list(reloaded.operations) == [operation.operation_id]
+
+
+def test_history_compacts_superseded_records(history_file):
+    """Test that the file is rewritten once records exceed COMPACT_RATIO per operation."""
+    service = RecoveryService(history_file=history_file, flush_interval=0)
+    operation = service.create_operation("generate_code", {"prompt": "a"})
+    for _ in range(RecoveryService.COMPACT_RATIO - 1):
+        service.start_operation(operation.operation_id)
+
+    assert len(_read_lines(history_file)) == RecoveryService.COMPACT_RATIO
+
+    service.complete_operation(operation.operation_id, {"code": "x"})
+    service.close()
+
+    assert len(_read_lines(history_file)) == 1
+    reloaded = RecoveryService(history_file=history_file)
+    assert reloaded.get_operation(operation.operation_id).status == OperationStatus.COMPLETED
+
+
+def test_compaction_does_not_cache_record_dicts(history_file):
+    """Test that compaction leaves each record's cached dict to its updating thread."""
+    service = RecoveryService(history_file=history_file, flush_interval=60)
+    operation = service.create_operation("generate_code", {"prompt": "a"})
+    operation.update_status(OperationStatus.IN_PROGRESS)
+
+    service.compact()
+
+    assert operation._dict is None
+    assert operation.to_dict()["status"] == OperationStatus.IN_PROGRESS
+    service.close()
+
+
+def test_get_operations_orders_equal_timestamps_by_insertion():
+    """Test that operations with equal timestamps keep insertion order under a status filter."""
+    service = RecoveryService()
+    operations = [service.create_operation("generate_code", {"index": index}) for index in range(3)]
+    for operation in operations:
+        operation.timestamp = 1
+    for operation in reversed(operations):
+        service.complete_operation(operation.operation_id, {})
+
+    assert service.get_operations(status=OperationStatus.COMPLETED) == operations
+    assert service.get_operations() == operations
+
+
+def test_history_evicts_beyond_max_operations(history_file):
+    """Test that only the newest max_operations operations are kept."""
+    service = RecoveryService(history_file=history_file, max_operations=3)
+    operations = [service.create_operation("generate_code", {"index": index}) for index in range(5)]
+    service.close()
+
+    newest = [operation.operation_id for operation in operations[2:]]
+    assert list(service.operations) == newest
+    assert len(service.get_operations(operation_type="generate_code")) == 3
+
+    reloaded = RecoveryService(history_file=history_file, max_operations=3)
+
+    assert list(reloaded.operations) == newest
+
+
+def test_history_keeps_records_when_write_fails(history_file):
+    """Test that buffered records are written by the next flush after a failed one."""
+    service = RecoveryService(history_file=history_file, flush_interval=60)
+    first = service.create_operation("generate_code", {"prompt": "a"})
+
+    open_history_file = service._open_history_file
+    service._open_history_file = lambda: open(os.path.dirname(history_file), "ab")
+    service.flush()
+    service._open_history_file = open_history_file
+
+    second = service.create_operation("generate_code", {"prompt": "b"})
+    service.close()
+
+    reloaded = RecoveryService(history_file=history_file)
+
+    assert list(reloaded.operations) == [first.operation_id, second.operation_id]
+
+
+def test_history_written_after_close(history_file):
+    """Test that records added after close are still written."""
+    service = RecoveryService(history_file=history_file, flush_interval=60)
+    first = service.create_operation("generate_code", {"prompt": "a"})
+    service.close()
+
+    second = service.create_operation("generate_code", {"prompt": "b"})
+    service.complete_operation(first.operation_id, {"code": "x"})
+
+    reloaded = RecoveryService(history_file=history_file)
+
+    assert list(reloaded.operations) == [first.operation_id, second.operation_id]
+    assert reloaded.get_operation(first.operation_id).status == OperationStatus.COMPLETED
+
+
+def test_msgpack_history_round_trip(tmp_path):
+    """Test that msgpack history files are restored, skipping a truncated frame."""
+    pytest.importorskip("ormsgpack")
+    history_file = str(tmp_path / "operation_history.msgpack")
+    service = RecoveryService(history_file=history_file, history_format="msgpack")
+    first = service.create_operation("generate_code", {"prompt": "a"})
+    second = service.create_operation("analyze_code", {"code": "b"})
+    service.complete_operation(first.operation_id, {"code": "x"})
+    service.close()
+
+    with open(history_file, "ab") as f:
+        f.write(recovery_service._FRAME_HEADER.pack(100) + b"\x81")
+
+    reloaded = RecoveryService(history_file=history_file, history_format="msgpack")
+
+    assert list(reloaded.operations) == [first.operation_id, second.operation_id]
+    assert reloaded.get_operation(first.operation_id).result == {"code": "x"}
+    assert reloaded.get_operation(second.operation_id).status == OperationStatus.PENDING
+
+
+def test_unknown_history_format():
+    """Test that an unknown history format is rejected."""
+    with pytest.raises(ValueError):
+        RecoveryService(history_format="xml")
@@ -113,17 +113,12 @@ export class AgentService extends EventEmitter {
 
                 this.ws.on('message', (data) => {
                     try {
-                        const response = JSON.parse(data.toString());
-                        const id = response.id;
-                        const pending = this.requestMap.get(id.toString());
-
-                        if (pending) {
-                            this.requestMap.delete(id.toString());
-                            if (response.error) {
-                                pending.reject(new Error(response.error.message));
-                            } else {
-                                pending.resolve(response.result);
-                            }
+                        const message = JSON.parse(data.toString());
+                        // The agent may coalesce several responses into a single
+                        // {"batch": [...]} frame when they are ready at once
+                        const responses = Array.isArray(message.batch) ? message.batch : [message];
+                        for (const response of responses) {
+                            this.handleResponse(response);
                         }
                     } catch (error) {
                         console.error('Error processing WebSocket message:', error);
@@ -145,6 +140,23 @@ export class AgentService extends EventEmitter {
         });
     }
 
+    /**
+     * Resolve the pending request matching a JSON-RPC response
+     */
+    private handleResponse(response: any): void {
+        const id = response.id;
+        const pending = this.requestMap.get(id.toString());
+
+        if (pending) {
+            this.requestMap.delete(id.toString());
+            if (response.error) {
+                pending.reject(new Error(response.error.message));
+            } else {
+                pending.resolve(response.result);
+            }
+        }
+    }
+
     /**
      * Send a request to the agent
      */